@@ -0,0 +1,64 @@
+"""Verifies the adaptive concurrency controller against a local fake S3 that throttles beyond a fixed capacity.
+
+Usage:
+    python -m benchmarks.adaptive --objects 3000 --capacity 16 --latency 0.05
+
+"""
+
+import argparse
+import functools
+import json
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import LocalDownloader, quiet_logger
+from benchmarks.fake_s3 import FakeS3, FakeS3Process
+
+BUCKET = "adaptive-benchmark"
+
+
+def populate(server: FakeS3, objects: int, size: int) -> None:
+    """Fills the fake server with objects of the same size."""
+    bucket = server.bucket(BUCKET)
+    for index in range(objects):
+        bucket.put(f"objects/{index % 32:02d}/object-{index:07d}", size=size)
+
+
+def run(endpoint_url: str, threads: int, adaptive: bool, max_threads: int) -> dict:
+    """Downloads the bucket once and returns the results."""
+    download_dir = tempfile.mkdtemp(prefix="s3-adaptive-")
+    downloader = LocalDownloader(bucket_name=BUCKET, endpoint_url=endpoint_url, max_pool_connections=max_threads,
+                                 download_dir=download_dir, logger=quiet_logger(f"{__name__}.{adaptive}"))
+    start = time.perf_counter()
+    try:
+        downloader.run_in_parallel(threads=threads, adaptive=adaptive, max_threads=max_threads)
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    return dict(adaptive=adaptive, threads=threads, seconds=round(time.perf_counter() - start, 3),
+                success=downloader.results.success, failed=downloader.results.failed,
+                concurrency=downloader.results.concurrency)
+
+
+def main() -> None:
+    """Runs fixed and adaptive concurrency against the same throttling server."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=3000)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--capacity", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--max-threads", type=int, default=64)
+    args = parser.parse_args()
+
+    fill = functools.partial(populate, objects=args.objects, size=args.size)
+    with FakeS3Process(fill, latency=args.latency, capacity=args.capacity) as server:
+        for threads, adaptive in ((args.threads, False), (args.max_threads, False), (args.threads, True)):
+            throttled = server.stats()["throttled"]
+            result = run(server.endpoint_url, threads=threads, adaptive=adaptive, max_threads=args.max_threads)
+            result["throttled"] = server.stats()["throttled"] - throttled
+            print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Helpers shared by the benchmarks, to point the downloader and the clients to the local fake S3.
+
+>>> LocalDownloader
+
+"""
+
+import logging
+import os
+
+import boto3
+from botocore.config import Config
+
+from s3.dumper import Downloader
+
+# The fake server doesn't resolve virtual hosted buckets, and the credentials are never verified
+os.environ.setdefault("AWS_EC2_METADATA_DISABLED", "true")
+CREDENTIALS = dict(aws_access_key_id="benchmark", aws_secret_access_key="benchmark", region_name="us-east-1")
+
+
+def client_config(max_pool_connections: int = 64, max_attempts: int = 20) -> Config:
+    """Returns the client configuration for the fake server."""
+    return Config(s3={"addressing_style": "path"}, retries={"max_attempts": max_attempts, "mode": "standard"},
+                  max_pool_connections=max_pool_connections)
+
+
+def client(endpoint_url: str, max_pool_connections: int = 64):
+    """Creates an S3 client pointed to the fake server."""
+    return boto3.client("s3", endpoint_url=endpoint_url, config=client_config(max_pool_connections), **CREDENTIALS)
+
+
+def quiet_logger(name: str) -> logging.Logger:
+    """Returns a logger that discards everything, so the logging is not part of the measurement."""
+    logger = logging.getLogger(name)
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+class LocalDownloader(Downloader):
+    """Downloader with the credentials and the client configuration for the fake server.
+
+    >>> LocalDownloader
+
+    """
+
+    def __init__(self, bucket_name: str, endpoint_url: str, max_pool_connections: int = 64, **kwargs):
+        """Creates the downloader with the credentials and the client configuration for the fake server.
+
+        Args:
+            bucket_name: Name of the bucket.
+            endpoint_url: Endpoint URL of the fake server.
+            max_pool_connections: Size of the connection pool of the client.
+            kwargs: Keyword arguments for ``Downloader``.
+        """
+        kwargs.setdefault("retry_config", client_config(max_pool_connections))
+        super().__init__(bucket_name=bucket_name, endpoint_url=endpoint_url, **CREDENTIALS, **kwargs)
@@ -0,0 +1,171 @@
+"""Benchmarks each download engine across worker counts, against a local fake S3 with latency and bandwidth limits.
+
+Each run happens in a fresh process, so the peak RSS and the CPU time of one run don't carry over to the next.
+The fake server runs in its own process too, so its CPU time is not part of the measurement.
+
+Usage:
+    python -m benchmarks.engines --shapes tiny skewed --workers 4 16 --output results.json
+    python -m benchmarks.engines --baseline results.json --tolerance 0.1
+
+"""
+
+import argparse
+import functools
+import json
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import LocalDownloader, quiet_logger
+from benchmarks.fake_s3 import FakeS3, FakeS3Process
+
+BUCKET = "engines-benchmark"
+KB: int = 1024
+MB: int = 1024 * KB
+
+
+def tiny(server: FakeS3, scale: float = 1.0) -> None:
+    """Many tiny objects, where the per-request overhead dominates."""
+    bucket = server.bucket(BUCKET)
+    for index in range(int(5000 * scale)):
+        bucket.put(f"tiny/{index % 50:02d}/object-{index:07d}", size=4 * KB)
+
+
+def huge(server: FakeS3, scale: float = 1.0) -> None:
+    """A few huge objects, where the multipart transfers and the throughput dominate."""
+    bucket = server.bucket(BUCKET)
+    for index in range(max(int(4 * scale), 1)):
+        bucket.put(f"huge/object-{index:03d}", size=64 * MB)
+
+
+def skewed(server: FakeS3, scale: float = 1.0) -> None:
+    """Mostly small objects with a long tail of large ones, the shape of a typical bucket."""
+    bucket = server.bucket(BUCKET)
+    generator = random.Random(0)
+    for index in range(int(2000 * scale)):
+        if generator.random() < 0.02:
+            size = generator.randint(8 * MB, 48 * MB)
+        else:
+            size = int(min(generator.lognormvariate(10, 1.5), 4 * MB))
+        bucket.put(f"skewed/{index % 20:02d}/object-{index:07d}", size=size)
+
+
+SHAPES: Dict[str, Callable[[FakeS3, float], None]] = dict(tiny=tiny, huge=huge, skewed=skewed)
+ENGINES = ("run", "parallel", "adaptive", "scheduled", "stream", "async")
+
+
+def launch(downloader: LocalDownloader, engine: str, workers: int) -> None:
+    """Runs an engine with the given number of workers."""
+    if engine == "run":
+        downloader.run()
+    elif engine == "parallel":
+        downloader.run_in_parallel(threads=workers)
+    elif engine == "adaptive":
+        downloader.run_in_parallel(threads=workers, adaptive=True, max_threads=workers * 4)
+    elif engine == "scheduled":
+        downloader.run_scheduled(small_threads=workers, large_threads=max(workers // 8, 1))
+    elif engine == "stream":
+        downloader.run_stream(threads=workers)
+    elif engine == "async":
+        downloader.run_async(max_in_flight=workers)
+    else:
+        raise ValueError(f"Unknown engine: {engine!r}")
+
+
+def measure(endpoint_url: str, shape: str, engine: str, workers: int, archive: bool = False) -> Dict[str, Any]:
+    """Downloads the bucket once in the current process and returns the measurements."""
+    download_dir = tempfile.mkdtemp(prefix="s3-engines-")
+    downloader = LocalDownloader(bucket_name=BUCKET, endpoint_url=endpoint_url, download_dir=download_dir,
+                                 max_pool_connections=max(workers * 4, 10), headless=True, archive=archive,
+                                 logger=quiet_logger(__name__))
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    begin = time.perf_counter()
+    try:
+        launch(downloader, engine, workers)
+    finally:
+        seconds = time.perf_counter() - begin
+        shutil.rmtree(download_dir, ignore_errors=True)
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    metrics = downloader.metrics
+    return dict(
+        shape=shape, engine=engine, workers=workers, seconds=round(seconds, 3),
+        objects=metrics.objects, bytes=metrics.bytes,
+        objects_per_second=round(metrics.objects / seconds, 1),
+        mb_per_second=round(metrics.bytes / MB / seconds, 2),
+        cpu_seconds=round(after.ru_utime - before.ru_utime + after.ru_stime - before.ru_stime, 3),
+        peak_rss_mb=round(after.ru_maxrss / 1024, 1),
+        retries=metrics.retries, failed=downloader.results.failed,
+    )
+
+
+def regressions(results: List[Dict[str, Any]], parameters: Dict[str, float], baseline: str,
+                tolerance: float) -> List[str]:
+    """Compares the throughput against a previous run and returns the combinations that got slower."""
+    with open(baseline) as file:
+        data = json.load(file)
+    if data["parameters"] != parameters:
+        print(f"Baseline was measured with different parameters: {data['parameters']}", file=sys.stderr)
+    previous = {(result["shape"], result["engine"], result["workers"]): result for result in data["results"]}
+    slower = []
+    for result in results:
+        if not (before := previous.get((result["shape"], result["engine"], result["workers"]))):
+            continue
+        for metric in ("objects_per_second", "mb_per_second"):
+            if before[metric] and result[metric] < before[metric] * (1 - tolerance):
+                slower.append(f"{result['shape']}/{result['engine']}/{result['workers']}: "
+                              f"{metric} {before[metric]} -> {result[metric]}")
+    return slower
+
+
+def main() -> None:
+    """Runs every engine, shape and worker count combination, and saves the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the number of objects per shape")
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds added to each request")
+    parser.add_argument("--bandwidth", type=float, default=50 * MB, help="Bytes per second for each response")
+    parser.add_argument("--archive", action="store_true", help="Write the objects into tar archives")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="Results of a previous run to compare the throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown against the baseline")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(**json.loads(args.child))))
+        return
+    results = []
+    for shape in args.shapes:
+        fill = functools.partial(SHAPES[shape], scale=args.scale)
+        with FakeS3Process(fill, latency=args.latency, bandwidth=args.bandwidth) as server:
+            for engine in args.engines:
+                if args.archive and engine == "scheduled":
+                    continue
+                # The sequential engine doesn't have workers to scale
+                for workers in args.workers[:1] if engine == "run" else args.workers:
+                    child = json.dumps(dict(endpoint_url=server.endpoint_url, shape=shape,
+                                            engine=engine, workers=workers, archive=args.archive))
+                    output = subprocess.run([sys.executable, "-m", "benchmarks.engines", "--child", child],
+                                            check=True, capture_output=True, text=True).stdout
+                    results.append(json.loads(output.strip().splitlines()[-1]))
+                    print(json.dumps(results[-1]))
+    parameters = dict(scale=args.scale, latency=args.latency, bandwidth=args.bandwidth, archive=args.archive)
+    with open(args.output, "w") as file:
+        json.dump(dict(python=platform.python_version(), platform=platform.platform(), created=time.time(),
+                       parameters=parameters, results=results), file, indent=2)
+    print(f"Results saved to {args.output}")
+    if args.baseline and (slower := regressions(results, parameters, args.baseline, args.tolerance)):
+        print("Regressions against the baseline:", *slower, sep="\n  ")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,447 @@
+"""Minimal S3 compatible server that serves synthetic objects with tunable latency, bandwidth and throttling.
+
+>>> FakeS3
+
+"""
+
+import bisect
+import email.utils
+import hashlib
+import json
+import multiprocessing
+import random
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+from urllib.request import urlopen
+from xml.sax.saxutils import escape
+
+# Upper bound used to skip past every key that starts with a common prefix
+HIGHEST = "\U0010ffff"
+
+
+@dataclass
+class FakeObject:
+    """Represents a synthetic object whose body is generated on demand."""
+
+    size: int
+    etag: str
+    last_modified: float
+
+
+class FakeBucket:
+    """Sorted, in-memory key space of a synthetic bucket.
+
+    >>> FakeBucket
+
+    """
+
+    def __init__(self, name: str):
+        """Initializes an empty bucket.
+
+        Args:
+            name: Name of the bucket.
+        """
+        self.name = name
+        self.keys: List[str] = []
+        self.objects: Dict[str, FakeObject] = {}
+        self.lock = threading.Lock()
+
+    def put(self, key: str, size: int, last_modified: float = None, version: int = 0) -> None:
+        """Adds or replaces a synthetic object.
+
+        Args:
+            key: Object key.
+            size: Size of the object in bytes.
+            last_modified: Modified time as epoch, defaults to now.
+            version: Changes the ETag and the body without changing the size.
+        """
+        etag = hashlib.md5(f"{key}:{size}:{version}".encode()).hexdigest()
+        with self.lock:
+            if key not in self.objects:
+                bisect.insort(self.keys, key)
+            self.objects[key] = FakeObject(size=size, etag=etag, last_modified=last_modified or time.time())
+
+    def copy(self, source: str, key: str) -> None:
+        """Copies an object to another key, with the same ETag and body like a ``CopyObject``.
+
+        Args:
+            source: Key of the object to copy.
+            key: Key of the copy.
+        """
+        with self.lock:
+            if key not in self.objects:
+                bisect.insort(self.keys, key)
+            original = self.objects[source]
+            self.objects[key] = FakeObject(size=original.size, etag=original.etag, last_modified=time.time())
+
+    def delete(self, key: str) -> None:
+        """Removes an object from the bucket.
+
+        Args:
+            key: Object key.
+        """
+        with self.lock:
+            if self.objects.pop(key, None):
+                self.keys.pop(bisect.bisect_left(self.keys, key))
+
+    def list(self, prefix: str, delimiter: str, lower: str,
+             max_keys: int) -> Tuple[List[str], List[str], Optional[str]]:
+        """Lists the keys and common prefixes starting at a lower bound.
+
+        Args:
+            prefix: Prefix to limit the keys to.
+            delimiter: Delimiter to group the keys by.
+            lower: Inclusive lower bound for the keys.
+            max_keys: Maximum number of keys and common prefixes to return.
+
+        Returns:
+            Tuple[List[str], List[str], Optional[str]]:
+            Returns the keys, common prefixes and the inclusive lower bound for the next page.
+        """
+        keys, prefixes = [], []
+        with self.lock:
+            index = bisect.bisect_left(self.keys, max(lower, prefix))
+            while index < len(self.keys):
+                key = self.keys[index]
+                if not key.startswith(prefix):
+                    break
+                if len(keys) + len(prefixes) == max_keys:
+                    return keys, prefixes, key
+                if delimiter and (position := key.find(delimiter, len(prefix))) != -1:
+                    common = key[:position + len(delimiter)]
+                    prefixes.append(common)
+                    index = bisect.bisect_left(self.keys, common + HIGHEST)
+                    continue
+                keys.append(key)
+                index += 1
+        return keys, prefixes, None
+
+
+def body(obj: FakeObject, start: int, end: int) -> bytes:
+    """Generates a deterministic slice of an object's body.
+
+    Args:
+        obj: Object to generate the body for.
+        start: First byte of the slice.
+        end: Last byte of the slice, inclusive.
+
+    Returns:
+        bytes:
+        Returns the requested bytes.
+    """
+    pattern = obj.etag.encode()
+    offset = start % len(pattern)
+    length = end - start + 1
+    repeated = pattern * (length // len(pattern) + 2)
+    return repeated[offset:offset + length]
+
+
+class FakeS3(ThreadingHTTPServer):
+    """Threaded HTTP server that implements the subset of the S3 API used by the downloader.
+
+    >>> FakeS3
+
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0,
+                 throttle_rate: float = 0.0, capacity: int = 0, port: int = 0, seed: int = 0,
+                 reuse_port: bool = False):
+        """Binds the server to a local port.
+
+        Args:
+            latency: Seconds to wait before responding to each request.
+            bandwidth: Bytes per second for each response body, zero for unlimited.
+            throttle_rate: Fraction of requests that are rejected with ``503 SlowDown``.
+            capacity: Number of requests in flight beyond which requests are rejected with ``503 SlowDown``.
+            port: Port to bind to, defaults to a random free port.
+            seed: Seed for the throttling decisions.
+            reuse_port: Allow multiple server processes to bind the same port, which the kernel balances across.
+        """
+        self.reuse_port = reuse_port
+        super().__init__(("127.0.0.1", port), FakeS3Handler)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.throttle_rate = throttle_rate
+        self.capacity = capacity
+        self.random = random.Random(seed)
+        self.buckets: Dict[str, FakeBucket] = {}
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.stats_lock = threading.Lock()
+        self.thread = None
+
+    def server_bind(self) -> None:
+        """Binds the socket, setting ``SO_REUSEPORT`` first if requested."""
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    @property
+    def endpoint_url(self) -> str:
+        """Returns the endpoint URL of the server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def bucket(self, name: str) -> FakeBucket:
+        """Creates a bucket if it doesn't exist yet.
+
+        Args:
+            name: Name of the bucket.
+
+        Returns:
+            FakeBucket:
+            Returns the bucket instance.
+        """
+        return self.buckets.setdefault(name, FakeBucket(name))
+
+    def handle_error(self, request, client_address) -> None:
+        """Ignores the clients that disconnect midway, which is expected when downloads are interrupted."""
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+    def start(self) -> "FakeS3":
+        """Starts serving on a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the server."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeS3":
+        """Starts the server as a context manager."""
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        """Stops the server when exiting the context manager."""
+        self.stop()
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """Handles the S3 requests for ``FakeS3``.
+
+    >>> FakeS3Handler
+
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: FakeS3
+
+    def log_message(self, *args) -> None:
+        """Silences the default request logging."""
+
+    def route(self) -> Tuple[Optional[FakeBucket], str, Dict[str, List[str]]]:
+        """Parses the path style request into a bucket, key and query parameters."""
+        parsed = urlparse(self.path)
+        bucket_name, _, key = parsed.path.lstrip("/").partition("/")
+        return self.server.buckets.get(bucket_name), unquote(key), parse_qs(parsed.query, keep_blank_values=True)
+
+    def throttle(self) -> bool:
+        """Applies the latency and rejects the requests beyond capacity or a random fraction with ``503 SlowDown``."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.stats_lock:
+            throttled = (self.server.capacity and self.server.in_flight > self.server.capacity) or (
+                self.server.throttle_rate and self.server.random.random() < self.server.throttle_rate
+            )
+            if throttled:
+                self.server.throttled += 1
+        if throttled:
+            self.error(503, "SlowDown", "Please reduce your request rate.")
+        return throttled
+
+    def error(self, status: int, code: str, message: str) -> None:
+        """Sends an S3 error response."""
+        payload = (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                   f"<Error><Code>{code}</Code><Message>{message}</Message></Error>").encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        """Handles ``HeadBucket`` and ``HeadObject``."""
+        self.do_GET()
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Handles ``ListObjectsV2``, ``GetObject`` and ``HeadObject`` while tracking the requests in flight."""
+        server = self.server
+        with server.stats_lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            self.dispatch()
+        finally:
+            with server.stats_lock:
+                server.in_flight -= 1
+
+    def dispatch(self) -> None:
+        """Routes the request after applying the latency and throttling."""
+        if self.path != "/__stats__" and self.throttle():
+            return
+        bucket, key, query = self.route()
+        if self.path == "/__stats__":
+            with self.server.stats_lock:
+                stats = dict(requests=self.server.requests, throttled=self.server.throttled,
+                             peak_in_flight=self.server.peak_in_flight)
+            return self.send_payload(200, json.dumps(stats).encode(), "application/json")
+        if bucket is None:
+            return self.error(404, "NoSuchBucket", "The specified bucket does not exist.")
+        if not key:
+            if self.command == "HEAD":
+                return self.send_payload(200, b"", "application/xml")
+            if "location" in query:
+                return self.send_payload(200, b'<?xml version="1.0" encoding="UTF-8"?>\n'
+                                              b"<LocationConstraint/>", "application/xml")
+            return self.list_objects(bucket, query)
+        obj = bucket.objects.get(key)
+        if obj is None:
+            return self.error(404, "NoSuchKey", "The specified key does not exist.")
+        if (if_match := self.headers.get("If-Match")) and if_match.strip('"') != obj.etag:
+            return self.error(412, "PreconditionFailed", "At least one of the preconditions failed.")
+        self.get_object(obj)
+
+    def send_payload(self, status: int, payload: bytes, content_type: str) -> None:
+        """Sends a complete response."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def list_objects(self, bucket: FakeBucket, query: Dict[str, List[str]]) -> None:
+        """Responds to ``ListObjectsV2``."""
+        prefix = query.get("prefix", [""])[0]
+        delimiter = query.get("delimiter", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        lower = ""
+        if token := query.get("continuation-token", [""])[0]:
+            lower = bytes.fromhex(token).decode()
+        elif start_after := query.get("start-after", [""])[0]:
+            lower = start_after + "\x00"
+        keys, prefixes, following = bucket.list(prefix, delimiter, lower, max_keys)
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">',
+            f"<Name>{escape(bucket.name)}</Name><Prefix>{escape(prefix)}</Prefix>",
+            f"<KeyCount>{len(keys) + len(prefixes)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>",
+            f"<IsTruncated>{'true' if following else 'false'}</IsTruncated>",
+        ]
+        if delimiter:
+            parts.append(f"<Delimiter>{escape(delimiter)}</Delimiter>")
+        if following:
+            parts.append(f"<NextContinuationToken>{following.encode().hex()}</NextContinuationToken>")
+        for key in keys:
+            obj = bucket.objects[key]
+            parts.append(
+                f"<Contents><Key>{escape(key)}</Key>"
+                f"<LastModified>{time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(obj.last_modified))}"
+                f"</LastModified><ETag>&quot;{obj.etag}&quot;</ETag><Size>{obj.size}</Size>"
+                f"<StorageClass>STANDARD</StorageClass></Contents>"
+            )
+        for common in prefixes:
+            parts.append(f"<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>")
+        parts.append("</ListBucketResult>")
+        self.send_payload(200, "".join(parts).encode(), "application/xml")
+
+    def get_object(self, obj: FakeObject) -> None:
+        """Responds to ``GetObject`` and ``HeadObject`` with support for a single byte range."""
+        start, end, status = 0, obj.size - 1, 200
+        if requested := self.headers.get("Range"):
+            first, _, last = requested.replace("bytes=", "").partition("-")
+            if first:
+                start = int(first)
+                end = min(int(last), obj.size - 1) if last else obj.size - 1
+            else:
+                start = max(obj.size - int(last), 0)
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Type", "binary/octet-stream")
+        self.send_header("Content-Length", str(max(end - start + 1, 0)))
+        self.send_header("ETag", f'"{obj.etag}"')
+        self.send_header("Last-Modified", email.utils.formatdate(obj.last_modified, usegmt=True))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{obj.size}")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        chunk = 1024 * 256
+        for offset in range(start, end + 1, chunk):
+            last = min(offset + chunk - 1, end)
+            self.wfile.write(body(obj, offset, last))
+            if self.server.bandwidth:
+                time.sleep((last - offset + 1) / self.server.bandwidth)
+
+
+def _serve(connection: Any, populate: Callable[[FakeS3], None], kwargs: Dict[str, Any]) -> None:
+    """Populates and runs a fake server in a child process, sending its endpoint back to the parent."""
+    server = FakeS3(**kwargs)
+    populate(server)
+    connection.send(server.endpoint_url)
+    server.serve_forever()
+
+
+class FakeS3Process:
+    """Runs ``FakeS3`` in a separate process, so the server doesn't compete with the client for the GIL.
+
+    >>> FakeS3Process
+
+    """
+
+    def __init__(self, populate: Callable[[FakeS3], None], processes: int = 1, **kwargs):
+        """Stores the arguments for the server.
+
+        Args:
+            populate: Picklable function that fills the server with buckets and objects.
+            processes: Number of server processes sharing the port, for benchmarks that saturate a single process.
+            kwargs: Keyword arguments for ``FakeS3``.
+        """
+        self.populate = populate
+        self.processes = processes
+        self.kwargs = kwargs
+        self.workers: List[multiprocessing.Process] = []
+        self.endpoint_url = None
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the request counters of the server, only for one of the processes when there are several."""
+        with urlopen(f"{self.endpoint_url}/__stats__") as response:
+            return json.load(response)
+
+    def __enter__(self) -> "FakeS3Process":
+        """Starts the server processes and waits for them to be ready."""
+        kwargs = dict(self.kwargs, reuse_port=self.processes > 1)
+        for _ in range(self.processes):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(child, self.populate, kwargs), daemon=True)
+            process.start()
+            self.workers.append(process)
+            self.endpoint_url = parent.recv()
+            # The remaining processes bind the port picked by the first one
+            kwargs["port"] = int(self.endpoint_url.rsplit(":", 1)[1])
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Terminates the server processes."""
+        for process in self.workers:
+            process.terminate()
+        for process in self.workers:
+            process.join()
+        self.workers.clear()
@@ -0,0 +1,89 @@
+"""Compares consuming the objects from memory against downloading them to disk and reading them back.
+
+Each run hashes every body, the way a pipeline parses each object once and then discards it.
+
+Usage:
+    python -m benchmarks.inmemory --objects 5000 --size 262144 --concurrency 16 --servers 4
+
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from typing import Any, Dict
+
+from benchmarks.common import LocalDownloader, quiet_logger
+from benchmarks.fake_s3 import FakeS3, FakeS3Process
+
+BUCKET = "inmemory-benchmark"
+MB: int = 1024 * 1024
+
+
+def populate(server: FakeS3, objects: int, size: int) -> None:
+    """Fills the fake server with objects of the same size."""
+    bucket = server.bucket(BUCKET)
+    for index in range(objects):
+        bucket.put(f"part-{index % 16:02d}/object-{index:07d}", size=size)
+
+
+def run(endpoint_url: str, method: str, concurrency: int, memory_budget: int) -> Dict[str, Any]:
+    """Consumes every object once with the given method, and returns the throughput."""
+    download_dir = tempfile.mkdtemp(prefix="s3-inmemory-")
+    digest = hashlib.blake2b()
+    objects = total = 0
+    downloader = LocalDownloader(bucket_name=BUCKET, endpoint_url=endpoint_url, download_dir=download_dir,
+                                 max_pool_connections=max(concurrency * 2, 10), headless=True,
+                                 logger=quiet_logger(__name__))
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu, start = usage.ru_utime + usage.ru_stime, time.perf_counter()
+    try:
+        if method == "disk":
+            downloader.run_in_parallel(threads=concurrency)
+            for root, _, files in os.walk(download_dir):
+                for filename in files:
+                    with open(os.path.join(root, filename), "rb") as file:
+                        data = file.read()
+                    digest.update(data)
+                    objects += 1
+                    total += len(data)
+        else:
+            for _, _, body in downloader.iter_objects(concurrency=concurrency, engine=method,
+                                                      memory_budget=memory_budget):
+                digest.update(body)
+                objects += 1
+                total += len(body)
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return dict(method=method, concurrency=concurrency, objects=objects, seconds=round(seconds, 3),
+                objects_per_second=round(objects / seconds), mb_per_second=round(total / MB / seconds, 1),
+                cpu_seconds=round(usage.ru_utime + usage.ru_stime - cpu, 3))
+
+
+def main() -> None:
+    """Consumes the same bucket with each method and prints the throughput."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=256 * 1024)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16])
+    parser.add_argument("--memory-budget", type=int, default=256 * MB)
+    parser.add_argument("--servers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fill = functools.partial(populate, objects=args.objects, size=args.size)
+    with FakeS3Process(fill, processes=args.servers, latency=args.latency) as server:
+        for concurrency in args.concurrency:
+            for method in ("disk", "threads", "asyncio"):
+                print(json.dumps(run(server.endpoint_url, method, concurrency, args.memory_budget)))
+
+
+if __name__ == '__main__':
+    main()
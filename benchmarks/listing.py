@@ -0,0 +1,60 @@
+"""Benchmarks the sharded listing engine against a local fake S3 with per-request latency.
+
+Usage:
+    python -m benchmarks.listing --objects 50000 --prefixes 64 --latency 0.02
+
+"""
+
+import argparse
+import functools
+import json
+import logging
+import time
+
+from benchmarks.common import client
+from benchmarks.fake_s3 import FakeS3, FakeS3Process
+from s3.listing import Lister
+
+BUCKET = "listing-benchmark"
+
+
+def populate(server: FakeS3, objects: int, prefixes: int) -> None:
+    """Fills the fake server with objects spread evenly across the prefixes."""
+    bucket = server.bucket(BUCKET)
+    for index in range(objects):
+        bucket.put(f"prefix-{index % prefixes:04d}/object-{index:09d}", size=1024)
+
+
+def main() -> None:
+    """Lists the same synthetic bucket with an increasing number of shards and prints the speedup."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=50_000)
+    parser.add_argument("--prefixes", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--key-splits", type=int, default=0)
+    args = parser.parse_args()
+
+    logger = logging.getLogger(__name__)
+    results = []
+    fill = functools.partial(populate, objects=args.objects, prefixes=args.prefixes)
+    with FakeS3Process(fill, latency=args.latency) as server:
+        s3_client = client(server.endpoint_url)
+        baseline = None
+        for workers in args.workers:
+            lister = Lister(client=s3_client, bucket_name=BUCKET, logger=logger,
+                            workers=workers, key_splits=args.key_splits)
+            requests = server.stats()["requests"]
+            start = time.perf_counter()
+            count = sum(1 for _ in lister.iter_objects([""]))
+            elapsed = time.perf_counter() - start
+            assert count == args.objects, f"Listed {count} objects instead of {args.objects}"
+            baseline = baseline or elapsed
+            requests = server.stats()["requests"] - requests
+            results.append(dict(workers=workers, seconds=round(elapsed, 3), requests=requests,
+                                objects_per_second=round(count / elapsed), speedup=round(baseline / elapsed, 2)))
+            print(json.dumps(results[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Compares logging to a file synchronously against the queue-backed handler, from several threads at once.
+
+Each thread logs the same messages as a download with ``LogType.file``, optionally waiting for a simulated transfer
+in between, and the time spent in the logging calls is reported apart from the time until every record is on disk.
+
+Usage:
+    python -m benchmarks.logs --records 100000 --threads 1 8 32 --transfer 0.0005
+
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+from s3.logger import (BatchedQueueHandler, JsonFormatter, LogFormat,
+                       default_format)
+
+
+def handler(method: str, filename: str) -> logging.Handler:
+    """Creates the handler under test."""
+    target = logging.FileHandler(filename=filename)
+    target.setFormatter(JsonFormatter() if method == LogFormat.json.value else default_format())
+    return target if method == "sync" else BatchedQueueHandler(target)
+
+
+def run(method: str, records: int, threads: int, transfer: float, directory: str) -> Dict[str, Any]:
+    """Logs the records from the threads, and returns the time in the logging calls and until they are written."""
+    filename = os.path.join(directory, f"{method}-{threads}.log")
+    logger = logging.getLogger(f"{__name__}.{method}.{threads}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(log_handler := handler(method, filename))
+    per_thread = records // threads
+    calls = []
+
+    def work(index: int) -> None:
+        """Logs the messages of the downloads of a single worker, and sums the time spent in the logging calls."""
+        spent = 0.0
+        for number in range(per_thread):
+            key = f"prefix-{index:02d}/object-{number:07d}"
+            start = time.perf_counter()
+            logger.info("Downloading %s [%s] to %s", key, "4 KB", "bucket/prefix")
+            spent += time.perf_counter() - start
+            if transfer:
+                time.sleep(transfer)
+            start = time.perf_counter()
+            logger.info("Downloaded %s to %s", key, "bucket/prefix")
+            spent += time.perf_counter() - start
+        calls.append(spent)
+
+    workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    logged = time.perf_counter() - start
+    log_handler.close()
+    written = time.perf_counter() - start
+    logger.removeHandler(log_handler)
+    with open(filename) as file:
+        lines = sum(1 for _ in file)
+    assert lines == per_thread * threads * 2, f"{method} wrote {lines} of {per_thread * threads * 2} records"
+    return dict(method=method, threads=threads, records=lines, run_seconds=round(logged, 3),
+                logging_seconds_per_thread=round(sum(calls) / len(calls), 3), written_seconds=round(written, 3),
+                records_per_second=round(lines / written))
+
+
+def main() -> None:
+    """Logs the same records with each handler and prints the timings."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100_000, help="Number of downloads to log, two records each")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--transfer", type=float, default=0.0, help="Seconds to wait between the records")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="s3-logs-")
+    try:
+        for threads in args.threads:
+            for method in ("sync", LogFormat.text.value, LogFormat.json.value):
+                print(json.dumps(run(method, args.records, threads, args.transfer, directory)))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
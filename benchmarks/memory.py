@@ -0,0 +1,82 @@
+"""Measures the peak RSS of dispatching downloads with a bounded window versus submitting everything upfront.
+
+Each measurement runs in a fresh process, so the peak RSS of one run doesn't carry over to the next.
+
+Usage:
+    python -m benchmarks.memory --objects 10000 100000 1000000
+
+"""
+
+import argparse
+import json
+import logging
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from s3.dumper import Downloader
+from s3.progress import HeadlessBar, ProgressPercentage
+from s3.squire import S3Object
+
+
+def objects(count: int) -> Iterator[S3Object]:
+    """Generates synthetic objects lazily, so only the dispatcher holds on to them."""
+    for index in range(count):
+        yield S3Object(key=f"prefix/{index % 100:02d}/object-{index:09d}", size=1024)
+
+
+def noop(s3_object: S3Object, callback: ProgressPercentage) -> None:
+    """Stands in for the download, reporting the progress of a single chunk."""
+    callback(s3_object.size)
+
+
+def measure(mode: str, count: int, threads: int, max_pending: int) -> dict:
+    """Dispatches the synthetic objects and returns the peak RSS of the process."""
+    logger = logging.getLogger(__name__)
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    downloader = Downloader(bucket_name="memory-benchmark", logger=logger, region_name="us-east-1")
+    # The terminal rendering is not part of the measurement
+    bar = HeadlessBar()
+    start = time.perf_counter()
+    with downloader.progress, ThreadPoolExecutor(max_workers=threads) as executor:
+        def submit(s3_object: S3Object):
+            """Submits the stand-in download to the thread pool."""
+            progress_callback = downloader.progress.track(s3_object)
+            return executor.submit(noop, s3_object=s3_object, callback=progress_callback)
+
+        if mode == "window":
+            downloader.dispatch(s3_objects=objects(count), submit=submit, bar=bar, max_pending=max_pending)
+        else:
+            # Submits everything upfront and collects in submission order, the same as before the window
+            futures = {submit(s3_object): s3_object for s3_object in objects(count)}
+            for future in futures:
+                downloader.collect(future, futures[future], bar)
+    return dict(mode=mode, objects=count, seconds=round(time.perf_counter() - start, 3),
+                peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                success=downloader.results.success)
+
+
+def main() -> None:
+    """Runs each mode and object count in a separate process and prints the peak RSS."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--max-pending", type=int, default=1000)
+    parser.add_argument("--mode", choices=["window", "upfront"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.objects[0], args.threads, args.max_pending)))
+        return
+    for mode in ("upfront", "window"):
+        for count in args.objects:
+            subprocess.run([sys.executable, "-m", "benchmarks.memory", "--mode", mode, "--objects", str(count),
+                            "--threads", str(args.threads), "--max-pending", str(args.max_pending)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compares the parallel ranged download of a single large object against ``download_file``.
+
+The fake server runs in several processes sharing the same port, so a single server process is not the bottleneck.
+
+Usage:
+    python -m benchmarks.ranged --size 2147483648 --concurrency 4 16 32 --servers 8
+
+"""
+
+import argparse
+import functools
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from typing import Any, Dict
+
+from boto3.s3.transfer import TransferConfig
+
+from benchmarks.common import client
+from benchmarks.fake_s3 import FakeS3, FakeS3Process
+from s3.ranged import RangedDownload
+from s3.squire import S3Object
+
+BUCKET = "ranged-benchmark"
+KEY = "large/object.bin"
+MB: int = 1024 * 1024
+
+
+def populate(server: FakeS3, size: int) -> None:
+    """Fills the fake server with a single large object."""
+    server.bucket(BUCKET).put(KEY, size=size)
+
+
+def cpu_seconds() -> float:
+    """Returns the user and system CPU time of the current process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(endpoint_url: str, method: str, concurrency: int, chunk_size: int) -> Dict[str, Any]:
+    """Downloads the object once and returns the throughput."""
+    s3_client = client(endpoint_url, max_pool_connections=concurrency)
+    head = s3_client.head_object(Bucket=BUCKET, Key=KEY)
+    s3_object = S3Object(key=KEY, size=head["ContentLength"], etag=head["ETag"].strip('"'))
+    download_dir = tempfile.mkdtemp(prefix="s3-ranged-")
+    target_file = os.path.join(download_dir, "object.bin")
+    cpu, start = cpu_seconds(), time.perf_counter()
+    try:
+        if method == "ranged":
+            RangedDownload(client=s3_client, bucket_name=BUCKET, s3_object=s3_object, target_file=target_file,
+                           chunk_size=chunk_size, concurrency=concurrency).run()
+        else:
+            config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                                    max_concurrency=concurrency)
+            s3_client.download_file(BUCKET, KEY, target_file, Config=config)
+        seconds = time.perf_counter() - start
+        assert os.path.getsize(target_file) == s3_object.size, "Downloaded file is incomplete"
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    return dict(method=method, concurrency=concurrency, seconds=round(seconds, 3),
+                mb_per_second=round(s3_object.size / MB / seconds, 1),
+                gbit_per_second=round(s3_object.size * 8 / 1e9 / seconds, 2),
+                cpu_seconds=round(cpu_seconds() - cpu, 3))
+
+
+def main() -> None:
+    """Downloads the same object with each method and concurrency, and prints the throughput."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024 * MB)
+    parser.add_argument("--chunk-size", type=int, default=16 * MB)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--servers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fill = functools.partial(populate, size=args.size)
+    with FakeS3Process(fill, processes=args.servers, latency=args.latency) as server:
+        for concurrency in args.concurrency:
+            for method in ("download_file", "ranged"):
+                print(json.dumps(run(server.endpoint_url, method, concurrency, args.chunk_size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Runs one process per shard against a local fake S3, and checks that the shards cover the bucket exactly once.
+
+Each shard downloads into its own directory and writes its completion summary. The summaries are then merged, and
+the union of the downloaded files is compared against the bucket, along with the bytes downloaded by each shard.
+
+Usage:
+    python -m benchmarks.sharding --shards 4 --strategies hash size --shape skewed --scale 0.5
+
+"""
+
+import argparse
+import functools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict
+
+from benchmarks.common import LocalDownloader, client, quiet_logger
+from benchmarks.engines import BUCKET, SHAPES
+from benchmarks.fake_s3 import FakeS3Process
+from s3.shard import merge_summaries
+
+
+def download(endpoint_url: str, shard: str, strategy: str, download_dir: str, summary: str, workers: int) -> None:
+    """Downloads a single shard of the bucket in the current process."""
+    downloader = LocalDownloader(bucket_name=BUCKET, endpoint_url=endpoint_url, download_dir=download_dir,
+                                 max_pool_connections=max(workers * 4, 10), headless=True,
+                                 logger=quiet_logger(__name__), shard=shard, shard_strategy=strategy,
+                                 shard_summary=summary)
+    downloader.run_in_parallel(threads=workers)
+
+
+def verify(endpoint_url: str, shards: int, strategy: str, workers: int) -> Dict[str, Any]:
+    """Runs every shard in its own process and compares the union of the downloads against the bucket."""
+    directory = tempfile.mkdtemp(prefix="s3-sharding-")
+    try:
+        processes, summaries, directories = [], [], []
+        for index in range(1, shards + 1):
+            directories.append(os.path.join(directory, f"shard-{index}"))
+            summaries.append(os.path.join(directory, f"shard-{index}.json"))
+            child = json.dumps(dict(endpoint_url=endpoint_url, shard=f"{index}/{shards}", strategy=strategy,
+                                    download_dir=directories[-1], summary=summaries[-1], workers=workers))
+            processes.append(subprocess.Popen([sys.executable, "-m", "benchmarks.sharding", "--child", child]))
+        for process in processes:
+            if process.wait():
+                raise RuntimeError(f"Shard process exited with {process.returncode}")
+        owners: Dict[str, int] = {}
+        shard_bytes = []
+        for index, download_dir in enumerate(directories, start=1):
+            total = 0
+            for root, _, files in os.walk(download_dir):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    key = os.path.relpath(path, download_dir).replace(os.sep, "/")
+                    if key in owners:
+                        raise AssertionError(f"{key} was downloaded by shards {owners[key]} and {index}")
+                    owners[key] = index
+                    total += os.path.getsize(path)
+            shard_bytes.append(total)
+        merged = merge_summaries(summaries)
+        assert merged["objects"] == len(owners), f"Summaries claim {merged['objects']}, found {len(owners)} files"
+        return dict(strategy=strategy, shards=shards, files=len(owners), bytes=sum(shard_bytes),
+                    shard_bytes=shard_bytes, imbalance=merged["imbalance"], complete=merged["complete"],
+                    results=merged["results"])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> None:
+    """Verifies each sharding strategy and prints the distribution of the bytes across the shards."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--strategies", nargs="+", choices=("hash", "size"), default=["hash", "size"])
+    parser.add_argument("--shape", choices=list(SHAPES), default="skewed")
+    parser.add_argument("--scale", type=float, default=0.5, help="Multiplier for the number of objects")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        download(**json.loads(args.child))
+        return
+    fill = functools.partial(SHAPES[args.shape], scale=args.scale)
+    with FakeS3Process(fill) as server:
+        paginator = client(server.endpoint_url).get_paginator("list_objects_v2")
+        objects = sum(page.get("KeyCount", 0) for page in paginator.paginate(Bucket=BUCKET))
+        for strategy in args.strategies:
+            result = verify(server.endpoint_url, args.shards, strategy, args.workers)
+            print(json.dumps(result))
+            if result["files"] != objects:
+                print(f"Bucket has {objects} objects, the shards downloaded {result['files']}", file=sys.stderr)
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Compares listing the bucket against serving it from a fresh snapshot and refreshing an expired one.
+
+The bucket is modified between the runs, by appending to a few partitions and by rewriting objects in a recently
+modified one, and every listing is checked against the contents of the bucket.
+
+Usage:
+    python -m benchmarks.snapshot --objects 100000 --prefixes 100 --latency 0.02 --workers 16
+
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict
+
+from benchmarks.common import client, quiet_logger
+from benchmarks.fake_s3 import FakeS3
+from s3.listing import Lister
+from s3.snapshot import Refresh, Snapshot
+
+BUCKET = "snapshot-benchmark"
+DAY: int = 86400
+
+
+def populate(server: FakeS3, objects: int, prefixes: int) -> None:
+    """Fills the fake server with objects spread evenly across the prefixes, only the first one modified recently."""
+    bucket = server.bucket(BUCKET)
+    now = time.time()
+    for index in range(objects):
+        prefix = index % prefixes
+        bucket.put(f"prefix-{prefix:04d}/object-{index:09d}", size=1024,
+                   last_modified=now - 60 if prefix == 0 else now - 30 * DAY)
+
+
+def modify(server: FakeS3, prefixes: int, changed: int) -> None:
+    """Appends an object to a few cold prefixes and rewrites an object of the recently modified one."""
+    bucket = server.bucket(BUCKET)
+    for prefix in range(1, changed + 1):
+        bucket.put(f"prefix-{prefix % prefixes:04d}/object-999999999", size=2048)
+    key = min(key for key in bucket.objects if key.startswith("prefix-0000/"))
+    bucket.put(key, size=4096, version=1)
+
+
+def run(server: FakeS3, label: str, lister: Lister, snapshot: Snapshot = None) -> Dict[str, Any]:
+    """Lists the bucket once and returns the time and the number of requests it took."""
+    requests = server.requests
+    start = time.perf_counter()
+    listed = {s3_object.key: s3_object.size for s3_object in (snapshot or lister).iter_objects([""])}
+    elapsed = time.perf_counter() - start
+    expected = {key: obj.size for key, obj in server.bucket(BUCKET).objects.items()}
+    assert listed == expected, f"{label} listed {len(listed)} objects, the bucket has {len(expected)}"
+    return dict(run=label, objects=len(listed), seconds=round(elapsed, 3), requests=server.requests - requests)
+
+
+def main() -> None:
+    """Lists the same bucket with and without a snapshot, and prints the time and the requests of each run."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=100_000)
+    parser.add_argument("--prefixes", type=int, default=100)
+    parser.add_argument("--changed", type=int, default=5, help="Number of cold prefixes to append an object to")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="s3-snapshot-")
+    logger = quiet_logger(__name__)
+    try:
+        with FakeS3(latency=args.latency) as server:
+            populate(server, args.objects, args.prefixes)
+            lister = Lister(client=client(server.endpoint_url), bucket_name=BUCKET, logger=logger,
+                            workers=args.workers)
+
+            def snapshot(ttl: float, refresh: Refresh = Refresh.incremental) -> Snapshot:
+                """Opens the snapshot of the bucket with the given expiry."""
+                return Snapshot(os.path.join(directory, "snapshot.sqlite"), BUCKET, lister=lister, logger=logger,
+                                ttl=ttl, refresh=refresh)
+
+            print(json.dumps(run(server, "listing", lister)))
+            print(json.dumps(run(server, "snapshot-cold", lister, snapshot(3600))))
+            print(json.dumps(run(server, "snapshot-fresh", lister, snapshot(3600))))
+            modify(server, args.prefixes, args.changed)
+            print(json.dumps(run(server, "snapshot-incremental", lister, snapshot(0))))
+            print(json.dumps(run(server, "snapshot-full", lister, snapshot(0, Refresh.full))))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
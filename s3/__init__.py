@@ -1,12 +1,21 @@
 import sys
-from typing import Optional
+from typing import Any, Optional, Tuple
 
 import click
 
-from s3.dumper import Downloader  # noqa: F401
 from s3.logger import LogType
 
 version = "1.0.1"
+__all__ = ["Downloader", "LogType", "version"]
+
+
+def __getattr__(name: str) -> Any:
+    """Imports the ``Downloader`` on first access, so the CLI and ``import s3`` don't pay for boto3 upfront."""
+    if name == "Downloader":
+        from s3.dumper import Downloader
+        globals()[name] = Downloader
+        return Downloader
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # noinspection PyUnusedLocal
@@ -36,11 +45,165 @@ version = "1.0.1"
     required=False,
     help="Number of workers to use for downloading files concurrently.",
 )
+@click.option(
+    "-a",
+    "--adaptive",
+    is_flag=True,
+    default=False,
+    help="Grow or shrink the number of workers at runtime based on latency and throttling.",
+)
+@click.option(
+    "--max-workers",
+    required=False,
+    type=click.IntRange(min=1),
+    help="Upper bound for the number of workers in adaptive mode.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["threads", "stream", "async", "scheduled"]),
+    required=False,
+    help="Download engine: a thread pool, a thread pool fed while listing, an asyncio event loop for many small "
+         "objects, or separate lanes for small and large objects. --workers sets the threads, the requests in "
+         "flight for async and the small object threads for scheduled.",
+)
+@click.option(
+    "--range-workers",
+    required=False,
+    type=click.IntRange(min=0),
+    default=0,
+    help="Number of byte ranges to fetch in parallel for each large object, resuming interrupted downloads.",
+)
+@click.option(
+    "--shard",
+    required=False,
+    help="Shard of the bucket to download on this node as index/count, such as 2/4, for splitting across nodes.",
+)
+@click.option(
+    "--shard-strategy",
+    type=click.Choice(["hash", "size"]),
+    default="hash",
+    help="Assign the objects to the shards by key hash, or by contiguous key ranges of roughly equal bytes.",
+)
+@click.option(
+    "--archive",
+    is_flag=True,
+    default=False,
+    help="Write the objects into rolling tar archives instead of a file each, for buckets of many tiny objects.",
+)
+@click.option(
+    "--archive-size",
+    required=False,
+    type=click.IntRange(min=1),
+    default=1024 * 1024 * 1024,
+    help="Size in bytes after which a new archive is started.",
+)
+@click.option(
+    "--dedup",
+    is_flag=True,
+    default=False,
+    help="Download objects with the same ETag and size once, and reflink, hardlink or copy the duplicates locally.",
+)
+@click.option(
+    "--include",
+    multiple=True,
+    help="Glob of the keys to download, or a regex prefixed with 're:'. Can be repeated.",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help="Glob of the keys to leave out, or a regex prefixed with 're:'. Can be repeated.",
+)
+@click.option(
+    "--min-size",
+    required=False,
+    help="Minimum size of the objects to download, such as 1KB.",
+)
+@click.option(
+    "--max-size",
+    required=False,
+    help="Maximum size of the objects to download, such as 100MB.",
+)
+@click.option(
+    "--modified-since",
+    required=False,
+    help="Only download the objects modified at or after this ISO 8601 time, UTC unless an offset is given.",
+)
+@click.option(
+    "--modified-before",
+    required=False,
+    help="Only download the objects modified before this ISO 8601 time, UTC unless an offset is given.",
+)
+@click.option(
+    "--snapshot",
+    required=False,
+    help="SQLite file to keep a snapshot of the listing in, reused by the next runs until it expires.",
+)
+@click.option(
+    "--snapshot-ttl",
+    required=False,
+    type=click.FloatRange(min=0),
+    default=3600.0,
+    help="Seconds for which the snapshot is reused without listing the bucket.",
+)
+@click.option(
+    "--snapshot-refresh",
+    type=click.Choice(["full", "incremental"]),
+    default="full",
+    help="Refresh an expired snapshot in full, or incrementally by relisting only the prefixes that are likely to "
+         "have changed, which misses deletes and overwrites in the other prefixes for up to a week.",
+)
+@click.option(
+    "--failure-manifest",
+    required=False,
+    help="JSON file to write the objects that still fail at the end of the run to.",
+)
+@click.option(
+    "--tail-retries",
+    type=click.IntRange(min=0),
+    default=3,
+    help="Number of rounds to retry the failed downloads at the end of the run.",
+)
+@click.option(
+    "--retry-failed",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Failure manifest of an earlier run, to download exactly those objects without listing the bucket.",
+)
+@click.option(
+    "--plan",
+    "plan_file",
+    required=False,
+    help="Dry run, writes the objects to download to this plan file with the counts, bytes and a time estimate.",
+)
+@click.option(
+    "--run-plan",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Plan file written by --plan, to download exactly those objects without listing the bucket.",
+)
+@click.option(
+    "--headless",
+    is_flag=True,
+    default=False,
+    help="Disable the progress bar for batch runs, logging only a summary of the throughput.",
+)
+@click.option(
+    "--metrics",
+    required=False,
+    help="File to write the run metrics to periodically, as Prometheus text for .prom files or JSON.",
+)
+@click.option(
+    "--log-format",
+    type=click.Choice(["text", "json"]),
+    default="text",
+    help="Format of the log records, text or compact JSON lines.",
+)
 @click.option(
     "-l",
     "--log",
-    required=False,
-    help="Number of workers to use for downloading files concurrently.",
+    type=click.Choice([log_type.value for log_type in LogType]),
+    default=LogType.stdout.value,
+    help="Where to write the logs, to stdout or to a log file.",
 )
 def _cli(
         *args,
@@ -48,10 +211,42 @@ def _cli(
         destination: str,
         prefix: Optional[str],
         workers: Optional[str],
-        log: Optional[LogType] = LogType.stdout
+        adaptive: bool,
+        max_workers: Optional[int],
+        engine: Optional[str],
+        range_workers: int,
+        shard: Optional[str],
+        shard_strategy: str,
+        archive: bool,
+        archive_size: int,
+        dedup: bool,
+        include: Tuple[str, ...],
+        exclude: Tuple[str, ...],
+        min_size: Optional[str],
+        max_size: Optional[str],
+        modified_since: Optional[str],
+        modified_before: Optional[str],
+        snapshot: Optional[str],
+        snapshot_ttl: float,
+        snapshot_refresh: str,
+        failure_manifest: Optional[str],
+        tail_retries: int,
+        retry_failed: Optional[str],
+        plan_file: Optional[str],
+        run_plan: Optional[str],
+        headless: bool,
+        metrics: Optional[str],
+        log_format: str,
+        log: str
 ):
     """Command-line interface for the s3-downloader module."""
     assert bucket, "Bucket name is required."
+    modes = [option for option, value in (("--plan", plan_file), ("--run-plan", run_plan),
+                                          ("--retry-failed", retry_failed), ("--engine", engine)) if value]
+    if len(modes) > 1:
+        raise click.UsageError(f"{' and '.join(modes)} cannot be used together.")
+    if adaptive and engine not in (None, "threads"):
+        raise click.UsageError(f"--adaptive is only supported by the threads engine, not {engine}.")
     if workers:
         # All inputs are strings from CLI
         assert isinstance(workers, str), "Workers must be a string representing a positive integer."
@@ -60,11 +255,32 @@ def _cli(
         workers = int(workers)
         assert isinstance(workers, int) and workers > 0, "Workers must be a positive integer."
     prefix_list = [p.strip() for p in prefix.split(",")] if prefix else None
-    downloader = Downloader(bucket_name=bucket, download_dir=destination, prefix=prefix_list, log_type=LogType(log))
+    from s3.dumper import Downloader
+    downloader = Downloader(bucket_name=bucket, download_dir=destination, prefix=prefix_list, log_type=LogType(log),
+                            log_format=log_format,
+                            range_workers=range_workers, shard=shard, shard_strategy=shard_strategy,
+                            archive=archive, archive_size=archive_size, dedup=dedup,
+                            include=list(include), exclude=list(exclude), min_size=min_size, max_size=max_size,
+                            modified_since=modified_since, modified_before=modified_before, snapshot=snapshot,
+                            snapshot_ttl=snapshot_ttl, snapshot_refresh=snapshot_refresh,
+                            failure_manifest=failure_manifest, tail_retries=tail_retries, headless=headless,
+                            metrics=metrics)
     entrypoint = f"Entrypoint: s3 {' '.join(sys.argv[1:])}"
     downloader.logger.info(entrypoint)
     click.secho(entrypoint, fg='green')
-    if workers:
-        downloader.run_in_parallel(threads=workers)
+    if plan_file:
+        downloader.plan(plan_file, threads=workers or 5)
+    elif run_plan:
+        downloader.run_plan(run_plan, threads=workers or 5)
+    elif retry_failed:
+        downloader.retry_failed(retry_failed, threads=workers or 5)
+    elif engine == "stream":
+        downloader.run_stream(threads=workers or 5)
+    elif engine == "async":
+        downloader.run_async(max_in_flight=workers or 1000)
+    elif engine == "scheduled":
+        downloader.run_scheduled(small_threads=workers or 32)
+    elif engine == "threads" or workers or adaptive:
+        downloader.run_in_parallel(threads=workers or 5, adaptive=adaptive, max_threads=max_workers)
     else:
         downloader.run()
@@ -0,0 +1,304 @@
+"""Minimal asyncio HTTP client to download objects using presigned URLs without blocking a thread per request.
+
+>>> ConnectionPool
+
+"""
+
+import asyncio
+import os
+import random
+import ssl
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from s3.exceptions import DownloadFailed
+
+# Status codes that are retried, including the ``503 SlowDown`` throttling response from S3
+RETRY_STATUS = frozenset({500, 502, 503, 504})
+CHUNK_SIZE: int = 1024 * 256  # 256KB
+
+Address = Tuple[str, str, int]
+Stream = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+Sink = Callable[[bytes], Awaitable[None]]
+
+
+class ConnectionPool:
+    """Keeps the idle keep-alive connections per host to avoid a new handshake for every request.
+
+    >>> ConnectionPool
+
+    """
+
+    def __init__(self, limit: int, timeout: float = 90):
+        """Initializes the connection pool.
+
+        Args:
+            limit: Maximum number of idle connections to keep per host.
+            timeout: Timeout in seconds to connect and to read each chunk of the response.
+        """
+        self.limit = limit
+        self.timeout = timeout
+        self.idle: Dict[Address, List[Stream]] = {}
+        self.ssl_context = ssl.create_default_context()
+
+    async def acquire(self, address: Address) -> Stream:
+        """Gets an idle connection or opens a new one.
+
+        Args:
+            address: Tuple of scheme, host and port.
+
+        Returns:
+            Stream:
+            Returns the reader and writer of the connection.
+        """
+        idle = self.idle.get(address)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        scheme, host, port = address
+        return await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self.ssl_context if scheme == "https" else None),
+            timeout=self.timeout
+        )
+
+    def release(self, address: Address, stream: Stream, reusable: bool) -> None:
+        """Returns a connection to the pool or closes it.
+
+        Args:
+            address: Tuple of scheme, host and port.
+            stream: Reader and writer of the connection.
+            reusable: Whether the connection can be used for another request.
+        """
+        idle = self.idle.setdefault(address, [])
+        if reusable and len(idle) < self.limit:
+            idle.append(stream)
+        else:
+            stream[1].close()
+
+    def close(self) -> None:
+        """Closes all the idle connections."""
+        for idle in self.idle.values():
+            for _, writer in idle:
+                writer.close()
+        self.idle.clear()
+
+    async def get(self, url: str, sink: Sink) -> Tuple[int, Dict[str, str], bytes]:
+        """Sends a ``GET`` request and streams a successful response body into the sink.
+
+        Args:
+            url: Presigned URL to fetch.
+            sink: Coroutine function that receives each chunk of a successful response body.
+
+        Returns:
+            Tuple[int, Dict[str, str], bytes]:
+            Returns the status code, response headers and the body of an unsuccessful response.
+        """
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        address = (parts.scheme, parts.hostname, port)
+        target = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        reader, writer = await self.acquire(address)
+        reusable = False
+        try:
+            writer.write(
+                f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nAccept-Encoding: identity\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status, headers = await self.read_head(reader)
+            error = bytearray()
+
+            async def collect(chunk: bytes) -> None:
+                """Collects the body of an unsuccessful response."""
+                error.extend(chunk)
+
+            consume = sink if 200 <= status < 300 else collect
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                await self.read_chunked(reader, consume)
+            elif "content-length" in headers:
+                await self.read_length(reader, int(headers["content-length"]), consume)
+            elif status not in (204, 304):
+                # Without a length or chunked encoding, the body is delimited by the server closing the connection
+                await self.read_until_eof(reader, consume)
+                return status, headers, bytes(error)
+            reusable = headers.get("connection", "").lower() != "close"
+            return status, headers, bytes(error)
+        finally:
+            self.release(address, (reader, writer), reusable)
+
+    async def read_head(self, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+        """Reads the status line and headers of a response."""
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=self.timeout)
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def read_length(self, reader: asyncio.StreamReader, length: int, consume: Sink) -> None:
+        """Reads a body of known length."""
+        while length > 0:
+            chunk = await asyncio.wait_for(reader.read(min(length, CHUNK_SIZE)), timeout=self.timeout)
+            if not chunk:
+                raise ConnectionError("Connection closed before the response was complete.")
+            length -= len(chunk)
+            await consume(chunk)
+
+    async def read_until_eof(self, reader: asyncio.StreamReader, consume: Sink) -> None:
+        """Reads a body that ends when the connection is closed."""
+        while chunk := await asyncio.wait_for(reader.read(CHUNK_SIZE), timeout=self.timeout):
+            await consume(chunk)
+
+    async def read_chunked(self, reader: asyncio.StreamReader, consume: Sink) -> None:
+        """Reads a body sent with chunked transfer encoding."""
+        while True:
+            size_line = await asyncio.wait_for(reader.readuntil(b"\r\n"), timeout=self.timeout)
+            size = int(size_line.split(b";")[0], 16)
+            if not size:
+                await reader.readuntil(b"\r\n")
+                return
+            await consume(await asyncio.wait_for(reader.readexactly(size), timeout=self.timeout))
+            await reader.readexactly(2)
+
+
+async def fetch(pool: ConnectionPool, url: str, sink: Sink,
+                attempts: int = 10, reset: Optional[Callable[[], Awaitable[None]]] = None,
+                on_retry: Optional[Callable[[Optional[int]], None]] = None) -> Dict[str, str]:
+    """Downloads a presigned URL with retries and exponential backoff for throttling and server errors.
+
+    Args:
+        pool: Connection pool to send the request with.
+        url: Presigned URL to fetch.
+        sink: Coroutine function that receives each chunk of the response body.
+        attempts: Maximum number of attempts.
+        reset: Coroutine function to discard the chunks that were already received, before retrying.
+        on_retry: Callable that receives the HTTP status code, or ``None`` for connection errors, before each retry.
+
+    Raises:
+        DownloadFailed: If the object couldn't be downloaded after all the attempts.
+        OSError: If the sink fails to store a chunk, such as on a full disk, which is not retried.
+
+    Returns:
+        Dict[str, str]:
+        Returns the response headers.
+    """
+    sink_errors = []
+
+    async def store(chunk: bytes) -> None:
+        """Passes a chunk to the sink, marking its errors apart from the connection errors."""
+        try:
+            await sink(chunk)
+        except OSError as exc:
+            sink_errors.append(exc)
+            raise
+
+    for attempt in range(1, attempts + 1):
+        try:
+            status, headers, error = await pool.get(url, store)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+            if sink_errors:
+                raise
+            status, headers, error = None, {}, str(exc).encode()
+        if status is not None and 200 <= status < 300:
+            return headers
+        if (status is not None and status not in RETRY_STATUS) or attempt == attempts:
+            raise DownloadFailed(f"[{status}] {error.decode(errors='replace').strip()}")
+        if on_retry:
+            on_retry(status)
+        if reset:
+            await reset()
+        # Full jitter backoff, capped at 20 seconds
+        await asyncio.sleep(random.uniform(0, min(20.0, 0.1 * 2 ** attempt)))
+
+
+class FileSink:
+    """Buffers the chunks of a response and writes them to disk on an executor, off the event loop.
+
+    >>> FileSink
+
+    See Also:
+        - The chunks are written to a ``.s3tmp`` file next to the target, which replaces the target once complete.
+
+    """
+
+    def __init__(self, filename: str, loop: asyncio.AbstractEventLoop, executor: Executor,
+                 callback: Callable[[int], None], buffer_size: int = 1024 * 1024 * 8):
+        """Initializes the sink.
+
+        Args:
+            filename: Path of the file to write to.
+            loop: Running event loop.
+            executor: Executor to run the blocking disk I/O in.
+            callback: Callable that receives the number of bytes received with each chunk.
+            buffer_size: Number of bytes to buffer before each write, objects smaller than this are written at once.
+        """
+        self.filename = filename
+        self.temporary = f"{filename}.s3tmp"
+        self.loop = loop
+        self.executor = executor
+        self.callback = callback
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.file = None
+        self.disk_time = 0.0
+        # Bytes reported to the callback in the current attempt, taken back when it is retried
+        self.received = 0
+
+    async def __call__(self, chunk: bytes) -> None:
+        """Buffers a chunk and flushes the buffer when it is full."""
+        self.buffer.extend(chunk)
+        self.received += len(chunk)
+        self.callback(len(chunk))
+        if len(self.buffer) >= self.buffer_size:
+            await self.flush()
+
+    def _write(self, data: bytes) -> None:
+        """Opens the file on the first write and writes the data."""
+        start = time.perf_counter()
+        if self.file is None:
+            self.file = open(self.temporary, "wb")
+        self.file.write(data)
+        self.disk_time += time.perf_counter() - start
+
+    async def flush(self) -> None:
+        """Writes the buffered chunks to the file."""
+        data, self.buffer = self.buffer, bytearray()
+        await self.loop.run_in_executor(self.executor, self._write, data)
+
+    async def reset(self) -> None:
+        """Discards everything received so far, before a retry."""
+        self.buffer.clear()
+        self.callback(-self.received)
+        self.received = 0
+        if self.file is not None:
+            await self.loop.run_in_executor(self.executor, self._truncate)
+
+    def _truncate(self) -> None:
+        """Truncates the file to zero bytes."""
+        self.file.seek(0)
+        self.file.truncate()
+
+    def _close(self, data: bytes) -> None:
+        """Writes the remaining data, closes the file and moves it to the target."""
+        self._write(data)
+        self.file.close()
+        os.replace(self.temporary, self.filename)
+
+    async def close(self) -> None:
+        """Writes the remaining buffered chunks and closes the file."""
+        data, self.buffer = self.buffer, bytearray()
+        await self.loop.run_in_executor(self.executor, self._close, data)
+
+    def abort(self) -> None:
+        """Closes and removes the temporary file without writing the buffered chunks, leaving the target untouched."""
+        if self.file is not None:
+            self.file.close()
+            if os.path.exists(self.temporary):
+                os.remove(self.temporary)
@@ -0,0 +1,458 @@
+"""Rolling tar archives fed from the GET response bodies, with a SQLite index of the members.
+
+>>> ArchiveWriter
+
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Generator, Iterable
+from concurrent.futures import Executor
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from s3.squire import S3Object
+
+BLOCK_SIZE: int = tarfile.BLOCKSIZE  # 512 bytes
+READ_SIZE: int = 1024 * 256  # 256KB
+INDEX_NAME: str = "archive.index.sqlite"
+ARCHIVE_NAME: re.Pattern = re.compile(r"archive-(\d+)\.tar")
+
+
+def padding(size: int) -> bytes:
+    """Returns the zero bytes that pad a member to the next tar block."""
+    return bytes(-size % BLOCK_SIZE)
+
+
+class ArchiveIndex:
+    """Locates each member by its key, with the archive and the offset of its data.
+
+    >>> ArchiveIndex
+
+    """
+
+    def __init__(self, filename: str):
+        """Opens or creates the index.
+
+        Args:
+            filename: Path of the SQLite database.
+        """
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.pending = []
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS members ("
+            "key TEXT PRIMARY KEY, etag TEXT, size INTEGER, last_modified REAL, archive TEXT, offset INTEGER"
+            ") WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def contains(self, s3_object: S3Object) -> bool:
+        """Checks if the object is already archived with the same ETag and size.
+
+        Args:
+            s3_object: Object from the listing.
+
+        Returns:
+            bool:
+            Returns ``True`` if the archived member is current.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT etag, size FROM members WHERE key = ?", (s3_object.key,)).fetchone()
+        return row == (s3_object.etag, s3_object.size)
+
+    def locate(self, key: str) -> Optional[Tuple[str, int, int]]:
+        """Returns the archive, the offset of the data and the size of a member, or ``None`` if it's not archived."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT archive, offset, size FROM members WHERE key = ?", (key,)
+            ).fetchone()
+
+    def record(self, s3_object: S3Object, size: int, archive: str, offset: int) -> None:
+        """Records an archived member, until the writer commits it once its data is on disk.
+
+        Args:
+            s3_object: Object that was archived.
+            size: Number of bytes archived.
+            archive: Name of the archive that holds the member.
+            offset: Offset of the member's data in the archive.
+        """
+        with self.lock:
+            self.pending.append((s3_object.key, s3_object.etag, size, s3_object.last_modified, archive, offset))
+
+    def _flush(self) -> None:
+        """Commits the pending records, the lock must be held by the caller."""
+        if self.pending:
+            self.connection.executemany("INSERT OR REPLACE INTO members VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+            self.connection.commit()
+            self.pending.clear()
+
+    def flush(self) -> None:
+        """Commits the pending records to disk."""
+        with self.lock:
+            self._flush()
+
+    def members(self) -> Generator[Tuple[str, str, int]]:
+        """Yields the key, the archive and the size of each member, ordered by key."""
+        with self.lock:
+            rows = self.connection.execute("SELECT key, archive, size FROM members ORDER BY key").fetchall()
+        yield from rows
+
+    def close(self) -> None:
+        """Commits the pending records and closes the database."""
+        with self.lock:
+            self._flush()
+            self.connection.close()
+
+
+class ArchiveWriter:
+    """Writes the objects into rolling tar archives, instead of one file per object.
+
+    >>> ArchiveWriter
+
+    See Also:
+        - Archives are named ``archive-00000.tar``, ``archive-00001.tar`` and so on, each up to ``max_size``.
+        - Objects up to ``buffer_size`` are read into memory outside the lock, so only the write is serialized.
+        - Larger objects are spooled to a temporary file outside the lock, and only the local copy is serialized.
+        - Each run starts a new archive. Objects already archived with the same ETag and size are skipped.
+        - The archive is fsynced every ``flush_size`` members and when it is closed, not for each member.
+          The index only commits the members that have been synced, so an interrupted run never skips lost data.
+    """
+
+    def __init__(self, directory: str, max_size: int = 1024 * 1024 * 1024, buffer_size: int = 1024 * 1024 * 8,
+                 flush_size: int = 10000, read_size: int = READ_SIZE):
+        """Initializes the writer, opening or creating the index in the directory.
+
+        Args:
+            directory: Directory to write the archives to.
+            max_size: Size in bytes after which a new archive is started.
+            buffer_size: Objects up to this size are read into memory before being written.
+            flush_size: Number of members to write before syncing the archive and committing the index.
+            read_size: Size of each chunk read from the response bodies.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.buffer_size = buffer_size
+        self.flush_size = flush_size
+        self.read_size = read_size
+        self.index = ArchiveIndex(os.path.join(directory, INDEX_NAME))
+        self.lock = threading.Lock()
+        self.file = None
+        self.name = None
+        self.offset = 0
+        # Continues after the highest archive, as the earlier ones may have been deleted
+        self.sequence = max((int(match.group(1)) + 1 for filename in os.listdir(directory)
+                             if (match := ARCHIVE_NAME.fullmatch(filename))), default=0)
+
+    def contains(self, s3_object: S3Object) -> bool:
+        """Checks if the object is already archived with the same ETag and size."""
+        return self.index.contains(s3_object)
+
+    def _open(self) -> None:
+        """Starts the next archive, the lock must be held by the caller."""
+        self.name = f"archive-{self.sequence:05d}.tar"
+        self.sequence += 1
+        # Fails instead of truncating an archive that is still indexed
+        self.file = open(os.path.join(self.directory, self.name), "xb", buffering=1024 * 1024)
+        self.offset = 0
+
+    def _close(self) -> None:
+        """Writes the end of the archive and syncs it to disk, the lock must be held by the caller."""
+        if self.file is None:
+            return
+        self.file.write(bytes(BLOCK_SIZE * 2))
+        self._commit()
+        self.file.close()
+        self.file = None
+
+    def _commit(self) -> None:
+        """Syncs the archive to disk and commits its members to the index, the lock must be held by the caller."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.index.flush()
+
+    def _advance(self, s3_object: S3Object, header: bytes, offset: int, size: int) -> None:
+        """Records a member written at the offset, the lock must be held by the caller."""
+        self.offset += len(header) + size + len(padding(size))
+        self.index.record(s3_object, size, self.name, offset + len(header))
+        if len(self.index.pending) >= self.flush_size:
+            self._commit()
+
+    def _header(self, s3_object: S3Object, size: int) -> bytes:
+        """Returns the tar header of a member, with a PAX extension for long keys."""
+        info = tarfile.TarInfo(name=s3_object.key)
+        info.size = size
+        info.mtime = int(s3_object.last_modified or time.time())
+        info.mode = 0o644
+        return info.tobuf(format=tarfile.PAX_FORMAT)
+
+    def _reserve(self, header: bytes, size: int) -> int:
+        """Rolls over to a new archive if the member doesn't fit, and returns the offset of its header."""
+        if self.file is None:
+            self._open()
+        elif self.offset and self.offset + len(header) + size > self.max_size:
+            self._close()
+            self._open()
+        return self.offset
+
+    def add(self, s3_object: S3Object, chunks: Iterable[bytes], size: int,
+            callback: Callable[[int], None] = None) -> float:
+        """Adds an object to the current archive.
+
+        Args:
+            s3_object: Object to add.
+            chunks: Body of the object, as an iterable of chunks.
+            size: Number of bytes in the body, from the ``Content-Length`` of the response.
+            callback: Callable that receives the number of bytes received with each chunk.
+
+        Raises:
+            ValueError: If the body is shorter or longer than ``size``.
+
+        Returns:
+            float:
+            Returns the seconds spent writing to the archive.
+        """
+        if size <= self.buffer_size:
+            data = bytearray()
+            for chunk in chunks:
+                data.extend(chunk)
+                if callback:
+                    callback(len(chunk))
+            if len(data) != size:
+                raise ValueError(f"Expected {size} bytes for {s3_object.key}, received {len(data)}")
+            return self.write(s3_object, data)
+        disk = 0.0
+        # The body is spooled outside the lock, so a slow stream doesn't hold up the other writers
+        with tempfile.TemporaryFile(dir=self.directory) as spool:
+            for chunk in chunks:
+                start = time.perf_counter()
+                spool.write(chunk)
+                disk += time.perf_counter() - start
+                if callback:
+                    callback(len(chunk))
+            if (received := spool.tell()) != size:
+                raise ValueError(f"Expected {size} bytes for {s3_object.key}, received {received}")
+            spool.seek(0)
+            return disk + self.append(s3_object, spool, size)
+
+    def append(self, s3_object: S3Object, spool: BinaryIO, size: int) -> float:
+        """Copies an object spooled to a local file into the current archive.
+
+        Args:
+            s3_object: Object to add.
+            spool: File positioned at the start of the body.
+            size: Number of bytes in the body.
+
+        Returns:
+            float:
+            Returns the seconds spent writing to the archive.
+        """
+        header = self._header(s3_object, size)
+        start = time.perf_counter()
+        with self.lock:
+            offset = self._reserve(header, size)
+            try:
+                self.file.write(header)
+                shutil.copyfileobj(spool, self.file, self.read_size)
+                self.file.write(padding(size))
+            except BaseException:
+                # Cuts the partial member back out, so the archive stays readable
+                self.file.seek(offset)
+                self.file.truncate()
+                raise
+            self._advance(s3_object, header, offset, size)
+        return time.perf_counter() - start
+
+    def write(self, s3_object: S3Object, data: bytes) -> float:
+        """Adds an object that is already in memory to the current archive, without copying it.
+
+        Args:
+            s3_object: Object to add.
+            data: Body of the object.
+
+        Returns:
+            float:
+            Returns the seconds spent writing to the archive.
+        """
+        size = len(data)
+        header = self._header(s3_object, size)
+        start = time.perf_counter()
+        with self.lock:
+            offset = self._reserve(header, size)
+            self.file.write(header)
+            self.file.write(data)
+            self.file.write(padding(size))
+            self._advance(s3_object, header, offset, size)
+        return time.perf_counter() - start
+
+    def finish(self) -> None:
+        """Closes the current archive and commits the index, the next object starts a new archive."""
+        with self.lock:
+            self._close()
+
+    def close(self) -> None:
+        """Closes the current archive and the index."""
+        self.finish()
+        self.index.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        """Returns the writer."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Closes the current archive and the index."""
+        self.close()
+
+
+class ArchiveSink:
+    """Buffers a response of the asyncio engine and adds it to the archive on an executor.
+
+    >>> ArchiveSink
+
+    See Also:
+        - Objects up to the ``buffer_size`` of the archive are held in memory and written without another copy.
+        - Larger objects are spilled to a temporary file as they arrive, then copied into the archive.
+    """
+
+    def __init__(self, archive: ArchiveWriter, s3_object: S3Object, loop: asyncio.AbstractEventLoop,
+                 executor: Executor, callback: Callable[[int], None]):
+        """Initializes the sink.
+
+        Args:
+            archive: Writer of the archives.
+            s3_object: Object being downloaded.
+            loop: Running event loop.
+            executor: Executor to run the blocking disk I/O in.
+            callback: Callable that receives the number of bytes received with each chunk.
+        """
+        self.archive = archive
+        self.s3_object = s3_object
+        self.loop = loop
+        self.executor = executor
+        self.callback = callback
+        self.buffer = bytearray()
+        self.spool = None
+        self.disk_time = 0.0
+        # Bytes reported to the callback in the current attempt, taken back when it is retried
+        self.received = 0
+
+    async def __call__(self, chunk: bytes) -> None:
+        """Buffers a chunk and spills the buffer to the temporary file when it is full."""
+        self.buffer.extend(chunk)
+        self.received += len(chunk)
+        self.callback(len(chunk))
+        if len(self.buffer) >= self.archive.buffer_size:
+            data, self.buffer = self.buffer, bytearray()
+            await self.loop.run_in_executor(self.executor, self._spill, data)
+
+    def _spill(self, data: bytearray) -> None:
+        """Creates the temporary file on the first spill and appends the data."""
+        if self.spool is None:
+            self.spool = tempfile.TemporaryFile(dir=self.archive.directory)
+        self.spool.write(data)
+
+    async def reset(self) -> None:
+        """Discards everything received so far, before a retry."""
+        self.buffer.clear()
+        self.callback(-self.received)
+        self.received = 0
+        if self.spool is not None:
+            await self.loop.run_in_executor(self.executor, self._discard)
+
+    def _discard(self) -> None:
+        """Closes and removes the temporary file."""
+        self.spool.close()
+        self.spool = None
+
+    def _add(self) -> float:
+        """Adds the buffered or the spilled object to the archive."""
+        if self.spool is None:
+            return self.archive.write(self.s3_object, self.buffer)
+        try:
+            self.spool.write(self.buffer)
+            size = self.spool.tell()
+            self.spool.seek(0)
+            return self.archive.append(self.s3_object, self.spool, size)
+        finally:
+            self._discard()
+
+    async def close(self) -> None:
+        """Adds the object to the archive."""
+        try:
+            self.disk_time = await self.loop.run_in_executor(self.executor, self._add)
+        finally:
+            self.buffer = bytearray()
+
+    def abort(self) -> None:
+        """Discards the buffered object."""
+        self.buffer.clear()
+        if self.spool is not None:
+            self._discard()
+
+
+class ArchiveReader:
+    """Reads the members back from the archives, using the index instead of scanning the archives.
+
+    >>> ArchiveReader
+
+    """
+
+    def __init__(self, directory: str):
+        """Opens the index of the archives in the directory.
+
+        Args:
+            directory: Directory with the archives and their index.
+
+        Raises:
+            FileNotFoundError: If the directory has no index.
+        """
+        filename = os.path.join(directory, INDEX_NAME)
+        if not os.path.isfile(filename):
+            raise FileNotFoundError(f"No archive index found at {filename!r}")
+        self.directory = directory
+        self.index = ArchiveIndex(filename)
+
+    def read(self, key: str) -> bytes:
+        """Reads a single member with one seek.
+
+        Args:
+            key: Object key of the member.
+
+        Raises:
+            KeyError: If the key is not archived.
+
+        Returns:
+            bytes:
+            Returns the content of the object.
+        """
+        if not (location := self.index.locate(key)):
+            raise KeyError(key)
+        archive, offset, size = location
+        with open(os.path.join(self.directory, archive), "rb") as file:
+            file.seek(offset)
+            return file.read(size)
+
+    def members(self) -> Generator[Tuple[str, str, int]]:
+        """Yields the key, the archive and the size of each member, ordered by key."""
+        yield from self.index.members()
+
+    def archives(self) -> Dict[str, List[str]]:
+        """Returns the keys held by each archive."""
+        archives: Dict[str, List[str]] = {}
+        for key, archive, _ in self.members():
+            archives.setdefault(archive, []).append(key)
+        return archives
+
+    def close(self) -> None:
+        """Closes the index."""
+        self.index.close()
@@ -0,0 +1,220 @@
+"""Compact, array-backed catalog of the listed objects, with an external merge sort above a memory budget.
+
+>>> Catalog
+
+"""
+
+import heapq
+import itertools
+import os
+import shutil
+import struct
+import tempfile
+import weakref
+from array import array
+from collections.abc import Callable, Generator, Iterable
+from typing import Any, List, Optional, Tuple
+
+from s3.squire import S3Object, Sort
+
+# Size, last modified, key length and etag length of each record spilled to disk
+RECORD = struct.Struct("<qdHB")
+READ_SIZE: int = 1024 * 1024  # 1MB
+# Approximate bytes used by each entry besides the key and etag, including the sort index
+ENTRY_OVERHEAD: int = 64
+
+
+class StringColumn:
+    """Stores strings back to back in a single buffer, instead of one Python object per string.
+
+    >>> StringColumn
+
+    """
+
+    def __init__(self):
+        """Initializes an empty column."""
+        self.buffer = bytearray()
+        self.offsets = array("Q", [0])
+
+    def __len__(self) -> int:
+        """Returns the number of strings in the column."""
+        return len(self.offsets) - 1
+
+    def append(self, value: Optional[str]) -> None:
+        """Appends a string to the column, with ``None`` stored as an empty string."""
+        if value:
+            self.buffer.extend(value.encode())
+        self.offsets.append(len(self.buffer))
+
+    def raw(self, index: int) -> bytes:
+        """Returns the encoded string at the given index."""
+        return bytes(self.buffer[self.offsets[index]:self.offsets[index + 1]])
+
+    def __getitem__(self, index: int) -> str:
+        """Returns the string at the given index."""
+        return self.raw(index).decode()
+
+    @property
+    def nbytes(self) -> int:
+        """Returns the number of bytes used by the column."""
+        return len(self.buffer) + self.offsets.itemsize * len(self.offsets)
+
+
+def sort_key(sort: Sort) -> Tuple[Optional[Callable[[S3Object], Any]], bool]:
+    """Returns the key function and the direction for a sorting option.
+
+    Args:
+        sort: Sorting option.
+
+    Returns:
+        Tuple[Optional[Callable[[S3Object], Any]], bool]:
+        Returns the key function, ``None`` for the listing order, and whether the order is descending.
+    """
+    if sort in (Sort.size, Sort.size_desc):
+        return lambda obj: obj.size, sort == Sort.size_desc
+    if sort in (Sort.key, Sort.key_desc):
+        return lambda obj: obj.key, sort == Sort.key_desc
+    if sort in (Sort.last_modified, Sort.last_modified_desc):
+        return lambda obj: obj.last_modified or 0.0, sort == Sort.last_modified_desc
+    assert sort == Sort.no_sort, f"Invalid sort option: {sort!r}"
+    return None, False
+
+
+class Catalog:
+    """Holds the listed objects in compact columns, spilling sorted runs to disk above a memory budget.
+
+    >>> Catalog
+
+    See Also:
+        - Keys and ETags are stored back to back in byte buffers, sizes and mtimes in typed arrays.
+        - Once the columns exceed the memory budget, they are sorted and spilled to disk as a run.
+        - Iterating merges the runs lazily, so memory stays within the budget regardless of the bucket size.
+    """
+
+    def __init__(self, sort: Sort = Sort.no_sort, memory_budget: int = 1024 * 1024 * 256):
+        """Initializes an empty catalog.
+
+        Args:
+            sort: Order in which the objects are iterated.
+            memory_budget: Number of bytes to hold in memory before spilling to disk.
+        """
+        self.sort = Sort(sort)
+        self.key_func, self.reverse = sort_key(self.sort)
+        self.memory_budget = memory_budget
+        self.runs: List[str] = []
+        self.count = 0
+        self.total_size = 0
+        self.directory = None
+        self._reset()
+
+    def _reset(self) -> None:
+        """Starts a new set of in-memory columns."""
+        self.keys = StringColumn()
+        self.etags = StringColumn()
+        self.sizes = array("q")
+        self.mtimes = array("d")
+
+    def __len__(self) -> int:
+        """Returns the total number of objects in the catalog."""
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        """Returns the approximate number of bytes held in memory."""
+        return self.keys.nbytes + self.etags.nbytes + len(self.sizes) * ENTRY_OVERHEAD
+
+    def append(self, s3_object: S3Object) -> None:
+        """Adds an object to the catalog.
+
+        Args:
+            s3_object: Object to add.
+        """
+        self.keys.append(s3_object.key)
+        self.etags.append(s3_object.etag)
+        self.sizes.append(s3_object.size)
+        self.mtimes.append(s3_object.last_modified or 0.0)
+        self.count += 1
+        self.total_size += s3_object.size
+        if self.nbytes >= self.memory_budget:
+            self.spill()
+
+    def extend(self, s3_objects: Iterable[S3Object]) -> None:
+        """Adds multiple objects to the catalog.
+
+        Args:
+            s3_objects: Objects to add.
+        """
+        for s3_object in s3_objects:
+            self.append(s3_object)
+
+    def _object(self, index: int) -> S3Object:
+        """Materializes the object at the given index of the in-memory columns."""
+        return S3Object(key=self.keys[index], size=self.sizes[index],
+                        etag=self.etags[index] or None, last_modified=self.mtimes[index] or None)
+
+    def _ordered(self) -> Generator[S3Object]:
+        """Yields the in-memory objects in the sorted order."""
+        indices = range(len(self.sizes))
+        if self.sort in (Sort.size, Sort.size_desc):
+            indices = sorted(indices, key=self.sizes.__getitem__, reverse=self.reverse)
+        elif self.sort in (Sort.key, Sort.key_desc):
+            # UTF-8 byte order is the same as the code point order, so the keys don't have to be decoded
+            indices = sorted(indices, key=self.keys.raw, reverse=self.reverse)
+        elif self.sort in (Sort.last_modified, Sort.last_modified_desc):
+            indices = sorted(indices, key=self.mtimes.__getitem__, reverse=self.reverse)
+        for index in indices:
+            yield self._object(index)
+
+    def spill(self) -> None:
+        """Sorts the in-memory columns and writes them to disk as a run."""
+        if not len(self.sizes):
+            return
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="s3-catalog-")
+            weakref.finalize(self, shutil.rmtree, self.directory, True)
+        filename = os.path.join(self.directory, f"run-{len(self.runs):06d}")
+        with open(filename, "wb", buffering=READ_SIZE) as file:
+            for s3_object in self._ordered():
+                key = s3_object.key.encode()
+                etag = (s3_object.etag or "").encode()
+                file.write(RECORD.pack(s3_object.size, s3_object.last_modified or 0.0, len(key), len(etag)))
+                file.write(key)
+                file.write(etag)
+        self.runs.append(filename)
+        self._reset()
+
+    @staticmethod
+    def _read(filename: str) -> Generator[S3Object]:
+        """Reads the objects from a run in the order they were written."""
+        with open(filename, "rb", buffering=READ_SIZE) as file:
+            while header := file.read(RECORD.size):
+                size, mtime, key_length, etag_length = RECORD.unpack(header)
+                key = file.read(key_length).decode()
+                etag = file.read(etag_length).decode()
+                yield S3Object(key=key, size=size, etag=etag or None, last_modified=mtime or None)
+
+    def __iter__(self) -> Generator[S3Object]:
+        """Yields the objects in the sorted order, merging the runs spilled to disk."""
+        if not self.runs:
+            yield from self._ordered()
+            return
+        sources = [self._read(filename) for filename in self.runs] + [self._ordered()]
+        if self.key_func is None:
+            yield from itertools.chain.from_iterable(sources)
+        else:
+            yield from heapq.merge(*sources, key=self.key_func, reverse=self.reverse)
+
+    def __enter__(self) -> "Catalog":
+        """Returns the catalog, whose runs are removed on exit."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Removes the runs spilled to disk."""
+        self.close()
+
+    def close(self) -> None:
+        """Removes the runs spilled to disk."""
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+        self.runs.clear()
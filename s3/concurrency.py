@@ -0,0 +1,140 @@
+"""Adaptive concurrency controller that grows or shrinks the number of active workers at runtime.
+
+>>> AIMDController
+
+"""
+
+import logging
+import threading
+import time
+from typing import Any, List, Tuple
+
+# Error codes S3 responds with when the request rate has to be reduced
+THROTTLE_CODES = frozenset({"SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded",
+                            "TooManyRequestsException", "503"})
+# Operations sent by the downloads, throttles of the listing are not caused by the number of active workers
+DOWNLOAD_OPERATIONS = frozenset({"GetObject", "HeadObject"})
+
+
+class AIMDController:
+    """Limits the number of active workers using additive increase and multiplicative decrease.
+
+    >>> AIMDController
+
+    See Also:
+        - Every round of ``limit`` completed requests without throttling grows the limit by ``increase``.
+        - A round whose latency rose past ``latency_tolerance`` times the best latency without improving throughput,
+          shrinks the limit by ``increase`` instead.
+        - Throttling responses shrink the limit by ``decrease``, at most once per round.
+        - Only the requests that transferred an object are counted towards a round, the skipped ones are not.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, increase: int = 1,
+                 decrease: float = 0.5, latency_tolerance: float = 2.0, logger: logging.Logger = None):
+        """Initializes the controller.
+
+        Args:
+            initial: Initial number of active workers.
+            minimum: Lower bound for the number of active workers.
+            maximum: Upper bound for the number of active workers.
+            increase: Number of workers to add after each successful round.
+            decrease: Factor to multiply the number of workers with when throttled.
+            latency_tolerance: Ratio to the best observed latency beyond which the limit stops growing.
+            logger: Logger to log the adjustments.
+        """
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.logger = logger or logging.getLogger(__name__)
+        self.active = 0
+        self.peak = self.limit
+        self.throttles = 0
+        self.history: List[Tuple[float, int, str]] = [(time.time(), self.limit, "initial")]
+        self.condition = threading.Condition()
+        self._start_round()
+        self.best_latency = None
+        self.last_throughput = 0.0
+
+    def _start_round(self) -> None:
+        """Resets the counters for the next round."""
+        self.round_start = time.time()
+        self.round_count = 0
+        self.round_bytes = 0
+        self.round_latency = 0.0
+        self.round_throttled = False
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        """Updates the limit within the bounds and wakes up the waiting workers."""
+        limit = min(max(limit, self.minimum), self.maximum)
+        if limit != self.limit:
+            self.logger.info("Concurrency %s from %d to %d", reason, self.limit, limit)
+            self.limit = limit
+            self.peak = max(self.peak, limit)
+            self.history.append((time.time(), limit, reason))
+            self.condition.notify_all()
+
+    def acquire(self) -> None:
+        """Blocks until the number of active workers is below the limit."""
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, latency: float, size: int, sampled: bool = True) -> None:
+        """Frees the slot of a completed request and adjusts the limit at the end of each round.
+
+        Args:
+            latency: Time taken by the request in seconds.
+            size: Number of bytes transferred.
+            sampled: Whether the request counts towards the round, ``False`` for objects that were skipped.
+        """
+        with self.condition:
+            self.active -= 1
+            if sampled:
+                self.round_count += 1
+                self.round_bytes += size
+                self.round_latency += latency
+                if self.round_count >= self.limit:
+                    self._end_round()
+            self.condition.notify()
+
+    def throttled(self) -> None:
+        """Shrinks the limit multiplicatively, at most once per round."""
+        with self.condition:
+            self.throttles += 1
+            if not self.round_throttled:
+                self._set_limit(int(self.limit * self.decrease), "decreased after throttling")
+                self._start_round()
+                self.round_throttled = True
+
+    def _end_round(self) -> None:
+        """Grows or shrinks the limit based on the latency and throughput of the round."""
+        if self.round_throttled:
+            self._start_round()
+            return
+        latency = self.round_latency / self.round_count
+        throughput = self.round_bytes / max(time.time() - self.round_start, 1e-6)
+        self.best_latency = min(self.best_latency or latency, latency)
+        if latency > self.best_latency * self.latency_tolerance and throughput <= self.last_throughput:
+            self._set_limit(self.limit - self.increase, "decreased after latency rose")
+        else:
+            self._set_limit(self.limit + self.increase, "increased")
+        self.last_throughput = throughput
+        self._start_round()
+
+    def on_retry(self, response: Any = None, operation: Any = None, **_) -> None:
+        """Botocore ``needs-retry`` event handler that detects throttling responses of the downloads.
+
+        Args:
+            response: Tuple of the HTTP response and the parsed response, or ``None`` for connection errors.
+            operation: Model of the operation that was sent.
+        """
+        if not response or getattr(operation, "name", None) not in DOWNLOAD_OPERATIONS:
+            return
+        http_response, parsed = response
+        code = (parsed or {}).get("Error", {}).get("Code")
+        if code in THROTTLE_CODES or getattr(http_response, "status_code", None) == 503:
+            self.throttled()
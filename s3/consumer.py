@@ -0,0 +1,183 @@
+"""Building blocks to consume the objects from memory as they complete, without writing them to disk.
+
+>>> ObjectResult
+
+"""
+
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Optional
+
+from s3.squire import S3Object
+
+# Prefix of the response headers that carry the user defined metadata of an object
+METADATA_PREFIX: str = "x-amz-meta-"
+
+
+class Engine(Enum):
+    """Enum to represent the engines that download the objects into memory.
+
+    >>> Engine
+
+    """
+
+    threads: str = "threads"
+    asyncio: str = "asyncio"
+
+
+@dataclass
+class ObjectResult:
+    """Represents a completed download held in memory.
+
+    >>> ObjectResult
+
+    """
+
+    s3_object: S3Object
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: Optional[bytearray] = None
+    error: Optional[Exception] = None
+
+    @property
+    def key(self) -> str:
+        """Returns the key of the object."""
+        return self.s3_object.key
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        """Returns the user defined metadata of the object, without the ``x-amz-meta-`` prefix."""
+        return {name[len(METADATA_PREFIX):]: value for name, value in self.headers.items()
+                if name.startswith(METADATA_PREFIX)}
+
+
+class MemoryBudget:
+    """Limits the bytes and the number of bodies held in memory at once, between the downloads and the consumer.
+
+    >>> MemoryBudget
+
+    See Also:
+        - An object larger than the budget is admitted once nothing else is held, so it cannot block forever.
+    """
+
+    def __init__(self, max_bytes: int, max_count: int):
+        """Initializes an empty budget.
+
+        Args:
+            max_bytes: Maximum number of bytes held at once.
+            max_count: Maximum number of bodies held at once.
+        """
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        self.used = 0
+        self.count = 0
+        self.peak = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def acquire(self, size: int) -> bool:
+        """Blocks until the body fits in the budget.
+
+        Args:
+            size: Size of the body in bytes.
+
+        Returns:
+            bool:
+            Returns ``False`` if the budget was closed, as the consumer has stopped.
+        """
+        with self.condition:
+            while not self.closed and self.count and (self.count >= self.max_count or
+                                                      self.used + size > self.max_bytes):
+                self.condition.wait()
+            if self.closed:
+                return False
+            self.used += size
+            self.count += 1
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, size: int) -> None:
+        """Returns a body's share of the budget once the consumer is done with it."""
+        with self.condition:
+            self.used -= size
+            self.count -= 1
+            self.condition.notify_all()
+
+    def close(self) -> None:
+        """Wakes up the waiters and refuses any further body."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+def read_into(stream, buffer: bytearray, callback: Callable[[int], None] = None) -> None:
+    """Fills the buffer from a response body, without the intermediate copies of ``read``.
+
+    Args:
+        stream: File-like response body that supports ``readinto``.
+        buffer: Buffer of exactly the size of the body.
+        callback: Callable that receives the number of bytes received with each read.
+
+    Raises:
+        ValueError: If the body ends before the buffer is full.
+    """
+    with memoryview(buffer) as view:
+        received = 0
+        while received < len(view):
+            if not (count := stream.readinto(view[received:])):
+                raise ValueError(f"Expected {len(view)} bytes, received {received}")
+            received += count
+            if callback:
+                callback(count)
+
+
+class BufferSink:
+    """Writes the chunks of a response of the asyncio engine straight into a preallocated buffer.
+
+    >>> BufferSink
+
+    """
+
+    def __init__(self, size: int, callback: Callable[[int], None] = None):
+        """Initializes the sink.
+
+        Args:
+            size: Size of the object from the listing.
+            callback: Callable that receives the number of bytes received with each chunk.
+        """
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.callback = callback
+        self.offset = 0
+
+    async def __call__(self, chunk: bytes) -> None:
+        """Copies a chunk at the current offset."""
+        end = self.offset + len(chunk)
+        if end > len(self.view):
+            raise ValueError(f"Expected {len(self.view)} bytes, received at least {end}")
+        self.view[self.offset:end] = chunk
+        self.offset = end
+        if self.callback:
+            self.callback(len(chunk))
+
+    async def reset(self) -> None:
+        """Starts over at the beginning of the buffer, before a retry."""
+        if self.callback:
+            self.callback(-self.offset)
+        self.offset = 0
+
+    def close(self) -> bytearray:
+        """Returns the filled buffer.
+
+        Raises:
+            ValueError: If the body was shorter than the object.
+        """
+        self.view.release()
+        if self.offset != len(self.buffer):
+            raise ValueError(f"Expected {len(self.buffer)} bytes, received {self.offset}")
+        return self.buffer
+
+    def abort(self) -> None:
+        """Releases the buffer."""
+        self.view.release()
@@ -0,0 +1,150 @@
+"""Downloads byte-identical objects once, and materializes the duplicates from the local copy.
+
+>>> Deduplicator
+
+"""
+
+import errno
+import os
+import shutil
+from collections.abc import Callable, Generator, Iterable
+from typing import Dict, List, Set, Tuple
+
+from s3.squire import S3Object
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl request to share the extents of another file, from linux/fs.h
+FICLONE: int = 0x40049409
+# Errors that mean a method is not supported by the filesystem at all, rather than failing for a single file
+UNSUPPORTED = frozenset({errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EPERM,
+                         errno.ENOSYS})
+
+
+def reflink(source: str, target: str) -> None:
+    """Creates a copy-on-write clone of the source, sharing its blocks until either file is modified.
+
+    Args:
+        source: Path of the existing file.
+        target: Path of the clone.
+
+    Raises:
+        OSError: If the filesystem doesn't support reflinks, such as ext4, or the platform is not Linux.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def hardlink(source: str, target: str) -> None:
+    """Links the target to the same inode as the source, so modifying one modifies both."""
+    os.link(source, target)
+
+
+def copy(source: str, target: str) -> None:
+    """Copies the source to the target, using the fastest copy available to ``shutil``."""
+    shutil.copyfile(source, target)
+
+
+METHODS: Dict[str, Callable[[str, str], None]] = dict(reflink=reflink, hardlink=hardlink, copy=copy)
+
+
+class Deduplicator:
+    """Groups the listing by ETag and size, so each distinct object is downloaded once.
+
+    >>> Deduplicator
+
+    See Also:
+        - The first object listed for each ``(ETag, size)`` is downloaded, the rest are recorded as duplicates.
+        - Objects without an ETag are never grouped. Objects encrypted with SSE-KMS or SSE-C have ETags that are
+          not a digest of their content, so their copies are not detected, but they are not mistaken either.
+        - Duplicates are materialized with the first method that works, in the order of ``methods``.
+        - A method that the filesystem doesn't support is not attempted again for the rest of the run.
+    """
+
+    def __init__(self, methods: Iterable[str] = ("reflink", "hardlink", "copy")):
+        """Initializes an empty deduplicator.
+
+        Args:
+            methods: Methods to materialize the duplicates with, in the order of preference.
+
+        Raises:
+            ValueError: If a method is unknown.
+        """
+        self.methods = tuple(methods)
+        if unknown := set(self.methods) - set(METHODS):
+            raise ValueError(f"Unknown deduplication methods: {sorted(unknown)}, available: {list(METHODS)}")
+        self.primaries: Dict[Tuple[str, int], str] = {}
+        self.duplicates: List[Tuple[S3Object, str]] = []
+        self.unsupported: Set[str] = set()
+        self.usage: Dict[str, int] = dict.fromkeys(self.methods, 0)
+        self.saved = 0
+
+    def split(self, s3_objects: Iterable[S3Object]) -> List[S3Object]:
+        """Records the duplicates among the objects, and returns the ones that have to be downloaded.
+
+        Args:
+            s3_objects: Objects from the listing.
+
+        Returns:
+            List[S3Object]:
+            Returns the first object listed for each ``(ETag, size)``, along with the objects without an ETag.
+        """
+        unique = []
+        for s3_object in s3_objects:
+            # Folder markers are all empty, but they are not files to materialize
+            if not s3_object.etag or s3_object.key.endswith("/"):
+                unique.append(s3_object)
+                continue
+            content = (s3_object.etag, s3_object.size)
+            if primary := self.primaries.get(content):
+                self.duplicates.append((s3_object, primary))
+            else:
+                self.primaries[content] = s3_object.key
+                unique.append(s3_object)
+        return unique
+
+    def pending(self) -> Generator[Tuple[S3Object, str]]:
+        """Yields each duplicate with the key of the object it duplicates, and forgets them."""
+        duplicates, self.duplicates = self.duplicates, []
+        yield from duplicates
+
+    def materialize(self, source: str, target: str) -> str:
+        """Materializes a duplicate from the local copy of the object it duplicates.
+
+        Args:
+            source: Path of the downloaded object.
+            target: Path of the duplicate.
+
+        Raises:
+            OSError: If none of the methods worked.
+
+        Returns:
+            str:
+            Returns the method that was used.
+        """
+        temporary = f"{target}.dedup"
+        error = OSError(errno.EOPNOTSUPP, "No deduplication method is available")
+        for method in self.methods:
+            if method in self.unsupported:
+                continue
+            try:
+                METHODS[method](source, temporary)
+                # Replaces an outdated file in one step, as a hardlink cannot be created over an existing file
+                os.replace(temporary, target)
+            except OSError as exc:
+                error = exc
+                if os.path.lexists(temporary):
+                    os.remove(temporary)
+                # Copies work on any filesystem, so their failures are specific to the file
+                if exc.errno in UNSUPPORTED and method != "copy":
+                    self.unsupported.add(method)
+                continue
+            self.usage[method] += 1
+            self.saved += os.path.getsize(target)
+            return method
+        raise error
@@ -1,21 +1,52 @@
-import json
+import asyncio
+import contextlib
+import functools
+import heapq
 import logging
+import math
 import os
+import queue
+import random
+import sys
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List, Union
+from collections.abc import Generator
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                as_completed, wait)
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import boto3
 from alive_progress import alive_bar
 from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
-from s3.exceptions import BucketNotFound, InvalidPrefix, NoObjectFound
-from s3.logger import LogType, default_logger
-from s3.progress import ProgressPercentage
-from s3.squire import (DownloadResults, S3Object, Sort,
-                       convert_to_folder_structure, format_bucket_structure,
-                       refine_prefix, size_converter)
+from s3.aio import ConnectionPool, FileSink, fetch
+from s3.archive import ArchiveSink, ArchiveWriter
+from s3.catalog import Catalog
+from s3.concurrency import AIMDController
+from s3.consumer import (BufferSink, Engine, MemoryBudget, ObjectResult,
+                         read_into)
+from s3.dedup import Deduplicator
+from s3.exceptions import (BucketAccessDenied, BucketNotFound, InvalidPrefix,
+                           NoObjectFound)
+from s3.failures import FailureQueue, read_failures
+from s3.filters import ObjectFilter
+from s3.listing import Lister
+from s3.local import LocalIndex
+from s3.logger import LogFormat, LogType, default_logger
+from s3.manifest import Manifest
+from s3.metrics import Metrics, MetricsWriter
+from s3.plan import Plan, Probe
+from s3.progress import HeadlessBar, ProgressAggregator, ProgressPercentage
+from s3.ranged import RangedDownload
+from s3.scheduler import Scheduler
+from s3.shard import Shard, ShardStrategy
+from s3.snapshot import Refresh, Snapshot
+from s3.squire import (DownloadResults, Folder, S3Object, Sort, build_tree,
+                       iter_bucket_json, iter_folder_structure, refine_prefix,
+                       size_converter)
 
 
 class Downloader:
@@ -38,11 +69,13 @@ class Downloader:
     TRANSFER_CONFIG: TransferConfig = TransferConfig(
         max_concurrency=10,
         num_download_attempts=10,
-        multipart_threshold=1024 * 8,  # 8MB
-        multipart_chunksize=1024 * 8,  # 8MB
+        multipart_threshold=1024 * 1024 * 8,  # 8MB
+        multipart_chunksize=1024 * 1024 * 8,  # 8MB
         use_threads=True
     )
 
+    RESUME_CHUNKSIZE: int = 1024 * 1024 * 16  # 16MB
+
     def __init__(self, bucket_name: str,
                  download_dir: str = None,
                  region_name: str = None,
@@ -51,10 +84,40 @@ class Downloader:
                  aws_secret_access_key: str = None,
                  logger: logging.Logger = None,
                  log_type: LogType = LogType.stdout,
+                 log_format: Union[str, LogFormat] = LogFormat.text,
                  sort: Sort = Sort.no_sort,
                  prefix: Union[str, List[str]] = None,
                  retry_config: Config = RETRY_CONFIG,
-                 transfer_config: TransferConfig = TRANSFER_CONFIG):
+                 transfer_config: TransferConfig = TRANSFER_CONFIG,
+                 endpoint_url: str = None,
+                 list_workers: int = 1,
+                 list_depth: int = 1,
+                 key_splits: int = 0,
+                 manifest: str = None,
+                 resumable: bool = False,
+                 range_workers: int = 0,
+                 memory_budget: int = 1024 * 1024 * 256,
+                 headless: bool = False,
+                 metrics: str = None,
+                 metrics_interval: float = 10.0,
+                 shard: Union[str, Shard] = None,
+                 shard_strategy: Union[str, ShardStrategy] = ShardStrategy.hash,
+                 shard_summary: str = None,
+                 archive: bool = False,
+                 archive_size: int = 1024 * 1024 * 1024,
+                 dedup: bool = False,
+                 include: List[str] = None,
+                 exclude: List[str] = None,
+                 min_size: Union[int, str] = None,
+                 max_size: Union[int, str] = None,
+                 modified_since: Union[datetime, float, str] = None,
+                 modified_before: Union[datetime, float, str] = None,
+                 snapshot: str = None,
+                 snapshot_ttl: float = 3600.0,
+                 snapshot_refresh: Union[str, Refresh] = Refresh.full,
+                 failure_manifest: str = None,
+                 tail_retries: int = 3,
+                 retry_workers: int = 2):
         """Initiates all the necessary args and creates a boto3 session with retry logic.
 
         Args:
@@ -66,15 +129,63 @@ class Downloader:
             aws_secret_access_key: AWS secret access key.
             logger: Bring your own logger.
             log_type: Type of logging output. Defaults to stdout.
+            log_format: Format of the default logger's records, ``text`` or compact ``json`` lines.
             sort: Sorting options for the files to be downloaded. Defaults to no_sort.
             prefix: Specific path [OR] list of paths from which the objects have to be downloaded.
             retry_config: Custom retry configuration for boto3 client. Defaults to RETRY_CONFIG.
             transfer_config: Custom transfer configuration for boto3 client. Defaults to TRANSFER_CONFIG.
+            endpoint_url: Custom endpoint URL for S3 compatible storage.
+            list_workers: Number of shards to list concurrently. Defaults to a single serial paginator.
+            list_depth: Number of folder levels to walk for discovering the shards when ``list_workers`` > 1.
+            key_splits: Number of key ranges to split each discovered shard into.
+            manifest: Path of the SQLite manifest to sync incrementally, based on the ETag and size of each object.
+            resumable: Download objects larger than ``RESUME_CHUNKSIZE`` in byte ranges that survive interruptions.
+            range_workers: Fetch the byte ranges of objects larger than ``RESUME_CHUNKSIZE`` in parallel with this
+                many threads, writing each range at its offset in a preallocated file. Implies ``resumable``.
+            memory_budget: Bytes of listing to hold in memory before spilling sorted runs to disk. Defaults to 256MB.
+            headless: Disable the progress bar entirely for batch runs, logging only a summary of the throughput.
+            metrics: Path of the file to write the metrics to, as Prometheus text for ``.prom`` files or JSON.
+            metrics_interval: Seconds between each write of the metrics file during the run.
+            shard: Shard of the bucket to download in ``index/count`` notation, such as ``2/4``, or a ``Shard``.
+            shard_strategy: Strategy for assigning the objects to the shards, by ``hash`` or balanced by ``size``.
+            shard_summary: Path of the completion summary of the shard. Defaults to ``shard-<index>-of-<count>.json``.
+            archive: Write the objects into rolling tar archives in the download directory, instead of a file each.
+            archive_size: Size in bytes after which a new archive is started. Defaults to 1GB.
+            dedup: Download the objects with the same ETag and size once, and materialize the duplicates locally.
+            include: Globs matched against the whole key, or regexes prefixed with ``re:``, of the keys to download.
+            exclude: Globs or regexes of the keys to leave out, even if they are included.
+            min_size: Minimum size of the objects to download, in bytes or as a string such as ``10MB``.
+            max_size: Maximum size of the objects to download, in bytes or as a string such as ``1GB``.
+            modified_since: Only download the objects modified at or after this datetime, epoch or ISO 8601 string.
+            modified_before: Only download the objects modified before this datetime, epoch or ISO 8601 string.
+            snapshot: Path of the SQLite snapshot of the listing, reused by the downloads and the bucket structure.
+            snapshot_ttl: Seconds for which the snapshot is served without listing the bucket. Defaults to an hour.
+            snapshot_refresh: Refresh an expired snapshot in ``full``, or ``incremental`` to relist only the prefixes
+                that are likely to have changed. Defaults to ``full``.
+            failure_manifest: Path of the JSON file to write the objects that still fail at the end of the run to.
+                Defaults to ``<bucket_name>-failures.json``.
+            tail_retries: Number of rounds to retry the failed downloads at the end of the run.
+            retry_workers: Number of threads for the retries at the end of the run.
+
+        Raises:
+            ValueError: If ``archive`` is set along with ``manifest`` or ``dedup``, a filter is invalid, or the
+                ``snapshot`` belongs to another bucket.
 
         Warnings:
             - The default ``sort`` option is ``no_sort`` which uses the default lexicographical order by object key.
-            - Bucket objects are fetched using ``bucket.objects.all()`` which is paginated under the hood.
-            - Sorting will pull everything into memory. This may be expensive for very large buckets.
+            - Bucket objects are fetched using the ``ListObjectsV2`` paginator, sharded when ``list_workers`` > 1.
+            - Sharded listing yields the objects in the order the shards complete, instead of lexicographical order.
+            - Listings larger than ``memory_budget`` are sorted with an external merge sort on disk.
+            - Local files are indexed once with ``os.scandir``, instead of a ``stat`` for each object.
+            - With a ``manifest``, local files are not checked anymore. Delete the manifest to force a full download.
+            - With a ``shard``, every node has to list with the same ``prefix`` to claim disjoint sets of objects.
+            - With ``archive``, objects already archived with the same ETag and size are skipped on reruns.
+            - Filters are applied to the raw listing pages, so the rejected objects are never materialized.
+            - With ``dedup``, duplicates are materialized once the downloads complete, as a reflink, a hardlink or
+              a copy in that order of preference. Hardlinked duplicates share their content when edited locally.
+            - With a ``snapshot``, objects created or deleted within ``snapshot_ttl`` of the listing are not seen.
+            - Failed downloads are retried at the end of the run with a backoff between the rounds, except for the
+              errors that cannot succeed, such as ``NoSuchKey`` or ``AccessDenied``.
         """
         self.session = boto3.Session(
             profile_name=profile_name or os.environ.get("PROFILE_NAME"),
@@ -82,10 +193,12 @@ class Downloader:
             aws_access_key_id=aws_access_key_id or os.environ.get("AWS_ACCESS_KEY_ID"),
             aws_secret_access_key=aws_secret_access_key or os.environ.get("AWS_SECRET_ACCESS_KEY")
         )
-        self.s3 = self.session.resource(service_name="s3", config=retry_config)
+        self.s3 = self.session.resource(service_name="s3", config=retry_config, endpoint_url=endpoint_url)
+        self.retry_config = retry_config
         self.transfer_config = transfer_config
+        self.endpoint_url = endpoint_url
         self.no_filename = []
-        self.logger = logger or default_logger(log_type)
+        self.logger = logger or default_logger(log_type, log_format)
         self.file_logger = log_type == LogType.file
         self.download_dir = download_dir or bucket_name
         self.bucket_name = bucket_name
@@ -94,6 +207,54 @@ class Downloader:
         self.prefix_list = list(refine_prefix(prefix)) if prefix else None
         self.start_time = time.time()
         self.results = DownloadResults()
+        if archive and manifest:
+            raise ValueError("Archive mode tracks the downloaded objects in its own index, and cannot use a manifest.")
+        if archive and dedup:
+            raise ValueError("Archive mode has no local files to materialize the duplicates from.")
+        self.manifest = Manifest(manifest) if manifest else None
+        self.archive = ArchiveWriter(self.download_dir, max_size=archive_size) if archive else None
+        self.dedup = Deduplicator() if dedup else None
+        self.resumable = resumable or range_workers > 0
+        self.range_workers = range_workers
+        if range_workers > 1:
+            # Leaves room for a few large objects downloaded at the same time
+            self.range_client = self.session.client(
+                service_name="s3", endpoint_url=endpoint_url,
+                config=retry_config.merge(Config(max_pool_connections=range_workers * 4))
+            )
+        else:
+            self.range_client = self.s3.meta.client
+        self.memory_budget = memory_budget
+        self.local_index = LocalIndex(self.download_dir)
+        self.metrics = Metrics()
+        self.metrics_writer = MetricsWriter(metrics=self.metrics, filename=metrics, interval=metrics_interval,
+                                            results=self.results.counts, logger=self.logger) if metrics else None
+        self.s3.meta.client.meta.events.register("needs-retry.s3", self.metrics.on_retry, unique_id=id(self.metrics))
+        if self.range_client is not self.s3.meta.client:
+            self.range_client.meta.events.register("needs-retry.s3", self.metrics.on_retry)
+        self.object_filter = ObjectFilter(include=include, exclude=exclude, min_size=min_size, max_size=max_size,
+                                          modified_since=modified_since, modified_before=modified_before)
+        listing = dict(client=self.s3.meta.client, bucket_name=bucket_name, logger=self.logger, workers=list_workers,
+                       depth=list_depth, key_splits=key_splits, metrics=self.metrics)
+        self.lister = Lister(object_filter=self.object_filter or None, **listing)
+        # The snapshot stores the unfiltered listing, so it can be reused with other filters
+        self.snapshot = Snapshot(snapshot, bucket_name, lister=Lister(**listing), logger=self.logger,
+                                 ttl=snapshot_ttl, refresh=snapshot_refresh,
+                                 object_filter=self.object_filter or None) if snapshot else None
+        if isinstance(shard, str):
+            shard = Shard.parse(shard, strategy=shard_strategy, memory_budget=memory_budget)
+        self.shard = shard
+        if shard:
+            self.shard_summary = shard_summary or f"shard-{shard.index}-of-{shard.count}.json"
+        self.failures = FailureQueue()
+        self.failure_manifest = failure_manifest
+        self.tail_retries = tail_retries
+        self.retry_workers = retry_workers
+        self.retry_source = None
+        # Set when the user interrupts a run, so the failures are written without waiting on the retries
+        self.interrupted = False
+        self.headless = headless
+        self.progress = ProgressAggregator()
         self.alive_bar_kwargs = dict(title="Progress", bar="smooth", spinner=None, enrich_print=False)
 
     def init(self) -> None:
@@ -102,32 +263,173 @@ class Downloader:
         Raises:
             ValueError: If no bucket name was passed.
             BucketNotFound: If bucket name was not found.
+            BucketAccessDenied: If the bucket exists, but cannot be accessed with the current credentials.
+
+        See Also:
+            - The bucket is checked with a single ``HeadBucket`` call.
+            - Buckets and the account alias are only enumerated to build the error messages.
         """
-        buckets = [bucket.name for bucket in self.s3.buckets.all()]
         if not self.bucket_name:
             raise ValueError(
-                f"\n\n\tCannot proceed without a bucket name.\n\tAvailable: {buckets}"
-            )
-        _account_id, _alias = self.session.resource(service_name="iam").CurrentUser().arn.split("/")
-        if self.bucket_name not in buckets:
-            raise BucketNotFound(
-                f"\n\n\t{self.bucket_name} was not found in {_alias} account.\n\tAvailable: {buckets}"
+                f"\n\n\tCannot proceed without a bucket name.\n\tAvailable: {self.available_buckets()}"
             )
+        try:
+            self.s3.meta.client.head_bucket(Bucket=self.bucket_name)
+        except ClientError as error:
+            code = error.response.get("Error", {}).get("Code")
+            if code in ("404", "NoSuchBucket"):
+                raise BucketNotFound(
+                    f"\n\n\t{self.bucket_name} was not found in {self.account_alias()} account."
+                    f"\n\tAvailable: {self.available_buckets()}"
+                ) from error
+            if code in ("403", "AccessDenied"):
+                raise BucketAccessDenied(
+                    f"\n\n\tAccess to {self.bucket_name} was denied for {self.account_alias()} account."
+                ) from error
+            raise
         self.logger.info("Bucket objects from %s will be dumped at %s",
                          self.bucket_name, os.path.abspath(self.download_dir))
         self.bucket = self.s3.Bucket(self.bucket_name)
         self.start_time = time.time()
+        self.interrupted = False
+        # The same instance is wired to the clients and the lister, so it is reset instead of replaced for each run
+        self.metrics.reset(self.start_time)
+        if self.metrics_writer:
+            self.metrics_writer.start()
+
+    def available_buckets(self) -> List[str]:
+        """Lists the buckets in the account, for the error messages.
+
+        Returns:
+            List[str]:
+            Returns the bucket names, or an empty list if they cannot be listed.
+        """
+        try:
+            return [bucket["Name"] for bucket in self.s3.meta.client.list_buckets().get("Buckets", [])]
+        except (BotoCoreError, ClientError) as error:
+            self.logger.debug("Unable to list the buckets: %s", error)
+            return []
+
+    def account_alias(self) -> str:
+        """Gets the name of the current IAM user, for the error messages.
+
+        Returns:
+            str:
+            Returns the IAM user name, or the AWS account ID if IAM access is denied.
+        """
+        if self.endpoint_url:
+            # S3 compatible storage doesn't have IAM or STS
+            return self.endpoint_url
+        try:
+            return self.session.resource(service_name="iam").CurrentUser().arn.split("/")[-1]
+        except (BotoCoreError, ClientError) as error:
+            self.logger.debug("Unable to get the IAM user: %s", error)
+        try:
+            return self.session.client(service_name="sts").get_caller_identity()["Account"]
+        except (BotoCoreError, ClientError) as error:
+            self.logger.debug("Unable to get the caller identity: %s", error)
+            return "current"
 
-    def exit(self) -> None:
-        """Logs if there were any failures."""
+    def exit(self, retry: bool = True) -> None:
+        """Retries the failures, materializes the duplicates and logs if there were any failures.
+
+        Args:
+            retry: Retry the failed downloads before the summary. Never retried when the run was interrupted.
+        """
+        if retry and self.failures and not self.interrupted:
+            self.retry_failures()
+        if self.dedup:
+            self.materialize_duplicates()
         if self.no_filename:
             self.logger.warning("%d file(s) failed to download since no filename was specified", len(self.no_filename))
             self.logger.warning(self.no_filename)
             self.logger.info("This can most likely be a system generated file, review and remove it in s3 if need be.")
+        if self.manifest:
+            self.manifest.flush()
+        if self.archive:
+            self.archive.finish()
+            self.logger.info("Objects archived at %s", os.path.abspath(self.archive.directory))
         self.logger.info("Successful downloads: %d", self.results.success)
         self.logger.info("Failed downloads: %d", self.results.failed)
+        if self.results.recovered:
+            self.logger.info("Recovered downloads [retried]: %d", self.results.recovered)
         self.logger.info("Skipped downloads [duplicates]: %d", self.results.skipped)
+        if self.dedup:
+            self.logger.info("Deduplicated downloads: %d", self.results.deduplicated)
+        self.write_failures()
         self.logger.info(f"Run Time: {round(float(time.time() - self.start_time), 2)}s")
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+            self.logger.info("Metrics written to %s", os.path.abspath(self.metrics_writer.filename))
+        if self.shard:
+            self.shard.write_summary(self.shard_summary, bucket_name=self.bucket_name, results=self.results.counts(),
+                                     start_time=self.start_time, prefix=self.prefix_list)
+            self.logger.info("Summary of shard %s written to %s", self.shard, os.path.abspath(self.shard_summary))
+
+    def record_failure(self, s3_object: S3Object, error: Exception, action: str = "downloading") -> None:
+        """Counts a failed download and queues it to be retried at the end of the run.
+
+        Args:
+            s3_object: Object that failed to download.
+            error: Exception raised by the download.
+            action: Action that failed, for the log message.
+        """
+        if self.file_logger:
+            self.logger.error("Error %s %s: %s", action, s3_object.key, str(error))
+        self.results.failed += 1
+        self.failures.add(s3_object, error)
+
+    def retry_failures(self) -> None:
+        """Retries the failed downloads in rounds on a few threads, backing off with jitter before each round.
+
+        See Also:
+            - Errors that cannot succeed on a retry, such as ``NoSuchKey`` or ``AccessDenied``, are not retried.
+            - The retries run after the main downloads, so they don't compete with them for the connections.
+        """
+        for attempt in range(1, self.tail_retries + 1):
+            if not (failures := self.failures.retryable()):
+                return
+            delay = random.uniform(0, min(30.0, 2.0 ** attempt))
+            self.logger.info("Retrying %d failed downloads on %d threads in %.1fs [round %d of %d]",
+                             len(failures), self.retry_workers, delay, attempt, self.tail_retries)
+            try:
+                time.sleep(delay)
+                with ThreadPoolExecutor(max_workers=self.retry_workers, thread_name_prefix="retry") as executor:
+                    futures = {
+                        executor.submit(self.downloader, s3_object=failure.s3_object,
+                                        callback=ProgressPercentage(failure.s3_object.key, failure.s3_object.size)):
+                            failure.s3_object for failure in failures
+                    }
+                    for future in as_completed(futures):
+                        s3_object = futures[future]
+                        try:
+                            future.result()
+                        except Exception as error:
+                            self.failures.add(s3_object, error)
+                            continue
+                        self.failures.remove(s3_object.key)
+                        self.results.failed -= 1
+                        self.results.success += 1
+                        self.results.recovered += 1
+            except KeyboardInterrupt:
+                self.interrupted = True
+                self.logger.warning("Retries interrupted by user.")
+                return
+
+    def write_failures(self) -> None:
+        """Writes the objects that still fail to the failure manifest, or removes the manifest that was retried."""
+        if not self.failures:
+            # The manifest that was retried is removed, the failure manifest is only written when there are failures
+            if self.retry_source and os.path.isfile(self.retry_source):
+                os.remove(self.retry_source)
+                self.logger.info("Every failure was recovered, removed %s", os.path.abspath(self.retry_source))
+            return
+        filename = self.failure_manifest or self.retry_source or f"{self.bucket_name}-failures.json"
+        self.logger.warning("Failures by error: %s",
+                            ", ".join(f"{error}: {count}" for error, count in self.failures.summary().items()))
+        self.failures.write(filename, bucket_name=self.bucket_name)
+        self.logger.warning("%d failed objects written to %s, download them again with retry_failed",
+                            len(self.failures), os.path.abspath(filename))
 
     def get_objects(self) -> List[S3Object]:
         """Get all the objects in the target s3 bucket.
@@ -140,50 +442,101 @@ class Downloader:
             List[S3Object]:
             List of objects in the bucket.
         """
-        if self.prefix_list:
-            objects = []
-            for prefix in self.prefix_list:
-                if prefixed_objects := [obj for obj in self.bucket.objects.filter(Prefix=prefix)]:
-                    objects.extend(prefixed_objects)
-                    self.logger.info(
-                        f"Number of objects found in {self.bucket_name} limited to {prefix!r}: {len(objects)}"
-                    )
-                else:
-                    raise InvalidPrefix(prefix, self.bucket_name)
-        else:
-            objects: List[S3Object] = [obj for obj in self.bucket.objects.all()]
-            self.logger.info(f"Nuber of objects found in {self.bucket_name}: {len(objects)}")
-        if objects:
-            if not os.path.isdir(self.download_dir):
-                os.makedirs(name=self.download_dir)
-                self.logger.info(f"Created {os.path.abspath(path=self.download_dir)}")
-            return objects
-        raise NoObjectFound(
-            f"\n\n\tNo objects found in {self.bucket_name}"
-        )
+        objects = [obj for page in self.iter_pages() for obj in page]
+        self.make_download_dir()
+        return objects
 
-    def downloader(self, s3_object: S3Object, callback: ProgressPercentage) -> None:
-        """Download the files in the exact path as in the bucket.
+    def make_download_dir(self) -> None:
+        """Creates the download directory if it doesn't exist already."""
+        if not os.path.isdir(self.download_dir):
+            os.makedirs(name=self.download_dir)
+            self.logger.info(f"Created {os.path.abspath(path=self.download_dir)}")
+
+    def index_local(self) -> None:
+        """Indexes the files and directories that already exist in the download directory, in a single pass."""
+        start = time.perf_counter()
+        self.local_index = LocalIndex(self.download_dir).build()
+        self.logger.info("Indexed %d local files in %.2fs.", len(self.local_index.files), time.perf_counter() - start)
+
+    def iter_pages(self) -> Generator[List[S3Object]]:
+        """Lists the objects in the target s3 bucket one ``ListObjectsV2`` page at a time.
+
+        Raises:
+            InvalidPrefix: If no objects with the given path exists.
+            NoObjectFound: If the bucket is empty.
+
+        Yields:
+            List[S3Object]:
+            List of objects in each page returned by the listing engine.
+        """
+        counts = dict.fromkeys(self.prefix_list or [""], 0)
+        listing = self.snapshot or self.lister
+        for prefix, page in listing.iter_pages(list(counts)):
+            counts[prefix] += len(page)
+            yield page
+        # Objects left out by the filters still exist, so they count towards the prefix and the bucket being valid
+        rejected = listing.rejected
+        for prefix, count in counts.items():
+            if not prefix:
+                continue
+            if not count + rejected.get(prefix, 0):
+                raise InvalidPrefix(prefix, self.bucket_name)
+            self.logger.info(f"Number of objects found in {self.bucket_name} limited to {prefix!r}: {count}")
+        total = sum(counts.values())
+        if not total + sum(rejected.values()):
+            raise NoObjectFound(
+                f"\n\n\tNo objects found in {self.bucket_name}"
+            )
+        if rejected:
+            self.logger.info("Filtered out %d objects in %s.", sum(rejected.values()), self.bucket_name)
+        self.logger.info(f"Number of objects found in {self.bucket_name}: {total}")
+
+    def iter_shard(self) -> Generator[List[S3Object]]:
+        """Lists the objects page by page, limited to the objects that belong to the shard of this node.
+
+        Yields:
+            List[S3Object]:
+            List of objects in each page that belong to the shard, or every object when not sharded.
+        """
+        if not self.shard:
+            yield from self.iter_pages()
+            return
+        yield from self.shard.pages(self.iter_pages())
+        self.logger.info("Shard %s claimed %d objects [%s] using the %s strategy.", self.shard, self.shard.objects,
+                         size_converter(self.shard.bytes), self.shard.strategy.value)
+
+    def get_target(self, s3_object: S3Object) -> Union[str, None]:
+        """Creates the local directory for an object and checks if it has to be downloaded.
 
         Args:
             s3_object: Takes the ``S3Object`` as an argument.
-            callback: Takes the ``ProgressPercentage`` callback to track download progress.
+
+        Returns:
+            Union[str, None]:
+            Returns the path of the target file, or ``None`` if the object has to be skipped.
 
         See Also:
             - Checks if the file already exists and is of the same size to avoid redundant downloads.
         """
+        start = time.perf_counter()
+        try:
+            return self._get_target(s3_object)
+        finally:
+            self.metrics.observe_stat(time.perf_counter() - start)
+
+    def _get_target(self, s3_object: S3Object) -> Union[str, None]:
+        """Resolves the target file for an object, see ``get_target``."""
         source_file = s3_object.key
         path, filename = os.path.split(source_file)
         if not filename:
             self.no_filename.append(source_file)
             return
         target_path = os.path.join(self.download_dir, path)
-        try:
-            os.makedirs(target_path)
-        except FileExistsError:  # Multiple threads running simultaneously can cause this
-            pass
+        # Directories are created in bulk before the transfers start, so this is a set lookup for each object
+        self.local_index.ensure_directory(path)
         target_file = os.path.join(target_path, filename)
-        if os.path.isfile(target_file) and os.path.getsize(target_file) == s3_object.size:
+        # The manifest has already filtered out the unchanged objects, without a stat per object
+        if not self.manifest and self.local_index.is_current(s3_object):
             if self.file_logger:
                 self.logger.info(
                     "%s already exists and is of the same size [%s], skipping download.",
@@ -193,96 +546,1051 @@ class Downloader:
             return
         if self.file_logger:
             self.logger.info("Downloading %s [%s] to %s", filename, size_converter(s3_object.size), target_path)
-        self.bucket.download_file(source_file, target_file, Config=self.transfer_config, Callback=callback)
+        return target_file
+
+    def downloader(self, s3_object: S3Object, callback: ProgressPercentage) -> bool:
+        """Download the files in the exact path as in the bucket.
+
+        Args:
+            s3_object: Takes the ``S3Object`` as an argument.
+            callback: Takes the ``ProgressPercentage`` callback to track download progress.
+
+        Returns:
+            bool:
+            Returns ``True`` if the object was transferred, ``False`` if it was skipped.
+
+        See Also:
+            - Checks if the file already exists and is of the same size to avoid redundant downloads.
+        """
+        if self.archive:
+            return self.archive_downloader(s3_object=s3_object, callback=callback)
+        start = time.perf_counter()
+        if not (target_file := self.get_target(s3_object)):
+            return False
+        transfer_start = time.perf_counter()
+        if self.resumable and s3_object.size > self.RESUME_CHUNKSIZE:
+            RangedDownload(client=self.range_client, bucket_name=self.bucket_name, s3_object=s3_object,
+                           target_file=target_file, callback=callback, chunk_size=self.RESUME_CHUNKSIZE,
+                           logger=self.logger, concurrency=self.range_workers).run()
+        else:
+            self.bucket.download_file(s3_object.key, target_file, Config=self.transfer_config, Callback=callback)
+        self.metrics.observe_download(size=s3_object.size, start=start, transfer_start=transfer_start,
+                                      first_byte=getattr(callback, "first_byte", None), end=time.perf_counter())
+        if self.manifest:
+            self.manifest.record(s3_object, target_file)
         if self.file_logger:
+            target_path, filename = os.path.split(target_file)
             self.logger.info("Downloaded %s to %s", filename, target_path)
+        return True
+
+    def materialize_duplicates(self) -> None:
+        """Creates the duplicates from the local copies of the objects they duplicate.
+
+        See Also:
+            - Duplicates of objects that failed to download are downloaded on their own instead.
+        """
+        for s3_object, primary in self.dedup.pending():
+            try:
+                if not (target_file := self.get_target(s3_object)):
+                    continue
+                source = os.path.join(self.download_dir, primary)
+                if os.path.isfile(source) and os.path.getsize(source) == s3_object.size:
+                    method = self.dedup.materialize(source, target_file)
+                    self.results.deduplicated += 1
+                    if self.manifest:
+                        self.manifest.record(s3_object, target_file)
+                    if self.file_logger:
+                        self.logger.info("Materialized %s from %s using %s", s3_object.key, primary, method)
+                else:
+                    self.downloader(s3_object=s3_object, callback=ProgressPercentage(s3_object.key, s3_object.size))
+                    self.results.success += 1
+            except Exception as error:
+                self.record_failure(s3_object, error, action="materializing")
+        if any(self.dedup.usage.values()):
+            self.logger.info("Materialized duplicates [%s], saving %s of downloads.",
+                             ", ".join(f"{method}: {count}" for method, count in self.dedup.usage.items() if count),
+                             size_converter(self.dedup.saved))
+
+    def archived(self, s3_object: S3Object) -> bool:
+        """Checks if an object is already archived with the same ETag and size, and counts it as skipped if so.
+
+        Args:
+            s3_object: Takes the ``S3Object`` as an argument.
+
+        Returns:
+            bool:
+            Returns ``True`` if the object has to be skipped.
+        """
+        start = time.perf_counter()
+        try:
+            if not self.archive.contains(s3_object):
+                return False
+            if self.file_logger:
+                self.logger.info("%s is already archived, skipping download.", s3_object.key)
+            self.results.skipped += 1
+            return True
+        finally:
+            self.metrics.observe_stat(time.perf_counter() - start)
+
+    def archive_downloader(self, s3_object: S3Object, callback: ProgressPercentage) -> bool:
+        """Streams an object from the GET response body into the current archive.
+
+        Args:
+            s3_object: Takes the ``S3Object`` as an argument.
+            callback: Takes the ``ProgressPercentage`` callback to track download progress.
+
+        Returns:
+            bool:
+            Returns ``True`` if the object was transferred, ``False`` if it was already archived.
+        """
+        start = time.perf_counter()
+        if self.archived(s3_object):
+            return False
+        transfer_start = time.perf_counter()
+        response = self.s3.meta.client.get_object(Bucket=self.bucket_name, Key=s3_object.key)
+        try:
+            chunks = response["Body"].iter_chunks(self.archive.read_size)
+            disk = self.archive.add(s3_object=s3_object, chunks=chunks, size=response["ContentLength"],
+                                    callback=callback)
+        finally:
+            response["Body"].close()
+        self.metrics.observe_download(size=s3_object.size, start=start, transfer_start=transfer_start,
+                                      first_byte=getattr(callback, "first_byte", None), end=time.perf_counter(),
+                                      disk=disk)
+        if self.file_logger:
+            self.logger.info("Archived %s into %s", s3_object.key, self.archive.name)
+        return True
 
-    def get_downloads(self) -> List[S3Object]:
+    def get_downloads(self) -> Catalog:
         """Filters out the objects that are not files and cannot be downloaded.
 
         Returns:
-            List[S3Object]:
-            List of objects that can be downloaded.
-        """
-        if self.sort == Sort.size:
-            objects = [obj for obj in sorted(self.get_objects(), key=lambda x: x.size)]
-        elif self.sort == Sort.size_desc:
-            objects = [obj for obj in sorted(self.get_objects(), key=lambda x: x.size, reverse=True)]
-        elif self.sort == Sort.key:
-            objects = [obj for obj in sorted(self.get_objects(), key=lambda x: x.key)]
-        elif self.sort == Sort.key_desc:
-            objects = [obj for obj in sorted(self.get_objects(), key=lambda x: x.key, reverse=True)]
-        else:
-            assert self.sort == Sort.no_sort, f"Invalid sort option: {self.sort!r}"
-            objects = self.get_objects()
-        ignored, s3_objects = [], []
-        for obj in objects:
-            if obj.key.endswith("/"):
-                ignored.append(obj)
-            else:
-                s3_objects.append(obj)
+            Catalog:
+            Compact catalog of objects that can be downloaded, iterated in the chosen sort order.
+        """
+        catalog = Catalog(sort=self.sort, memory_budget=self.memory_budget)
+        self.index_local()
+        ignored, unchanged = [], 0
+        try:
+            for page in self.iter_shard():
+                files = []
+                for obj in page:
+                    if obj.key.endswith("/"):
+                        ignored.append(obj.key)
+                    else:
+                        files.append(obj)
+                if self.manifest:
+                    changed = self.manifest.changed(files, lookup=self.local_index.lookup)
+                    unchanged += len(files) - len(changed)
+                    files = changed
+                if self.dedup:
+                    files = self.dedup.split(files)
+                if not self.archive:
+                    self.local_index.plan_directories(files)
+                catalog.extend(files)
+        except BaseException:
+            # The runs spilled so far are removed when the listing fails
+            catalog.close()
+            raise
+        self.make_download_dir()
+        self.logger.debug("Created %d directories.", self.local_index.make_directories())
         self.logger.debug("Ignoring objects (as folders): %s", ignored)
+        if self.manifest:
+            self.logger.info("Skipping %d objects that are unchanged since the last sync.", unchanged)
+            self.results.skipped += unchanged
+        if catalog.runs:
+            self.logger.info("Catalog exceeded the memory budget, spilled %d sorted runs to disk.", len(catalog.runs))
         self.logger.info(
             "Initiating download process for %d files. Ignoring %d folders.",
-            len(s3_objects), len(ignored)
+            len(catalog), len(ignored)
         )
-        return s3_objects
+        return catalog
+
+    @contextlib.contextmanager
+    def progress_bar(self, total: Optional[int], nbytes: int = 0) -> Generator[alive_bar]:
+        """Opens the overall progress bar, along with the aggregator that renders the transfer progress to it.
+
+        Args:
+            total: Number of objects to download, or ``None`` if it is not known yet.
+            nbytes: Number of bytes to download, used for the ETA.
+
+        Yields:
+            alive_bar:
+            Yields the alive_bar instance, or a ``HeadlessBar`` in headless mode.
+        """
+        if self.headless:
+            bar_context = contextlib.nullcontext(HeadlessBar())
+        else:
+            bar_context = alive_bar(total, **self.alive_bar_kwargs)
+        with bar_context as bar:
+            self.progress = ProgressAggregator(bar=None if self.headless else bar, logger=self.logger)
+            self.progress.expect(nbytes)
+            with self.progress:
+                yield bar
 
     def run(self) -> None:
         """Initiates bucket download in a traditional loop."""
         self.init()
         s3_objects = self.get_downloads()
-        with alive_bar(len(s3_objects), **self.alive_bar_kwargs) as overall_bar:
+        with s3_objects, self.progress_bar(len(s3_objects), s3_objects.total_size) as overall_bar:
             for s3_object in s3_objects:
-                progress_callback = ProgressPercentage(
-                    filename=s3_object.key, size=s3_object.size, bar=overall_bar
-                )
+                progress_callback = self.progress.track(s3_object)
                 try:
                     self.downloader(s3_object=s3_object, callback=progress_callback)
                 except Exception as error:
-                    if self.file_logger:
-                        self.logger.error("Error downloading %s: %s", s3_object.key, str(error))
-                    self.results.failed += 1
+                    self.record_failure(s3_object, error)
                 except KeyboardInterrupt:
+                    self.interrupted = True
                     self.logger.warning("Download interrupted by user. Exiting...")
                     break
+                self.progress.finish(s3_object)
                 overall_bar()  # increment overall progress bar
         self.exit()
 
-    def run_in_parallel(self, threads: int = 5) -> None:
+    def run_in_parallel(self, threads: int = 5, adaptive: bool = False, max_threads: int = None,
+                        max_pending: int = 1000) -> None:
         """Initiates bucket download in multi-threading.
 
         Args:
             threads: Number of threads to use for downloading using multi-threading.
+            adaptive: Grow or shrink the number of active threads at runtime based on latency and throttling.
+            max_threads: Upper bound for the number of active threads in adaptive mode. Defaults to 4x ``threads``.
+            max_pending: Maximum number of downloads submitted to the threads and not yet completed.
         """
         self.init()
         self.logger.info(f"Number of threads: {threads}")
+        controller = None
+        if adaptive:
+            controller = AIMDController(initial=threads, maximum=max_threads or threads * 4, logger=self.logger)
+            # Ranged downloads of large objects may use their own client, whose throttles count as well
+            for client in {self.s3.meta.client, self.range_client}:
+                client.meta.events.register("needs-retry.s3", controller.on_retry, unique_id=id(controller))
+            self.logger.info("Adaptive concurrency between %d and %d threads", controller.minimum, controller.maximum)
         s3_objects = self.get_downloads()
-        with alive_bar(len(s3_objects), **self.alive_bar_kwargs) as overall_bar:
+        with s3_objects, self.progress_bar(len(s3_objects), s3_objects.total_size) as overall_bar:
+            with ThreadPoolExecutor(max_workers=controller.maximum if controller else threads) as executor:
+
+                def submit(s3_object: S3Object) -> Future:
+                    """Submits the download of an object to the thread pool."""
+                    progress_callback = self.progress.track(s3_object)
+                    if controller:
+                        return executor.submit(self.controlled_downloader, s3_object=s3_object,
+                                               callback=progress_callback, controller=controller)
+                    return executor.submit(self.downloader, s3_object=s3_object, callback=progress_callback)
+
+                if not self.dispatch(s3_objects=s3_objects, submit=submit, bar=overall_bar, max_pending=max_pending):
+                    executor.shutdown(wait=False, cancel_futures=True)
+        if controller:
+            for client in {self.s3.meta.client, self.range_client}:
+                client.meta.events.unregister("needs-retry.s3", unique_id=id(controller))
+            self.results.concurrency = controller.limit
+            self.logger.info("Concurrency settled at %d threads [peak: %d, throttled: %d]",
+                             controller.limit, controller.peak, controller.throttles)
+        self.exit()
+
+    def retry_failed(self, manifest: str, threads: int = 5, max_pending: int = 1000) -> None:
+        """Downloads exactly the objects in a failure manifest, without listing the bucket again.
+
+        Args:
+            manifest: Path of the failure manifest written by an earlier run.
+            threads: Number of threads to use for downloading using multi-threading.
+            max_pending: Maximum number of downloads submitted to the threads and not yet completed.
+
+        Raises:
+            ValueError: If the failure manifest belongs to another bucket.
+
+        See Also:
+            - Objects that still fail are written back to the same manifest, unless ``failure_manifest`` is set.
+            - The manifest is removed once every object in it has been downloaded.
+        """
+        failures = read_failures(manifest, bucket_name=self.bucket_name)
+        self.init()
+        self.retry_source = manifest
+        s3_objects = [failure.s3_object for failure in failures]
+        self.logger.info("Retrying %d failed objects from %s, number of threads: %d",
+                         len(s3_objects), os.path.abspath(manifest), threads)
+        self.download_objects(s3_objects=s3_objects, count=len(s3_objects),
+                              nbytes=sum(s3_object.size for s3_object in s3_objects),
+                              threads=threads, max_pending=max_pending)
+        self.exit()
+
+    def download_objects(self, s3_objects: Iterable[S3Object], count: int, nbytes: int, threads: int,
+                         max_pending: int) -> None:
+        """Downloads a known set of objects on a thread pool, without listing the bucket.
+
+        Args:
+            s3_objects: Objects to download, in the order they are submitted.
+            count: Number of objects, for the progress bar.
+            nbytes: Number of bytes, for the ETA.
+            threads: Number of threads to use for downloading using multi-threading.
+            max_pending: Maximum number of downloads submitted to the threads and not yet completed.
+        """
+        self.make_download_dir()
+        with self.progress_bar(count, nbytes) as overall_bar:
             with ThreadPoolExecutor(max_workers=threads) as executor:
-                futures = {}
-                for s3_object in s3_objects:
-                    progress_callback = ProgressPercentage(
-                        filename=s3_object.key, size=s3_object.size, bar=overall_bar
-                    )
-                    future = executor.submit(self.downloader, s3_object=s3_object, callback=progress_callback)
-                    futures[future] = s3_object
-                for future in futures:
-                    try:
-                        future.result()
+
+                def submit(s3_object: S3Object) -> Future:
+                    """Submits the download of an object to the thread pool."""
+                    return executor.submit(self.downloader, s3_object=s3_object,
+                                           callback=self.progress.track(s3_object))
+
+                if not self.dispatch(s3_objects=s3_objects, submit=submit, bar=overall_bar, max_pending=max_pending):
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+    def plan(self, filename: str = None, threads: int = 5, probe_objects: int = 8,
+             probe_bytes: int = 1024 * 1024 * 8) -> Plan:
+        """Lists the bucket and tallies what a download would transfer, without downloading anything.
+
+        Args:
+            filename: Path of the plan file, to execute exactly the same set of objects with ``run_plan``.
+            threads: Number of threads the download would use, for the estimate.
+            probe_objects: Number of objects to probe the latency and the throughput with, ``0`` to skip the probe.
+            probe_bytes: Maximum bytes to read from each object probed for the throughput.
+
+        Returns:
+            Plan:
+            Returns the plan with the objects and bytes to transfer, by prefix and by size, and the time estimate.
+
+        See Also:
+            - The ``prefix``, ``sort``, filters, ``shard``, ``manifest``, ``archive`` and local files are taken into
+              account the same way as a download, without creating any directory.
+            - With ``dedup``, the duplicates are in the plan but their bytes are not counted as transferred.
+        """
+        self.init()
+        latency_samples, bandwidth_samples = [], []
+        sampler = random.Random(0)
+        dedup = Deduplicator() if self.dedup else None
+        with Plan(self.bucket_name, prefix=self.prefix_list, sort=self.sort, filename=filename) as plan:
+            plan.threads = threads
+            self.index_local()
+            with Catalog(sort=self.sort, memory_budget=self.memory_budget) as catalog:
+                for page in self.iter_shard():
+                    files = [obj for obj in page if not obj.key.endswith("/")]
+                    if self.manifest:
+                        changed = self.manifest.changed(files, lookup=self.local_index.lookup)
+                    elif self.archive:
+                        changed = [obj for obj in files if not self.archive.contains(obj)]
+                    else:
+                        changed = [obj for obj in files if not self.local_index.is_current(obj)]
+                    plan.skipped += len(files) - len(changed)
+                    catalog.extend(changed)
+                for s3_object in catalog:
+                    duplicate = bool(dedup and not dedup.split([s3_object]))
+                    plan.add(s3_object, duplicate=duplicate)
+                    if duplicate or not s3_object.size or not probe_objects:
+                        continue
+                    # Reservoir sample for the latency, and the largest objects for the throughput
+                    if len(latency_samples) < probe_objects:
+                        latency_samples.append(s3_object)
+                    elif (index := sampler.randrange(plan.objects)) < probe_objects:
+                        latency_samples[index] = s3_object
+                    heapq.heappush(bandwidth_samples, (s3_object.size, s3_object.key, s3_object))
+                    if len(bandwidth_samples) > probe_objects:
+                        heapq.heappop(bandwidth_samples)
+            if latency_samples:
+                plan.probe = self.probe(latency_samples, [sample for *_, sample in bandwidth_samples],
+                                        streams=threads, probe_bytes=probe_bytes)
+            if filename:
+                plan.save()
+        self.log_plan(plan)
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+        return plan
+
+    def probe(self, latency_samples: List[S3Object], bandwidth_samples: List[S3Object], streams: int,
+              probe_bytes: int) -> Optional[Probe]:
+        """Measures the latency of a request and the bandwidth of concurrent transfers against the bucket.
+
+        Args:
+            latency_samples: Objects to read a single byte from, one at a time.
+            bandwidth_samples: Objects to read up to ``probe_bytes`` from, on ``streams`` threads.
+            streams: Number of concurrent transfers.
+            probe_bytes: Maximum bytes to read from each object.
+
+        Returns:
+            Optional[Probe]:
+            Returns the measurements, or ``None`` if the objects could not be read.
+        """
+        client = self.s3.meta.client
+
+        def fetch(s3_object: S3Object, size: int) -> float:
+            """Reads the first bytes of an object into memory, and returns the time it took."""
+            start = time.perf_counter()
+            response = client.get_object(Bucket=self.bucket_name, Key=s3_object.key, Range=f"bytes=0-{size - 1}")
+            with contextlib.closing(response["Body"]) as body:
+                while body.read(1024 * 1024):
+                    pass
+            return time.perf_counter() - start
+
+        try:
+            latencies = sorted(fetch(s3_object, 1) for s3_object in latency_samples)
+            latency = latencies[len(latencies) // 2]
+            sizes = [min(s3_object.size, probe_bytes) for s3_object in bandwidth_samples]
+            streams = max(min(streams, len(bandwidth_samples)), 1)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=streams) as executor:
+                list(executor.map(fetch, bandwidth_samples, sizes))
+            elapsed = time.perf_counter() - start
+        except (BotoCoreError, ClientError) as error:
+            self.logger.warning("Unable to probe %s, the plan has no estimate: %s", self.bucket_name, error)
+            return None
+        # Each round of concurrent transfers waits for one request before the first byte
+        transfer = elapsed - latency * math.ceil(len(bandwidth_samples) / streams)
+        if transfer <= 0:
+            transfer = elapsed
+        return Probe(latency=latency, bandwidth=sum(sizes) / transfer, streams=streams,
+                     requests=len(latency_samples) + len(bandwidth_samples), bytes=sum(sizes) + len(latency_samples))
+
+    def log_plan(self, plan: Plan, top: int = 10) -> None:
+        """Logs the summary of a plan.
+
+        Args:
+            plan: Plan to log.
+            top: Number of prefixes with the most bytes to log.
+        """
+        self.logger.info("Plan for %s: %d objects [%s] to transfer, %d unchanged or already present",
+                         self.bucket_name, plan.objects, size_converter(plan.bytes), plan.skipped)
+        if plan.deduplicated:
+            self.logger.info("Duplicates to materialize locally: %d [%s]",
+                             plan.deduplicated, size_converter(plan.deduplicated_bytes))
+        by_prefix = sorted(plan.by_prefix.items(), key=lambda item: item[1]["bytes"], reverse=True)
+        for prefix, tally in by_prefix[:top]:
+            self.logger.info("  Prefix %s: %d objects [%s]", prefix or "/", tally["objects"],
+                             size_converter(tally["bytes"]))
+        if len(by_prefix) > top:
+            self.logger.info("  ... and %d more prefixes", len(by_prefix) - top)
+        for label, tally in plan.by_size.items():
+            if tally["objects"]:
+                self.logger.info("  Size %s: %d objects [%s]", label, tally["objects"], size_converter(tally["bytes"]))
+        if plan.probe:
+            self.logger.info("Probe: %.1f ms per request, %s/s over %d streams", plan.probe.latency * 1000,
+                             size_converter(plan.probe.bandwidth), plan.probe.streams)
+            self.logger.info("Estimated time with %d threads: %s", plan.threads,
+                             timedelta(seconds=round(plan.estimate())))
+        if plan.filename:
+            self.logger.info("Plan written to %s, download it with run_plan", os.path.abspath(plan.filename))
+
+    def run_plan(self, filename: str, threads: int = 5, max_pending: int = 1000) -> None:
+        """Downloads exactly the objects in a plan file, in its order, without listing the bucket.
+
+        Args:
+            filename: Path of the plan file written by ``plan``.
+            threads: Number of threads to use for downloading using multi-threading.
+            max_pending: Maximum number of downloads submitted to the threads and not yet completed.
+
+        Raises:
+            ValueError: If the plan belongs to another bucket.
+
+        See Also:
+            - Objects modified since the plan was made are downloaded as they are now.
+        """
+        plan = Plan.load(filename, bucket_name=self.bucket_name)
+        self.init()
+        self.logger.info("Running the plan from %s: %d objects [%s], number of threads: %d",
+                         os.path.abspath(filename), plan.objects, size_converter(plan.bytes), threads)
+        s3_objects = plan.iter_objects()
+        if self.dedup:
+            s3_objects = (s3_object for s3_object in s3_objects if self.dedup.split([s3_object]))
+        self.download_objects(s3_objects=s3_objects, count=plan.objects, nbytes=plan.bytes, threads=threads,
+                              max_pending=max_pending)
+        self.exit()
+
+    def collect(self, future: Future, s3_object: S3Object, bar: alive_bar) -> None:
+        """Records the result of a completed download.
+
+        Args:
+            future: Completed future of the download.
+            s3_object: Object that was downloaded.
+            bar: alive_bar instance to update progress.
+        """
+        try:
+            future.result()
+            self.results.success += 1
+        except Exception as error:
+            self.record_failure(s3_object, error)
+        self.progress.finish(s3_object)
+        bar()  # Increment overall bar after each download finishes
+
+    def dispatch(self, s3_objects: Iterable[S3Object], submit: Callable[[S3Object], Future],
+                 bar: alive_bar, max_pending: int = 1000) -> bool:
+        """Submits the downloads within a bounded window and records the results in completion order.
+
+        Args:
+            s3_objects: Iterable of objects to download, consumed lazily.
+            submit: Callable that submits the download of an object and returns its future.
+            bar: alive_bar instance to update progress.
+            max_pending: Maximum number of downloads submitted and not yet completed.
+
+        Returns:
+            bool:
+            Returns ``False`` if the downloads were interrupted by the user.
+
+        See Also:
+            - The objects are only submitted when there is room in the window, so memory stays constant.
+            - A slow object doesn't hold back the results and the progress of the ones submitted after it.
+        """
+        pending: Dict[Future, S3Object] = {}
+        try:
+            for s3_object in s3_objects:
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.collect(future, pending.pop(future), bar)
+                pending[submit(s3_object)] = s3_object
+            for future in as_completed(pending):
+                self.collect(future, pending[future], bar)
+        except KeyboardInterrupt:
+            self.interrupted = True
+            self.logger.warning("Download interrupted by user. Exiting...")
+            for future in pending:
+                future.cancel()
+            return False
+        return True
+
+    def controlled_downloader(self, s3_object: S3Object, callback: ProgressPercentage,
+                              controller: AIMDController) -> None:
+        """Downloads an object once the adaptive controller allows another active thread.
+
+        Args:
+            s3_object: Takes the ``S3Object`` as an argument.
+            callback: Takes the ``ProgressPercentage`` callback to track download progress.
+            controller: Adaptive concurrency controller.
+        """
+        controller.acquire()
+        start = time.time()
+        transferred = False
+        try:
+            transferred = self.downloader(s3_object=s3_object, callback=callback)
+        finally:
+            # Skipped objects return without a request, so their latency would make the round look faster
+            controller.release(latency=time.time() - start, size=s3_object.size, sampled=transferred)
+
+    def run_scheduled(self, small_threads: int = 32, large_threads: int = 2, large_concurrency: int = 8,
+                      small_threshold: int = None, max_pending: int = 1000) -> None:
+        """Initiates bucket download with separate lanes for small and large objects.
+
+        Args:
+            small_threads: Number of threads downloading small objects with a single GET each.
+            large_threads: Number of large objects downloaded concurrently with multipart downloads.
+            large_concurrency: Number of parts downloaded concurrently for each large object.
+            small_threshold: Objects smaller than this are considered small.
+                Defaults to the ``multipart_threshold`` of the transfer configuration.
+            max_pending: Maximum number of downloads submitted to the lanes and not yet completed.
+
+        See Also:
+            - Both lanes draw from one connection pool sized to ``small_threads + large_threads * large_concurrency``
+            - Unlike ``run_in_parallel``, the number of sockets and threads doesn't multiply with each other.
+            - Archive mode is not supported, the lanes download each object into a file of its own.
+            - With ``resumable``, objects larger than ``RESUME_CHUNKSIZE`` are downloaded in byte ranges on the shared
+              pool, ``range_workers`` at a time, and the pool is sized for the larger of it and ``large_concurrency``.
+        """
+        if self.archive:
+            raise ValueError("Archive mode is not supported by the scheduled downloads, use run_in_parallel instead.")
+        self.init()
+        s3_objects = self.get_downloads()
+        with s3_objects, self.progress_bar(len(s3_objects), s3_objects.total_size) as overall_bar:
+            with Scheduler(session=self.session, bucket_name=self.bucket_name, retry_config=self.retry_config,
+                           transfer_config=self.transfer_config, endpoint_url=self.endpoint_url,
+                           small_threshold=small_threshold, small_workers=small_threads, large_workers=large_threads,
+                           large_concurrency=max(large_concurrency, self.range_workers)) as scheduler:
+                self.logger.info("Small objects under %s: %d threads. Large objects: %d x %d threads.",
+                                 size_converter(scheduler.small_threshold), small_threads,
+                                 large_threads, large_concurrency)
+                scheduler.client.meta.events.register("needs-retry.s3", self.metrics.on_retry)
+
+                def submit(s3_object: S3Object) -> Future:
+                    """Submits the download of an object to the lane that fits its size."""
+                    progress_callback = self.progress.track(s3_object)
+                    return scheduler.submit(s3_object, self.scheduled_downloader, s3_object=s3_object,
+                                            callback=progress_callback, scheduler=scheduler)
+
+                if not self.dispatch(s3_objects=s3_objects, submit=submit, bar=overall_bar, max_pending=max_pending):
+                    scheduler.shutdown(wait=False, cancel_futures=True)
+        self.exit()
+
+    def scheduled_downloader(self, s3_object: S3Object, callback: ProgressPercentage, scheduler: Scheduler) -> None:
+        """Download the files in the exact path as in the bucket, using the lane that fits the object size.
+
+        Args:
+            s3_object: Takes the ``S3Object`` as an argument.
+            callback: Takes the ``ProgressPercentage`` callback to track download progress.
+            scheduler: Scheduler with the lanes for small and large objects.
+        """
+        start = time.perf_counter()
+        if not (target_file := self.get_target(s3_object)):
+            return
+        transfer_start = time.perf_counter()
+        if self.resumable and s3_object.size > self.RESUME_CHUNKSIZE:
+            RangedDownload(client=scheduler.client, bucket_name=self.bucket_name, s3_object=s3_object,
+                           target_file=target_file, callback=callback, chunk_size=self.RESUME_CHUNKSIZE,
+                           logger=self.logger, concurrency=self.range_workers).run()
+            disk = 0.0
+        else:
+            disk = scheduler.download(s3_object=s3_object, target_file=target_file, callback=callback)
+        self.metrics.observe_download(size=s3_object.size, start=start, transfer_start=transfer_start,
+                                      first_byte=getattr(callback, "first_byte", None), end=time.perf_counter(),
+                                      disk=disk)
+        if self.manifest:
+            self.manifest.record(s3_object, target_file)
+        if self.file_logger:
+            target_path, filename = os.path.split(target_file)
+            self.logger.info("Downloaded %s to %s", filename, target_path)
+
+    def run_stream(self, threads: int = 5, queue_size: int = 1000) -> None:
+        """Initiates bucket download as a pipeline that overlaps listing with the downloads.
+
+        Args:
+            threads: Number of threads to use for downloading using multi-threading.
+            queue_size: Maximum number of listed objects waiting to be downloaded.
+
+        See Also:
+            - Each ``ListObjectsV2`` page is fed into a bounded queue as soon as it arrives.
+            - Memory stays flat regardless of the bucket size, since the listing is never materialized.
+            - The ``sort`` option is ignored, as sorting requires the entire listing upfront.
+        """
+        self.init()
+        self.logger.info(f"Number of threads: {threads}")
+        if self.sort != Sort.no_sort:
+            self.logger.warning("Sort option %s is ignored in streaming mode.", self.sort.value)
+        self.make_download_dir()
+        self.index_local()
+        pending = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        lock = threading.Lock()
+        listing_errors = []
+
+        def put(item: Union[S3Object, None]) -> bool:
+            """Blocks until there is room in the queue, unless the pipeline is being stopped."""
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer() -> None:
+            """Lists the bucket page by page and feeds the download queue."""
+            listed = ignored = 0
+            try:
+                for page in self.iter_shard():
+                    if self.manifest:
+                        changed = self.manifest.changed(page, lookup=self.local_index.lookup)
+                        with lock:
+                            self.results.skipped += len(page) - len(changed)
+                        page = changed
+                    if self.dedup:
+                        page = self.dedup.split(page)
+                    if not self.archive:
+                        self.local_index.plan_directories(s3_object for s3_object in page
+                                                          if not s3_object.key.endswith("/"))
+                        self.local_index.make_directories()
+                    self.progress.expect(sum(s3_object.size for s3_object in page))
+                    for s3_object in page:
+                        if s3_object.key.endswith("/"):
+                            ignored += 1
+                            continue
+                        if not put(s3_object):
+                            return
+                        listed += 1
+                    overall_bar.title(f"Progress [listed: {listed}]")
+            except Exception as error:
+                listing_errors.append(error)
+                stop.set()
+            finally:
+                self.logger.info("Listing complete with %d files. Ignored %d folders.", listed, ignored)
+                for _ in range(threads):
+                    put(None)
+
+        def consumer() -> None:
+            """Downloads the objects from the queue until the producer signals completion."""
+            while not stop.is_set():
+                try:
+                    s3_object = pending.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if s3_object is None:
+                    return
+                progress_callback = self.progress.track(s3_object)
+                try:
+                    self.downloader(s3_object=s3_object, callback=progress_callback)
+                    with lock:
                         self.results.success += 1
-                    except Exception as error:
-                        s3_object = futures[future]
-                        if self.file_logger:
-                            self.logger.error("Error downloading %s: %s", s3_object.key, str(error))
-                        self.results.failed += 1
-                    except KeyboardInterrupt:
-                        self.logger.warning("Download interrupted by user. Exiting...")
-                        executor.shutdown(wait=False, cancel_futures=True)
-                        break
-                    overall_bar()  # Increment overall bar after each upload finishes
+                except Exception as error:
+                    with lock:
+                        self.record_failure(s3_object, error)
+                self.progress.finish(s3_object)
+                with lock:
+                    overall_bar()
+
+        try:
+            # Total is unknown while the listing is still running, so the bar is open-ended
+            with self.progress_bar(None) as overall_bar:
+                workers = [threading.Thread(target=consumer, daemon=True) for _ in range(threads)]
+                workers.insert(0, threading.Thread(target=producer, daemon=True))
+                for worker in workers:
+                    worker.start()
+                try:
+                    for worker in workers:
+                        while worker.is_alive():
+                            worker.join(timeout=0.5)
+                except KeyboardInterrupt:
+                    self.interrupted = True
+                    self.logger.warning("Download interrupted by user. Exiting...")
+                    stop.set()
+            if listing_errors:
+                raise listing_errors[0]
+        finally:
+            # The objects downloaded before a listing error are still summarized, and their failures written
+            self.exit()
+
+    def run_async(self, max_in_flight: int = 1000) -> None:
+        """Initiates bucket download on an asyncio event loop.
+
+        Args:
+            max_in_flight: Maximum number of requests in flight at any given time.
+
+        See Also:
+            - Objects are fetched with presigned URLs over keep-alive connections, without a thread per request.
+            - Disk I/O runs on an executor, so the event loop never blocks on the local filesystem.
+            - Best suited for buckets dominated by small objects.
+        """
+        self.init()
+        self.logger.info(f"Number of requests in flight: {max_in_flight}")
+        s3_objects = self.get_downloads()
+        with s3_objects, self.progress_bar(len(s3_objects), s3_objects.total_size) as overall_bar:
+            try:
+                asyncio.run(self.download_async(s3_objects=s3_objects, bar=overall_bar, max_in_flight=max_in_flight))
+            except KeyboardInterrupt:
+                self.interrupted = True
+                self.logger.warning("Download interrupted by user. Exiting...")
         self.exit()
 
+    async def download_async(self, s3_objects: Iterable[S3Object], bar: alive_bar, max_in_flight: int = 1000) -> None:
+        """Downloads the objects concurrently on the running event loop.
+
+        Args:
+            s3_objects: Objects to download.
+            bar: alive_bar instance to update progress.
+            max_in_flight: Maximum number of requests in flight at any given time.
+        """
+        loop = asyncio.get_running_loop()
+        client = self.s3.meta.client
+        attempts = (client.meta.config.retries or {}).get("max_attempts", 10)
+        pool = ConnectionPool(limit=max_in_flight, timeout=client.meta.config.read_timeout)
+        semaphore = asyncio.Semaphore(max_in_flight)
+        executor = ThreadPoolExecutor(max_workers=min(32, max_in_flight), thread_name_prefix="disk")
+        tasks = set()
+
+        async def download(s3_object: S3Object) -> None:
+            """Downloads a single object and releases its slot once done."""
+            # Tracked upfront like the thread engines, so the bytes of a skipped object are settled when it finishes
+            progress_callback = self.progress.track(s3_object)
+            try:
+                start = time.perf_counter()
+                if self.archive:
+                    target_file = None
+                    wanted = not await loop.run_in_executor(executor, self.archived, s3_object)
+                else:
+                    target_file = await loop.run_in_executor(executor, self.get_target, s3_object)
+                    wanted = bool(target_file)
+                if wanted:
+                    transfer_start = time.perf_counter()
+                    url = client.generate_presigned_url(
+                        "get_object", Params=dict(Bucket=self.bucket_name, Key=s3_object.key)
+                    )
+                    if self.archive:
+                        sink = ArchiveSink(archive=self.archive, s3_object=s3_object, loop=loop, executor=executor,
+                                           callback=progress_callback)
+                    else:
+                        sink = FileSink(filename=target_file, loop=loop, executor=executor,
+                                        callback=progress_callback)
+                    try:
+                        await fetch(pool=pool, url=url, sink=sink, attempts=attempts, reset=sink.reset,
+                                    on_retry=self.metrics.on_status)
+                    except BaseException:
+                        sink.abort()
+                        raise
+                    await sink.close()
+                    self.metrics.observe_download(size=s3_object.size, start=start, transfer_start=transfer_start,
+                                                  first_byte=progress_callback.first_byte, end=time.perf_counter(),
+                                                  disk=sink.disk_time)
+                    if self.manifest:
+                        self.manifest.record(s3_object, target_file)
+                    if self.file_logger and target_file:
+                        target_path, filename = os.path.split(target_file)
+                        self.logger.info("Downloaded %s to %s", filename, target_path)
+                    # The skipped objects are counted once, as skipped
+                    self.results.success += 1
+            except Exception as error:
+                self.record_failure(s3_object, error)
+            finally:
+                semaphore.release()
+                self.progress.finish(s3_object)
+                bar()  # Increment overall bar after each download finishes
+
+        try:
+            for s3_object in s3_objects:
+                await semaphore.acquire()
+                task = asyncio.create_task(download(s3_object))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            pool.close()
+            executor.shutdown(wait=True)
+
+    def read_object(self, s3_object: S3Object, attempts: int = 3) -> ObjectResult:
+        """Downloads an object into memory.
+
+        Args:
+            s3_object: Takes the ``S3Object`` as an argument.
+            attempts: Maximum number of attempts, as the retries of the client don't cover reading the body.
+
+        Returns:
+            ObjectResult:
+            Returns the response headers and the body of the object.
+        """
+        start = time.perf_counter()
+        callback = ProgressPercentage(s3_object.key, s3_object.size)
+        for attempt in range(1, attempts + 1):
+            try:
+                response = self.s3.meta.client.get_object(Bucket=self.bucket_name, Key=s3_object.key)
+                try:
+                    body = bytearray(response["ContentLength"])
+                    read_into(response["Body"], body, callback)
+                finally:
+                    response["Body"].close()
+                break
+            except (BotoCoreError, OSError, ValueError):
+                if attempt == attempts:
+                    raise
+                self.metrics.observe_retry()
+        self.metrics.observe_download(size=len(body), start=start, transfer_start=start,
+                                      first_byte=callback.first_byte, end=time.perf_counter())
+        return ObjectResult(s3_object=s3_object, headers=response["ResponseMetadata"]["HTTPHeaders"], body=body)
+
+    async def read_object_async(self, s3_object: S3Object, pool: ConnectionPool, attempts: int) -> ObjectResult:
+        """Downloads an object into memory on the running event loop.
+
+        Args:
+            s3_object: Takes the ``S3Object`` as an argument.
+            pool: Connection pool to send the request with.
+            attempts: Maximum number of attempts.
+
+        Returns:
+            ObjectResult:
+            Returns the response headers and the body of the object.
+        """
+        start = time.perf_counter()
+        callback = ProgressPercentage(s3_object.key, s3_object.size)
+        url = self.s3.meta.client.generate_presigned_url(
+            "get_object", Params=dict(Bucket=self.bucket_name, Key=s3_object.key)
+        )
+        sink = BufferSink(size=s3_object.size, callback=callback)
+        try:
+            headers = await fetch(pool=pool, url=url, sink=sink, attempts=attempts, reset=sink.reset,
+                                  on_retry=self.metrics.on_status)
+        except BaseException:
+            sink.abort()
+            raise
+        body = sink.close()
+        self.metrics.observe_download(size=len(body), start=start, transfer_start=start,
+                                      first_byte=callback.first_byte, end=time.perf_counter())
+        return ObjectResult(s3_object=s3_object, headers=headers, body=body)
+
+    @contextlib.contextmanager
+    def memory_engine(self, engine: Engine, concurrency: int) -> Generator[Callable[[S3Object], Future]]:
+        """Runs an engine that downloads the objects into memory, waiting for every download when it exits.
+
+        Args:
+            engine: Engine to download with.
+            concurrency: Number of threads, or of requests in flight on the event loop.
+
+        Yields:
+            Callable[[S3Object], Future]:
+            Yields a callable that submits the download of an object and returns its future.
+        """
+        if engine == Engine.threads:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="memory") as executor:
+                yield functools.partial(executor.submit, self.read_object)
+            return
+        client = self.s3.meta.client
+        attempts = (client.meta.config.retries or {}).get("max_attempts", 10)
+        loop = asyncio.new_event_loop()
+        runner = threading.Thread(target=loop.run_forever, name="memory-loop", daemon=True)
+        runner.start()
+        pool = ConnectionPool(limit=concurrency, timeout=client.meta.config.read_timeout)
+        semaphore = asyncio.Semaphore(concurrency)
+        futures = set()
+        lock = threading.Lock()
+
+        async def download(s3_object: S3Object) -> ObjectResult:
+            """Downloads an object once there is a free slot on the event loop."""
+            async with semaphore:
+                return await self.read_object_async(s3_object=s3_object, pool=pool, attempts=attempts)
+
+        def forget(future: Future) -> None:
+            """Drops a completed future, along with the body it holds."""
+            with lock:
+                futures.discard(future)
+
+        def submit(s3_object: S3Object) -> Future:
+            """Schedules the download of an object on the event loop."""
+            future = asyncio.run_coroutine_threadsafe(download(s3_object), loop)
+            with lock:
+                futures.add(future)
+            future.add_done_callback(forget)
+            return future
+
+        try:
+            yield submit
+        finally:
+            with lock:
+                remaining = list(futures)
+            wait(remaining)
+            loop.call_soon_threadsafe(pool.close)
+            loop.call_soon_threadsafe(loop.stop)
+            runner.join()
+            loop.close()
+
+    def iter_results(self, concurrency: int = 5, engine: Union[str, Engine] = Engine.threads,
+                     memory_budget: int = 1024 * 1024 * 256, max_pending: int = 1000) -> Generator[ObjectResult]:
+        """Downloads the objects into memory and yields each one as it completes, without writing to disk.
+
+        Args:
+            concurrency: Number of threads, or of requests in flight on the event loop with the ``asyncio`` engine.
+            engine: Engine to download with, a thread pool or an event loop with presigned URLs.
+            memory_budget: Maximum bytes of bodies held at once, in flight, completed and being consumed.
+            max_pending: Maximum number of bodies held at once.
+
+        Raises:
+            ValueError: If ``archive``, ``dedup`` or a ``manifest`` is set, as they work with the files on disk.
+
+        Yields:
+            ObjectResult:
+            Yields each object in completion order, with ``error`` set instead of the ``body`` if it failed.
+
+        See Also:
+            - Each body is read straight into a ``bytearray`` of its size, with no copies beyond the one from the
+              socket. Use ``memoryview(result.body)`` to slice it without copying.
+            - A body's share of the budget is returned once the consumer asks for the next result. Bodies kept
+              afterward are not accounted for.
+            - The listing runs on its own thread, so the objects are downloaded while the bucket is being listed.
+        """
+        if self.archive or self.dedup or self.manifest:
+            raise ValueError("In-memory downloads have no local files to archive, deduplicate or record.")
+        engine = Engine(engine)
+        self.init()
+        self.logger.info("Downloading into memory with the %s engine, concurrency: %d, memory budget: %s",
+                         engine.value, concurrency, size_converter(memory_budget))
+        budget = MemoryBudget(max_bytes=memory_budget, max_count=max(max_pending, concurrency))
+        completed = queue.Queue()
+        pending = set()
+        lock = threading.Lock()
+        done = object()
+
+        def collect(s3_object: S3Object, future: Future) -> None:
+            """Hands a completed download over to the consumer, or returns its share of a cancelled one."""
+            with lock:
+                pending.discard(future)
+            if future.cancelled():
+                budget.release(s3_object.size)
+            elif error := future.exception():
+                completed.put(ObjectResult(s3_object=s3_object, error=error))
+            else:
+                completed.put(future.result())
+
+        def producer() -> None:
+            """Lists the objects and submits their downloads as the budget allows."""
+            try:
+                with self.memory_engine(engine=engine, concurrency=concurrency) as submit:
+                    for page in self.iter_shard():
+                        for s3_object in page:
+                            if s3_object.key.endswith("/"):
+                                continue
+                            if not budget.acquire(s3_object.size):
+                                return
+                            future = submit(s3_object)
+                            with lock:
+                                pending.add(future)
+                            future.add_done_callback(functools.partial(collect, s3_object))
+            except Exception as error:
+                completed.put(error)
+            finally:
+                completed.put(done)
+
+        worker = threading.Thread(target=producer, name="memory-producer", daemon=True)
+        worker.start()
+        try:
+            while (item := completed.get()) is not done:
+                if isinstance(item, Exception):
+                    raise item
+                if item.error:
+                    self.record_failure(item.s3_object, item.error)
+                else:
+                    self.results.success += 1
+                try:
+                    yield item
+                finally:
+                    budget.release(item.s3_object.size)
+                    # Drops the reference to the body while waiting for the next one
+                    item = None
+        finally:
+            # Stops the producer and cancels the downloads that haven't started, when the consumer stops early
+            budget.close()
+            with lock:
+                cancelled = list(pending)
+            for future in cancelled:
+                future.cancel()
+            worker.join()
+        self.logger.info("Peak memory held by the bodies: %s", size_converter(budget.peak))
+        # The consumer has already been handed the failures, so they are only written to the failure manifest
+        self.exit(retry=False)
+
+    def iter_objects(self, **kwargs) -> Generator[Tuple[str, Dict[str, str], bytearray]]:
+        """Downloads the objects into memory and yields each one as it completes, leaving out the failures.
+
+        Args:
+            kwargs: Keyword arguments for ``iter_results``.
+
+        Yields:
+            Tuple[str, Dict[str, str], bytearray]:
+            Yields the key, the response headers with the user metadata as ``x-amz-meta-*``, and the body.
+        """
+        for result in self.iter_results(**kwargs):
+            if result.error is None:
+                yield result.key, result.headers, result.body
+
+    def run_in_memory(self, callback: Callable[[str, Dict[str, str], bytearray], None], **kwargs) -> None:
+        """Downloads the objects into memory and passes each one to the callback as it completes.
+
+        Args:
+            callback: Callable that receives the key, the response headers and the body of each object.
+            kwargs: Keyword arguments for ``iter_results``.
+
+        See Also:
+            - The callback runs on the calling thread while the downloads carry on in the background.
+            - An exception raised by the callback stops the downloads and is raised to the caller.
+        """
+        for key, headers, body in self.iter_objects(**kwargs):
+            callback(key, headers, body)
+
+    def get_bucket_tree(self) -> Folder:
+        """Lists all the objects in an S3 bucket straight into a folder tree, with the size of each folder.
+
+        Returns:
+            Folder:
+            Returns the root folder of the bucket.
+        """
+        self.init()
+        try:
+            return build_tree((obj.key, obj.size) for obj in (self.snapshot or self.lister).iter_objects([""]))
+        finally:
+            if self.metrics_writer:
+                self.metrics_writer.stop()
+
     def get_bucket_structure(self, raw: bool = False) -> Union[str, Dict[str, int]]:
         """Gets all the objects in an S3 bucket and forms it into a hierarchical folder like representation.
 
@@ -290,12 +1598,14 @@ class Downloader:
             Union[str, Dict[str, int]]:
             Returns a hierarchical folder like representation of the chosen bucket or the set of objects if raw is True.
         """
-        self.init()
-        # Using list and set will yield the same results but using set we can isolate directories from files
-        structure = {obj.key: obj.size for obj in self.bucket.objects.all()}
         if raw:
-            return structure
-        return convert_to_folder_structure(structure)
+            self.init()
+            try:
+                return {obj.key: obj.size for obj in (self.snapshot or self.lister).iter_objects([""])}
+            finally:
+                if self.metrics_writer:
+                    self.metrics_writer.stop()
+        return "".join(iter_folder_structure(self.get_bucket_tree()))
 
     def save_bucket_structure(self, filename: str = "bucket_structure.json", convert_size: bool = False) -> None:
         """Saves the bucket structure in a JSON file.
@@ -305,12 +1615,13 @@ class Downloader:
             convert_size: Whether to convert the size into human-readable format or not.
         """
         assert filename.endswith(".json"), "Filename must end with .json"
-        bucket_structure = self.get_bucket_structure(raw=True)
-        json_structure = format_bucket_structure(bucket_structure, convert_size=convert_size)
+        tree = self.get_bucket_tree()
+        # Written while the tree is walked, instead of building the whole document in memory first
         with open(filename, "w") as file:
-            json.dump(json_structure, file, indent=2)
+            file.writelines(iter_bucket_json(tree, convert_size=convert_size))
         self.logger.info("%s created successfully.", filename)
 
     def print_bucket_structure(self) -> None:
-        """Prints all the objects in an S3 bucket with a folder like representation."""
-        print(self.get_bucket_structure())
+        """Prints all the objects in an S3 bucket with a folder like representation, line by line."""
+        sys.stdout.writelines(iter_folder_structure(self.get_bucket_tree()))
+        print()
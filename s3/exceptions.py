@@ -13,6 +13,10 @@ class BucketNotFound(S3Error):
     """Custom error for bucket not found."""
 
 
+class BucketAccessDenied(S3Error):
+    """Custom error for bucket that exists but cannot be accessed with the current credentials."""
+
+
 class NoObjectFound(S3Error):
     """Custom error for no objects found."""
 
@@ -34,3 +38,7 @@ class InvalidPrefix(S3Error):
     def format_error_message(self):
         """Returns the formatter error message as a string."""
         return f"\n\n\t{self.prefix!r} was not found in {self.bucket_name}."
+
+
+class DownloadFailed(S3Error):
+    """Custom error for downloads that failed after all the retries."""
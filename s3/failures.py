@@ -0,0 +1,150 @@
+"""Failed downloads collected during a run, retried at the end of it and written to a failure manifest.
+
+>>> FailureQueue
+
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Tuple
+
+from botocore.exceptions import ClientError
+
+from s3.squire import S3Object
+
+# Error codes that fail the same way on every attempt, so they are not retried at the end of the run
+PERMANENT_ERRORS = frozenset({"403", "404", "AccessDenied", "InvalidObjectState", "NoSuchBucket", "NoSuchKey"})
+
+
+def classify(error: Exception) -> Tuple[str, bool]:
+    """Names the error of a failed download and checks whether a retry can succeed.
+
+    Args:
+        error: Exception raised by the download.
+
+    Returns:
+        Tuple[str, bool]:
+        Returns the error class, with the error code for client errors, and whether the error is transient.
+    """
+    name = type(error).__name__
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        return f"{name}({code})", code not in PERMANENT_ERRORS
+    return name, True
+
+
+@dataclass
+class Failure:
+    """Represents an object that failed to download, with the last error it failed with.
+
+    >>> Failure
+
+    """
+
+    s3_object: S3Object
+    error: str
+    message: str
+    transient: bool = True
+    attempts: int = 1
+
+    def to_dict(self) -> Dict[str, object]:
+        """Returns the failure as a JSON serializable dictionary."""
+        return dict(**asdict(self.s3_object), error=self.error, message=self.message, transient=self.transient,
+                    attempts=self.attempts)
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, object]) -> "Failure":
+        """Loads a failure from an entry of the failure manifest."""
+        return cls(s3_object=S3Object(key=entry["key"], size=entry["size"], etag=entry.get("etag"),
+                                      last_modified=entry.get("last_modified")),
+                   error=entry.get("error", ""), message=entry.get("message", ""),
+                   transient=entry.get("transient", True), attempts=entry.get("attempts", 1))
+
+
+class FailureQueue:
+    """Collects the failed downloads from any thread, keyed by the object key.
+
+    >>> FailureQueue
+
+    """
+
+    def __init__(self):
+        """Initializes an empty queue."""
+        self.lock = threading.Lock()
+        self.failures: Dict[str, Failure] = {}
+
+    def __len__(self) -> int:
+        """Returns the number of objects that are still failing."""
+        return len(self.failures)
+
+    def add(self, s3_object: S3Object, error: Exception) -> None:
+        """Records a failed attempt of a download.
+
+        Args:
+            s3_object: Object that failed to download.
+            error: Exception raised by the download.
+        """
+        name, transient = classify(error)
+        with self.lock:
+            attempts = failure.attempts + 1 if (failure := self.failures.get(s3_object.key)) else 1
+            self.failures[s3_object.key] = Failure(s3_object=s3_object, error=name, message=str(error),
+                                                   transient=transient, attempts=attempts)
+
+    def remove(self, key: str) -> None:
+        """Forgets an object that was downloaded on a retry."""
+        with self.lock:
+            self.failures.pop(key, None)
+
+    def retryable(self) -> List[Failure]:
+        """Returns the failures with a transient error."""
+        with self.lock:
+            return [failure for failure in self.failures.values() if failure.transient]
+
+    def summary(self) -> Dict[str, int]:
+        """Returns the number of failures by error, most frequent first."""
+        counts = {}
+        with self.lock:
+            for failure in self.failures.values():
+                counts[failure.error] = counts.get(failure.error, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def write(self, filename: str, bucket_name: str) -> None:
+        """Writes the failure manifest atomically.
+
+        Args:
+            filename: Path of the file to write to.
+            bucket_name: Name of the bucket the objects belong to.
+        """
+        with self.lock:
+            failures = [failure.to_dict() for failure in self.failures.values()]
+        if directory := os.path.dirname(filename):
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{filename}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(dict(bucket=bucket_name, created=time.time(), failures=failures), file, indent=2)
+        os.replace(temporary, filename)
+
+
+def read_failures(filename: str, bucket_name: str) -> List[Failure]:
+    """Reads the failures from a failure manifest.
+
+    Args:
+        filename: Path of the failure manifest.
+        bucket_name: Name of the bucket the objects are expected to belong to.
+
+    Raises:
+        ValueError: If the failure manifest belongs to another bucket.
+
+    Returns:
+        List[Failure]:
+        Returns the failures in the order they were written.
+    """
+    with open(filename) as file:
+        manifest = json.load(file)
+    if manifest.get("bucket") != bucket_name:
+        raise ValueError(f"Failure manifest {filename!r} belongs to {manifest.get('bucket')!r}, "
+                         f"not {bucket_name!r}.")
+    return [Failure.from_dict(entry) for entry in manifest.get("failures", [])]
@@ -0,0 +1,185 @@
+"""Key, size and modified time filters, applied to the raw listing before any ``S3Object`` is created.
+
+>>> ObjectFilter
+
+"""
+
+import fnmatch
+import re
+from collections.abc import Callable, Iterable
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+# Patterns with this prefix are regular expressions, the rest are globs
+REGEX_PREFIX = "re:"
+SIZE_UNITS: Dict[str, int] = dict(B=1, KB=1024, MB=1024 ** 2, GB=1024 ** 3, TB=1024 ** 4)
+
+
+def parse_size(value: Union[int, str, None]) -> Optional[int]:
+    """Converts a size such as ``10MB`` or ``1.5 GB`` into bytes, using the same 1024 base as ``size_converter``.
+
+    Args:
+        value: Size in bytes, or a string with one of the units B, KB, MB, GB or TB.
+
+    Raises:
+        ValueError: If the string cannot be parsed.
+
+    Returns:
+        Optional[int]:
+        Returns the size in bytes, or ``None`` if no size was given.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    if not (match := re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?B)?\s*", value.upper())):
+        raise ValueError(f"Invalid size {value!r}, expected a number with an optional unit such as '10MB'.")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit or "B"])
+
+
+def parse_time(value: Union[datetime, float, str, None]) -> Optional[datetime]:
+    """Converts a datetime, an epoch or an ISO 8601 string into a timezone aware datetime.
+
+    Args:
+        value: Point in time. Naive datetimes and strings without an offset are taken as UTC, like S3 timestamps.
+
+    Raises:
+        ValueError: If the string cannot be parsed.
+
+    Returns:
+        Optional[datetime]:
+        Returns the datetime in UTC, or ``None`` if no time was given.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def compile_patterns(patterns: Iterable[str]) -> Optional[Callable[[str], Any]]:
+    """Compiles the globs and the regular expressions into a single matcher.
+
+    Args:
+        patterns: Globs matched against the whole key, or regular expressions prefixed with ``re:`` that are
+            searched anywhere in the key.
+
+    Returns:
+        Optional[Callable[[str], Any]]:
+        Returns a callable that returns a truthy value if any pattern matches the key, or ``None`` without patterns.
+    """
+    globs, matchers = [], []
+    for pattern in patterns or []:
+        if pattern.startswith(REGEX_PREFIX):
+            # Compiled on their own, as global inline flags such as (?i) are only allowed at the start of a regex
+            matchers.append(re.compile(pattern[len(REGEX_PREFIX):]).search)
+        else:
+            # Anchored to the start of the key, as fnmatch only anchors the end
+            globs.append(f"^{fnmatch.translate(pattern)}")
+    if globs:
+        matchers.insert(0, re.compile("|".join(globs)).search)
+    if not matchers:
+        return None
+    if len(matchers) == 1:
+        return matchers[0]
+    return lambda key: any(match(key) for match in matchers)
+
+
+class ObjectFilter:
+    """Decides whether a listed object has to be downloaded, from its raw ``ListObjectsV2`` entry.
+
+    >>> ObjectFilter
+
+    See Also:
+        - The globs of ``include`` and ``exclude`` are combined into one regex each, matched once per key.
+          Regular expressions are compiled on their own, so their inline flags such as ``(?i)`` apply to them only.
+        - Globs match the whole key, and ``*`` matches ``/`` as well. Regular expressions use ``re:`` as prefix.
+        - Sizes and times are compared first, as they are cheaper than matching the key.
+    """
+
+    def __init__(self, include: Iterable[str] = None, exclude: Iterable[str] = None,
+                 min_size: Union[int, str] = None, max_size: Union[int, str] = None,
+                 modified_since: Union[datetime, float, str] = None,
+                 modified_before: Union[datetime, float, str] = None):
+        """Compiles the filters.
+
+        Args:
+            include: Patterns of the keys to download, every key is included if empty.
+            exclude: Patterns of the keys to leave out, even if they are included.
+            min_size: Minimum size of the objects, inclusive.
+            max_size: Maximum size of the objects, inclusive.
+            modified_since: Only objects modified at or after this time.
+            modified_before: Only objects modified before this time.
+
+        Raises:
+            ValueError: If a size or a time cannot be parsed, or a range is empty.
+            re.error: If a regular expression is invalid.
+        """
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.min_size = parse_size(min_size)
+        self.max_size = parse_size(max_size)
+        self.modified_since = parse_time(modified_since)
+        self.modified_before = parse_time(modified_before)
+        if self.min_size is not None and self.max_size is not None and self.min_size > self.max_size:
+            raise ValueError(f"Minimum size {self.min_size} is larger than the maximum size {self.max_size}.")
+        if (self.modified_since is not None and self.modified_before is not None
+                and self.modified_since >= self.modified_before):
+            raise ValueError(f"Modified since {self.modified_since} is not before {self.modified_before}.")
+        self.since = self.modified_since.timestamp() if self.modified_since is not None else None
+        self.before = self.modified_before.timestamp() if self.modified_before is not None else None
+
+    def __bool__(self) -> bool:
+        """Returns ``True`` if any filter is set."""
+        return any(value is not None for value in (self.include, self.exclude, self.min_size, self.max_size,
+                                                   self.modified_since, self.modified_before))
+
+    def accepts(self, content: Dict[str, Any]) -> bool:
+        """Checks an entry from the ``Contents`` of a ``ListObjectsV2`` response against the filters.
+
+        Args:
+            content: Dictionary representing a single object in the listing.
+
+        Returns:
+            bool:
+            Returns ``True`` if the object has to be downloaded.
+        """
+        modified = None
+        if (self.since is not None or self.before is not None) and "LastModified" in content:
+            modified = content["LastModified"].timestamp()
+        return self.matches(content["Key"], content["Size"], modified)
+
+    def matches(self, key: str, size: int, modified: Optional[float]) -> bool:
+        """Checks the attributes of an object against the filters.
+
+        Args:
+            key: Key of the object.
+            size: Size of the object in bytes.
+            modified: Last modified time of the object as epoch.
+
+        Returns:
+            bool:
+            Returns ``True`` if the object has to be downloaded.
+        """
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        if self.since is not None or self.before is not None:
+            # Objects without a timestamp cannot be placed within the window
+            if modified is None:
+                return False
+            if self.since is not None and modified < self.since:
+                return False
+            if self.before is not None and modified >= self.before:
+                return False
+        if self.include and not self.include(key):
+            return False
+        return not (self.exclude and self.exclude(key))
+
+    def select(self, contents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Returns the entries of a listing page that pass the filters."""
+        return [content for content in contents if self.accepts(content)]
@@ -0,0 +1,343 @@
+"""Listing engine that shards the key space of a bucket and lists the shards concurrently.
+
+>>> Lister
+
+"""
+
+import logging
+import queue
+import string
+import threading
+import time
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from s3.filters import ObjectFilter
+from s3.metrics import Metrics
+from s3.squire import S3Object
+
+# Boundaries used to split a prefix into key ranges, in the same order S3 lists the keys
+KEY_ALPHABET: str = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+
+@dataclass
+class Shard:
+    """Represents a contiguous range of keys under a prefix.
+
+    >>> Shard
+
+    """
+
+    root: str
+    prefix: str
+    start_after: Optional[str] = None
+    end_at: Optional[str] = None
+
+
+def split_key_range(prefix: str, splits: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Splits the keys under a prefix into ranges that can be listed independently using ``StartAfter``.
+
+    Args:
+        prefix: Prefix to split.
+        splits: Number of ranges to split the prefix into.
+
+    Returns:
+        List[Tuple[Optional[str], Optional[str]]]:
+        List of ``(start_after, end_at)`` tuples, where ``start_after`` is exclusive and ``end_at`` is inclusive.
+    """
+    if splits <= 1:
+        return [(None, None)]
+    splits = min(splits, len(KEY_ALPHABET))
+    step = len(KEY_ALPHABET) / splits
+    boundaries = [prefix + KEY_ALPHABET[int(step * i)] for i in range(1, splits)]
+    lower = [None] + boundaries
+    upper = boundaries + [None]
+    return list(zip(lower, upper))
+
+
+def to_s3_object(content: Dict[str, Any]) -> S3Object:
+    """Converts an entry from the ``Contents`` of a ``ListObjectsV2`` response into an ``S3Object``.
+
+    Args:
+        content: Dictionary representing a single object in the listing.
+
+    Returns:
+        S3Object:
+        Returns an instance of the ``S3Object`` dataclass.
+    """
+    return S3Object(key=content["Key"], size=content["Size"], etag=content.get("ETag", "").strip('"') or None,
+                    last_modified=content["LastModified"].timestamp() if "LastModified" in content else None)
+
+
+class Lister:
+    """Lists objects in a bucket by discovering shards and listing them on a worker pool.
+
+    >>> Lister
+
+    """
+
+    def __init__(self, client: Any, bucket_name: str, logger: logging.Logger,
+                 workers: int = 1, depth: int = 1, key_splits: int = 0, queue_size: int = 64, metrics: Metrics = None,
+                 object_filter: ObjectFilter = None):
+        """Initializes the listing engine.
+
+        Args:
+            client: S3 client to list the objects with.
+            bucket_name: Name of the bucket.
+            logger: Logger to log the shard discovery.
+            workers: Number of shards to list concurrently. A single worker uses a serial paginator.
+            depth: Number of ``Delimiter="/"`` levels to walk to discover the common prefixes.
+            key_splits: Number of key ranges to split each discovered prefix into using ``StartAfter``.
+            queue_size: Maximum number of listed pages waiting to be consumed.
+            metrics: ``Metrics`` instance to record the latency of each listing request.
+            object_filter: Filters applied to the raw entries of each page, before any ``S3Object`` is created.
+        """
+        self.client = client
+        self.bucket_name = bucket_name
+        self.logger = logger
+        self.workers = max(workers, 1)
+        self.depth = max(depth, 0)
+        self.key_splits = key_splits
+        self.queue_size = queue_size
+        self.metrics = metrics
+        self.object_filter = object_filter
+        # Number of objects left out by the filter under each requested prefix
+        self.rejected: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def paginate(self, **kwargs) -> Generator[Dict[str, Any]]:
+        """Paginates through ``ListObjectsV2`` for the bucket.
+
+        Yields:
+            Dict[str, Any]:
+            Yields each page of the ``ListObjectsV2`` response.
+        """
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = iter(paginator.paginate(Bucket=self.bucket_name, **kwargs))
+        while True:
+            # Each page is requested lazily, so the time spent in next() is the latency of the request
+            start = time.perf_counter()
+            if (page := next(pages, None)) is None:
+                return
+            if self.metrics:
+                self.metrics.observe_listing(time.perf_counter() - start)
+            yield page
+
+    def convert(self, contents: List[Dict[str, Any]], root: str) -> List[S3Object]:
+        """Converts the entries of a page into objects, leaving out the ones rejected by the filter.
+
+        Args:
+            contents: ``Contents`` of a ``ListObjectsV2`` response.
+            root: Prefix that was requested originally, to count the rejected objects under.
+
+        Returns:
+            List[S3Object]:
+            List of objects that passed the filter.
+        """
+        if self.object_filter:
+            selected = self.object_filter.select(contents)
+            if rejected := len(contents) - len(selected):
+                with self.lock:
+                    self.rejected[root] = self.rejected.get(root, 0) + rejected
+            contents = selected
+        return [to_s3_object(content) for content in contents]
+
+    def list_shard(self, shard: Shard) -> Generator[List[S3Object]]:
+        """Lists all the objects in a shard.
+
+        Args:
+            shard: Shard to list.
+
+        Yields:
+            List[S3Object]:
+            Yields the objects in each page that fall within the shard's key range.
+        """
+        kwargs = dict(Prefix=shard.prefix)
+        if shard.start_after:
+            kwargs["StartAfter"] = shard.start_after
+        for page in self.paginate(**kwargs):
+            contents = page.get("Contents", [])
+            last = bool(shard.end_at and contents and contents[-1]["Key"] > shard.end_at)
+            if last:
+                contents = [content for content in contents if content["Key"] <= shard.end_at]
+            if objects := self.convert(contents, shard.root):
+                yield objects
+            if last:
+                return
+
+    def discover(self, prefix: str, root: str = None) -> Tuple[List[S3Object], List[str]]:
+        """Lists a single level of a prefix using ``Delimiter="/"``.
+
+        Args:
+            prefix: Prefix to discover.
+            root: Prefix that was requested originally. Defaults to ``prefix``.
+
+        Returns:
+            Tuple[List[S3Object], List[str]]:
+            Returns the objects directly under the prefix and the common prefixes one level below.
+        """
+        objects, prefixes = [], []
+        for page in self.paginate(Prefix=prefix, Delimiter="/"):
+            objects.extend(self.convert(page.get("Contents", []), prefix if root is None else root))
+            prefixes.extend(common["Prefix"] for common in page.get("CommonPrefixes", []))
+        return objects, prefixes
+
+    def shards(self, root: str, prefix: str, splits: int = None, start_after: str = None) -> List[Shard]:
+        """Splits a prefix into key range shards.
+
+        Args:
+            root: Prefix that was requested originally.
+            prefix: Prefix to split.
+            splits: Number of key ranges to split the prefix into. Defaults to ``key_splits``.
+            start_after: Key after which the shards start, when the keys up to it have been listed already.
+
+        Returns:
+            List[Shard]:
+            List of shards covering all the keys under the prefix, after ``start_after`` if given.
+        """
+        shards = []
+        for lower, upper in split_key_range(prefix, self.key_splits if splits is None else splits):
+            if start_after is not None:
+                if upper is not None and upper <= start_after:
+                    continue
+                lower = start_after if lower is None else max(lower, start_after)
+            shards.append(Shard(root=root, prefix=prefix, start_after=lower, end_at=upper))
+        return shards
+
+    def iter_pages(self, prefixes: List[str]) -> Generator[Tuple[str, List[S3Object]]]:
+        """Lists all the objects under the given prefixes.
+
+        Args:
+            prefixes: List of prefixes to list. An empty string lists the entire bucket.
+
+        Yields:
+            Tuple[str, List[S3Object]]:
+            Yields the requested prefix and a page of objects that belong to it.
+
+        See Also:
+            - With a single worker, each prefix is listed with a serial paginator in lexicographical order.
+            - With multiple workers, pages are yielded in the order the shards complete them.
+            - Pages left empty by the filter are not yielded, the rejected objects are counted in ``rejected``.
+        """
+        self.rejected = {}
+        if self.workers == 1 and self.key_splits <= 1:
+            for prefix in prefixes:
+                for page in self.list_shard(Shard(root=prefix, prefix=prefix)):
+                    yield prefix, page
+            return
+        yield from self._iter_concurrent(prefixes)
+
+    def _iter_concurrent(self, prefixes: List[str]) -> Generator[Tuple[str, List[S3Object]]]:
+        """Discovers and lists the shards on a thread pool, merging the pages into a bounded queue.
+
+        Args:
+            prefixes: List of prefixes to list.
+
+        Yields:
+            Tuple[str, List[S3Object]]:
+            Yields the requested prefix and a page of objects that belong to it.
+        """
+        pages = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        lock = threading.Lock()
+        # Holds an extra count until all the prefixes are submitted, so completion cannot be signaled early
+        outstanding = [1]
+        done = object()
+
+        def put(item: Any) -> None:
+            """Blocks until there is room in the queue, unless the consumer has stopped."""
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def submit(func, *args) -> None:
+            """Submits a task to the pool while keeping track of the outstanding tasks."""
+            with lock:
+                outstanding[0] += 1
+            executor.submit(run, func, *args)
+
+        def release() -> None:
+            """Signals completion when no more tasks are outstanding."""
+            with lock:
+                outstanding[0] -= 1
+                finished = outstanding[0] == 0
+            if finished:
+                put(done)
+
+        def run(func, *args) -> None:
+            """Runs a task and releases it once complete."""
+            try:
+                if not stop.is_set():
+                    func(*args)
+            except Exception as error:
+                stop.set()
+                # Unblock the consumer regardless of the queue being full
+                with pages.mutex:
+                    pages.queue.clear()
+                    pages.queue.append(error)
+                    pages.not_empty.notify()
+            finally:
+                release()
+
+        def walk(root: str, prefix: str, level: int) -> None:
+            """Discovers the common prefixes at each level and submits the shards to the pool, a page at a time."""
+            if level >= self.depth:
+                for shard in self.shards(root, prefix):
+                    submit(fetch, shard)
+                return
+            for number, page in enumerate(self.paginate(Prefix=prefix, Delimiter="/")):
+                if stop.is_set():
+                    return
+                contents = page.get("Contents", [])
+                if objects := self.convert(contents, root):
+                    put((root, objects))
+                children = page.get("CommonPrefixes", [])
+                for child in children:
+                    submit(walk, root, child["Prefix"], level + 1)
+                if number == 0 and not children and contents and page.get("IsTruncated"):
+                    # A flat prefix is split into key ranges for the workers, instead of paging through it on one
+                    for shard in self.shards(root, prefix, splits=max(self.key_splits, self.workers),
+                                             start_after=contents[-1]["Key"]):
+                        submit(fetch, shard)
+                    return
+
+        def fetch(shard: Shard) -> None:
+            """Lists a single shard and feeds the pages to the queue."""
+            for page in self.list_shard(shard):
+                if stop.is_set():
+                    return
+                put((shard.root, page))
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lister") as executor:
+            try:
+                for prefix in prefixes:
+                    submit(walk, prefix, prefix, 0)
+                release()
+                while True:
+                    item = pages.get()
+                    if item is done:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                stop.set()
+        self.logger.debug("Listed %s with %d workers", prefixes, self.workers)
+
+    def iter_objects(self, prefixes: List[str]) -> Generator[S3Object]:
+        """Lists all the objects under the given prefixes.
+
+        Args:
+            prefixes: List of prefixes to list. An empty string lists the entire bucket.
+
+        Yields:
+            S3Object:
+            Yields each object in the listing.
+        """
+        for _, page in self.iter_pages(prefixes):
+            yield from page
@@ -0,0 +1,119 @@
+"""Index of the local download directory, built in a single pass to replace the per-object metadata calls.
+
+>>> LocalIndex
+
+"""
+
+import os
+import threading
+from collections.abc import Iterable
+from typing import Dict, Optional, Set, Tuple
+
+from s3.squire import S3Object
+
+
+class LocalIndex:
+    """Maps the relative path of every local file to its size and mtime, and tracks the existing directories.
+
+    >>> LocalIndex
+
+    See Also:
+        - The index is built once with ``os.scandir``, which reuses the metadata returned with each directory read.
+        - Skip decisions become dictionary lookups instead of ``isfile`` and ``getsize`` calls for each object.
+        - Directories are created in bulk before the transfers start, instead of ``makedirs`` for each object.
+    """
+
+    def __init__(self, root: str):
+        """Initializes an empty index.
+
+        Args:
+            root: Download directory to index.
+        """
+        self.root = root
+        self.files: Dict[str, Tuple[int, float]] = {}
+        self.directories: Set[str] = {""}
+        self.pending: Set[str] = set()
+        self.built = False
+        self.lock = threading.Lock()
+
+    def build(self, stat_files: bool = True) -> "LocalIndex":
+        """Walks the download directory iteratively.
+
+        Args:
+            stat_files: Whether to record the size and mtime of the files, or only the directories.
+
+        Returns:
+            LocalIndex:
+            Returns the index itself.
+        """
+        stack = [""]
+        while stack:
+            relative = stack.pop()
+            try:
+                iterator = os.scandir(os.path.join(self.root, relative) if relative else self.root)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with iterator as entries:
+                for entry in entries:
+                    path = f"{relative}/{entry.name}" if relative else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        self.directories.add(path)
+                        stack.append(path)
+                    elif stat_files and entry.is_file():
+                        stat = entry.stat()
+                        self.files[path] = (stat.st_size, stat.st_mtime)
+        self.built = True
+        return self
+
+    def lookup(self, key: str) -> Optional[Tuple[int, float]]:
+        """Returns the size and mtime of the local file for an object key, if it exists."""
+        return self.files.get(key)
+
+    def is_current(self, s3_object: S3Object) -> bool:
+        """Returns whether the local file exists with the same size as the object.
+
+        See Also:
+            - Falls back to a ``stat`` call for each object, when the index hasn't been built.
+        """
+        if not self.built:
+            target_file = os.path.join(self.root, s3_object.key)
+            return os.path.isfile(target_file) and os.path.getsize(target_file) == s3_object.size
+        return (local := self.files.get(s3_object.key)) is not None and local[0] == s3_object.size
+
+    def plan_directories(self, s3_objects: Iterable[S3Object]) -> None:
+        """Collects the missing directories for the given objects, to be created in bulk.
+
+        Args:
+            s3_objects: Objects that are about to be downloaded.
+        """
+        for s3_object in s3_objects:
+            directory = s3_object.key.rpartition("/")[0]
+            while directory not in self.directories and directory not in self.pending:
+                self.pending.add(directory)
+                directory = directory.rpartition("/")[0]
+
+    def make_directories(self) -> int:
+        """Creates the collected directories, parents first.
+
+        Returns:
+            int:
+            Returns the number of directories created.
+        """
+        pending, self.pending = self.pending, set()
+        # Sorting puts every parent before its children, so each directory is a single mkdir
+        for directory in sorted(pending):
+            try:
+                os.mkdir(os.path.join(self.root, directory))
+            except FileExistsError:
+                pass
+        with self.lock:
+            self.directories.update(pending)
+        return len(pending)
+
+    def ensure_directory(self, directory: str) -> None:
+        """Creates a directory that wasn't created in bulk, skipping the call if it is already known."""
+        if directory in self.directories:
+            return
+        os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+        with self.lock:
+            self.directories.add(directory)
@@ -4,11 +4,20 @@
 
 """
 
+import json
+import json.encoder
 import logging
+import logging.handlers
 import os.path
+import queue
+import threading
 import time
+from collections.abc import Callable
 from enum import Enum
-from typing import Union
+from typing import List, Tuple, Union
+
+# C implementation of the string escaping of the JSON encoder, a fraction of the cost of encoding a whole dictionary
+escape: Callable[[str], str] = json.encoder.encode_basestring_ascii
 
 
 class LogType(Enum):
@@ -22,11 +31,152 @@ class LogType(Enum):
     stdout: str = "stdout"
 
 
-def default_handler(log_type: LogType) -> Union[logging.StreamHandler, logging.FileHandler]:
+class LogFormat(Enum):
+    """Defines the format of the log records.
+
+    >>> LogFormat
+
+    """
+
+    text: str = "text"
+    json: str = "json"
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a compact JSON object on a single line.
+
+    >>> JsonFormatter
+
+    See Also:
+        - The line is assembled from escaped strings, which is several times faster than ``json.dumps``.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Serializes the record with the epoch, the level, the origin and the message."""
+        line = (f'{{"time":{record.created:.3f},"level":{escape(record.levelname)},"module":{escape(record.module)},'
+                f'"line":{record.lineno},"func":{escape(str(record.funcName))},"message":{escape(record.getMessage())}')
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            line += f',"exception":{escape(record.exc_text)}'
+        return line + "}"
+
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that formats the time once per second, instead of once per record.
+
+    >>> CachedTimeFormatter
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initializes the formatter with an empty cache."""
+        super().__init__(*args, **kwargs)
+        self.cached: Tuple[int, str] = (-1, "")
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str = None) -> str:  # noqa: N802
+        """Returns the time of the record, formatted once for all the records within the same second."""
+        second = int(record.created)
+        if self.cached[0] != second:
+            self.cached = (second, super().formatTime(record, datefmt))
+        return self.cached[1]
+
+
+class BatchedQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the records from any thread, while a background thread formats and writes them in batches.
+
+    >>> BatchedQueueHandler
+
+    See Also:
+        - The calling threads only create the record and append it to a ``SimpleQueue``, the formatting and the
+          writes are off the hot path.
+        - Each batch is written with a single write and a single flush under the lock of the target handler.
+        - Records are formatted with the arguments they were logged with, so arguments other than strings and
+          numbers are rendered upfront, in case they change before the record is written.
+    """
+
+    def __init__(self, handler: logging.StreamHandler, batch_size: int = 1000):
+        """Starts the background writer.
+
+        Args:
+            handler: Handler to format and write the records with.
+            batch_size: Maximum number of records written at once.
+        """
+        super().__init__(queue.SimpleQueue())
+        self.handler = handler
+        self.batch_size = batch_size
+        self.writer = threading.Thread(target=self.drain, name="log-writer", daemon=True)
+        self.writer.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Renders the message only if the arguments may change before the record is written."""
+        if record.args and not (isinstance(record.args, tuple) and
+                                all(isinstance(arg, (str, int, float)) for arg in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def drain(self) -> None:
+        """Writes the records in batches as they arrive, until it is stopped with ``None``."""
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Flush markers are set once the records enqueued before them are written
+            self.write([record for record in records if isinstance(record, logging.LogRecord)])
+            for marker in records:
+                if isinstance(marker, threading.Event):
+                    marker.set()
+            if None in records:
+                return
+
+    def write(self, records: List[logging.LogRecord]) -> None:
+        """Formats the records and writes them to the stream of the target handler at once."""
+        lines = []
+        for record in records:
+            if record.levelno < self.handler.level or not self.handler.filter(record):
+                continue
+            try:
+                lines.append(self.handler.format(record))
+            except Exception:
+                self.handler.handleError(record)
+        if not lines:
+            return
+        terminator = self.handler.terminator
+        self.handler.acquire()
+        try:
+            self.handler.stream.write(terminator.join(lines) + terminator)
+            self.handler.flush()
+        except Exception:
+            self.handler.handleError(records[-1])
+        finally:
+            self.handler.release()
+
+    def flush(self) -> None:
+        """Blocks until every record enqueued so far has been written."""
+        if self.writer.is_alive():
+            self.queue.put(marker := threading.Event())
+            marker.wait()
+
+    def close(self) -> None:
+        """Writes the pending records, stops the background writer and closes the target handler."""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        self.handler.close()
+        super().close()
+
+
+def default_handler(log_type: LogType,
+                    log_format: LogFormat = LogFormat.text) -> Union[logging.StreamHandler, logging.FileHandler]:
     """Creates a handler and assigns a default format to it.
 
     Args:
         log_type: An instance of the ``LogType`` enum to specify the type of logging output.
+        log_format: An instance of the ``LogFormat`` enum to specify the format of the records.
 
     Returns:
         Union[logging.StreamHandler, logging.FileHandler]:
@@ -34,11 +184,12 @@ def default_handler(log_type: LogType) -> Union[logging.StreamHandler, logging.F
     """
     if log_type == LogType.file:
         os.makedirs("logs", exist_ok=True)
-        logfile = os.path.join("logs", f"s3_downloader_{time.strftime('%Y-%m-%d_%H:%M:%S')}.log")
+        extension = "jsonl" if log_format == LogFormat.json else "log"
+        logfile = os.path.join("logs", f"s3_downloader_{time.strftime('%Y-%m-%d_%H:%M:%S')}.{extension}")
         handler = logging.FileHandler(filename=logfile)
     else:
         handler = logging.StreamHandler()
-    handler.setFormatter(fmt=default_format())
+    handler.setFormatter(fmt=JsonFormatter() if log_format == LogFormat.json else default_format())
     return handler
 
 
@@ -49,23 +200,32 @@ def default_format() -> logging.Formatter:
         logging.Formatter:
         Returns an instance of the ``Formatter`` object.
     """
-    return logging.Formatter(
+    return CachedTimeFormatter(
         fmt='%(asctime)s - %(levelname)s - [%(module)s:%(lineno)d] - %(funcName)s - %(message)s',
         datefmt='%b-%d-%Y %I:%M:%S %p'
     )
 
 
-def default_logger(log_type: LogType) -> logging.Logger:
+def default_logger(log_type: LogType, log_format: Union[str, LogFormat] = LogFormat.text) -> logging.Logger:
     """Creates a default logger with debug mode enabled.
 
     Args:
         log_type: An instance of the ``LogType`` enum to specify the type of logging output.
+        log_format: Format of the records, ``text`` or compact ``json`` lines.
 
     Returns:
         logging.Logger:
         Returns an instance of the ``Logger`` object.
+
+    See Also:
+        - Records are written by a background thread in batches, see ``BatchedQueueHandler``.
+        - The handler of an earlier call is flushed and replaced, so the records are not written twice.
     """
     logger = logging.getLogger(__name__)
-    logger.addHandler(hdlr=default_handler(log_type))
+    for handler in logger.handlers[:]:
+        if isinstance(handler, BatchedQueueHandler):
+            logger.removeHandler(handler)
+            handler.close()
+    logger.addHandler(hdlr=BatchedQueueHandler(default_handler(LogType(log_type), LogFormat(log_format))))
     logger.setLevel(level=logging.DEBUG)
     return logger
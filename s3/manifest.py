@@ -0,0 +1,124 @@
+"""Persistent SQLite manifest of the downloaded objects to sync incrementally without a stat per object or re-download.
+
+>>> Manifest
+
+"""
+
+import os
+import sqlite3
+import threading
+from collections.abc import Callable
+from typing import List, Optional, Tuple
+
+from s3.squire import S3Object
+
+# SQLite limits the number of host parameters in a single statement, 999 for older versions
+BATCH_SIZE: int = 900
+
+
+class Manifest:
+    """Tracks the ETag, LastModified, size and local mtime of every downloaded object keyed by the object key.
+
+    >>> Manifest
+
+    """
+
+    def __init__(self, filename: str, flush_size: int = 1000):
+        """Opens or creates the manifest.
+
+        Args:
+            filename: Path of the SQLite database.
+            flush_size: Number of downloaded objects to record before committing them to disk.
+        """
+        if directory := os.path.dirname(filename):
+            os.makedirs(directory, exist_ok=True)
+        self.filename = filename
+        self.flush_size = flush_size
+        self.lock = threading.Lock()
+        self.pending = []
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            "key TEXT PRIMARY KEY, etag TEXT, last_modified REAL, size INTEGER, mtime REAL"
+            ") WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def changed(self, s3_objects: List[S3Object],
+                lookup: Callable[[str], Optional[Tuple[int, float]]]) -> List[S3Object]:
+        """Diffs a batch of listed objects against the manifest and the local files.
+
+        Args:
+            s3_objects: List of objects from the listing.
+            lookup: Callable that returns the size and mtime of the local file for an object key, if it exists.
+
+        Returns:
+            List[S3Object]:
+            List of objects that are new, whose ETag or size has changed since they were downloaded, or whose local
+            file is missing or was modified since.
+
+        See Also:
+            - A local file of the listed size that the manifest doesn't know yet, such as on the first run with a new
+              manifest, is recorded as downloaded instead of being downloaded again, same as the check by size.
+        """
+        changed, seeded = [], []
+        for index in range(0, len(s3_objects), BATCH_SIZE):
+            batch = s3_objects[index:index + BATCH_SIZE]
+            with self.lock:
+                known = dict(
+                    (key, (etag, size, mtime)) for key, etag, size, mtime in self.connection.execute(
+                        f"SELECT key, etag, size, mtime FROM objects WHERE key IN ({','.join('?' * len(batch))})",
+                        [s3_object.key for s3_object in batch]
+                    )
+                )
+            for s3_object in batch:
+                if (record := known.get(s3_object.key)) is None:
+                    if (local := lookup(s3_object.key)) and local[0] == s3_object.size:
+                        seeded.append((s3_object.key, s3_object.etag, s3_object.last_modified, s3_object.size,
+                                       local[1]))
+                    else:
+                        changed.append(s3_object)
+                elif record[:2] != (s3_object.etag, s3_object.size):
+                    changed.append(s3_object)
+                # The local file has to be the one that was recorded, not deleted, truncated or edited since
+                elif lookup(s3_object.key) != (record[1], record[2]):
+                    changed.append(s3_object)
+        if seeded:
+            with self.lock:
+                self.pending.extend(seeded)
+                if len(self.pending) >= self.flush_size:
+                    self._flush()
+        return changed
+
+    def record(self, s3_object: S3Object, target_file: str) -> None:
+        """Records a downloaded object, committing in batches.
+
+        Args:
+            s3_object: Object that was downloaded.
+            target_file: Local path of the downloaded object.
+        """
+        row = (s3_object.key, s3_object.etag, s3_object.last_modified, s3_object.size, os.path.getmtime(target_file))
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) >= self.flush_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        """Commits the pending records, the lock must be held by the caller."""
+        if self.pending:
+            self.connection.executemany("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)", self.pending)
+            self.connection.commit()
+            self.pending.clear()
+
+    def flush(self) -> None:
+        """Commits the pending records to disk."""
+        with self.lock:
+            self._flush()
+
+    def close(self) -> None:
+        """Commits the pending records and closes the database."""
+        with self.lock:
+            self._flush()
+            self.connection.close()
@@ -0,0 +1,325 @@
+"""Per-run metrics with latency histograms, throughput over time, retries and a breakdown of the time spent.
+
+>>> Metrics
+
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable
+from typing import Any, Callable, Dict, List, Optional
+
+from s3.concurrency import THROTTLE_CODES
+
+# Upper bounds of the latency buckets in seconds, the last bucket being +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Time spent in each phase, summed across all the threads
+PHASES = ("listing", "stat", "network", "disk")
+# HTTP status codes S3 responds with when the request rate has to be reduced
+THROTTLE_STATUS = frozenset({429, 503})
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket boundaries, the same as a Prometheus histogram.
+
+    >>> Histogram
+
+    """
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        """Initializes an empty histogram.
+
+        Args:
+            buckets: Upper bounds of the buckets in ascending order.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Adds a value to the histogram. Not thread-safe, callers hold the lock of the ``Metrics``."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def labels(self) -> List[str]:
+        """Returns the upper bounds of the buckets as labels, including the +Inf bucket."""
+        return [str(bound) for bound in self.buckets] + ["+Inf"]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the upper bound of the bucket that holds the given quantile, or ``None`` if empty."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the histogram as a dictionary."""
+        return dict(count=self.count, sum=round(self.sum, 6),
+                    mean=round(self.sum / self.count, 6) if self.count else None,
+                    p50=self.quantile(0.5), p90=self.quantile(0.9), p99=self.quantile(0.99),
+                    buckets=dict(zip(self.labels(), self.counts)))
+
+
+class Metrics:
+    """Collects the metrics of a download run.
+
+    >>> Metrics
+
+    See Also:
+        - Latency histograms for each ``ListObjectsV2`` page, the time to first byte and the total time per object.
+        - Bytes downloaded over time, in bins of ``resolution`` seconds.
+        - Retries and throttles, from the botocore ``needs-retry`` event and the asyncio engine.
+        - Time spent listing, checking local files, on the network and writing to disk, summed across threads.
+        - ``download_file`` writes to disk as it reads from the network, so its disk time is counted as network.
+    """
+
+    def __init__(self, resolution: float = 1.0):
+        """Initializes empty metrics.
+
+        Args:
+            resolution: Width of the throughput bins in seconds.
+        """
+        self.resolution = resolution
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, start_time: float = None) -> None:
+        """Discards everything recorded so far, so the instance can be reused for another run.
+
+        Args:
+            start_time: Epoch time at which the run started. Defaults to now.
+        """
+        with self.lock:
+            self.listing = Histogram()
+            self.ttfb = Histogram()
+            self.total = Histogram()
+            self.phases: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+            self.throughput: Dict[int, int] = {}
+            self.retries = 0
+            self.throttles = 0
+            self.bytes = 0
+            self.objects = 0
+            self.start_time = time.time() if start_time is None else start_time
+
+    def observe_listing(self, seconds: float) -> None:
+        """Records the latency of a listing request.
+
+        Args:
+            seconds: Time taken by the request.
+        """
+        with self.lock:
+            self.listing.observe(seconds)
+            self.phases["listing"] += seconds
+
+    def observe_stat(self, seconds: float) -> None:
+        """Records the time spent checking whether a local file has to be downloaded.
+
+        Args:
+            seconds: Time taken by the check.
+        """
+        with self.lock:
+            self.phases["stat"] += seconds
+
+    def observe_download(self, size: int, start: float, transfer_start: float, first_byte: Optional[float],
+                         end: float, disk: float = 0.0) -> None:
+        """Records a completed download, with the timestamps taken from ``time.perf_counter``.
+
+        Args:
+            size: Size of the object in bytes.
+            start: Time at which the object was picked up, before the local checks.
+            transfer_start: Time at which the transfer started.
+            first_byte: Time at which the first chunk was received, or ``None`` if it wasn't tracked.
+            end: Time at which the download completed.
+            disk: Seconds spent writing to disk, for the engines that write separately from the network reads.
+        """
+        bin_index = int((time.time() - self.start_time) // self.resolution)
+        with self.lock:
+            self.total.observe(end - start)
+            if first_byte is not None:
+                self.ttfb.observe(max(first_byte - transfer_start, 0.0))
+            self.phases["network"] += max(end - transfer_start - disk, 0.0)
+            self.phases["disk"] += disk
+            self.throughput[bin_index] = self.throughput.get(bin_index, 0) + size
+            self.bytes += size
+            self.objects += 1
+
+    def observe_retry(self, throttled: bool = False) -> None:
+        """Records a failed attempt that is retried.
+
+        Args:
+            throttled: Whether the attempt failed due to throttling.
+        """
+        with self.lock:
+            self.retries += 1
+            if throttled:
+                self.throttles += 1
+
+    def on_retry(self, response: Any = None, caught_exception: Exception = None, **_) -> None:
+        """Botocore ``needs-retry`` event handler that counts the failed attempts.
+
+        Args:
+            response: Tuple of the HTTP response and the parsed response, or ``None`` for connection errors.
+            caught_exception: Exception raised by the attempt, if any.
+        """
+        if caught_exception is not None:
+            self.observe_retry()
+            return
+        if not response:
+            return
+        http_response, parsed = response
+        status = getattr(http_response, "status_code", 200)
+        code = (parsed or {}).get("Error", {}).get("Code")
+        throttled = code in THROTTLE_CODES or status in THROTTLE_STATUS
+        # Client errors such as NoSuchKey or PreconditionFailed are not retried by botocore
+        if throttled or status >= 500 or code == "RequestTimeout":
+            self.observe_retry(throttled=throttled)
+
+    def on_status(self, status: Optional[int]) -> None:
+        """Counts a failed attempt from the asyncio engine, given its HTTP status code or ``None``."""
+        self.observe_retry(throttled=status in THROTTLE_STATUS)
+
+    def to_dict(self, results: Dict[str, int] = None) -> Dict[str, Any]:
+        """Returns the metrics as a dictionary.
+
+        Args:
+            results: Download counts to include.
+
+        Returns:
+            Dict[str, Any]:
+            Returns the metrics as a JSON serializable dictionary.
+        """
+        with self.lock:
+            elapsed = time.time() - self.start_time
+            return dict(
+                elapsed=round(elapsed, 3),
+                objects=self.objects,
+                bytes=self.bytes,
+                throughput=round(self.bytes / elapsed, 3) if elapsed else 0.0,
+                results=dict(results or {}),
+                retries=self.retries,
+                throttles=self.throttles,
+                phases={phase: round(seconds, 6) for phase, seconds in self.phases.items()},
+                latency=dict(listing=self.listing.to_dict(), ttfb=self.ttfb.to_dict(), total=self.total.to_dict()),
+                timeline=[dict(second=round(index * self.resolution, 3), bytes=nbytes)
+                          for index, nbytes in sorted(self.throughput.items())],
+            )
+
+    def to_json(self, results: Dict[str, int] = None, **kwargs) -> str:
+        """Returns the metrics as a JSON string."""
+        return json.dumps(self.to_dict(results), **kwargs)
+
+    def to_prometheus(self, results: Dict[str, int] = None, prefix: str = "s3_download") -> str:
+        """Returns the metrics in the Prometheus text exposition format.
+
+        Args:
+            results: Download counts to include.
+            prefix: Prefix of the metric names.
+
+        Returns:
+            str:
+            Returns the metrics as Prometheus text.
+        """
+        lines: List[str] = []
+        with self.lock:
+            for name, histogram in (("listing", self.listing), ("ttfb", self.ttfb), ("total", self.total)):
+                metric = f"{prefix}_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.labels(), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum {histogram.sum}")
+                lines.append(f"{metric}_count {histogram.count}")
+            lines.append(f"# TYPE {prefix}_phase_seconds_total counter")
+            for phase, seconds in self.phases.items():
+                lines.append(f'{prefix}_phase_seconds_total{{phase="{phase}"}} {seconds}')
+            for name, value in (("bytes", self.bytes), ("retries", self.retries), ("throttles", self.throttles)):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+        if results:
+            lines.append(f"# TYPE {prefix}_objects_total counter")
+            for result, count in results.items():
+                lines.append(f'{prefix}_objects_total{{result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename: str, results: Dict[str, int] = None) -> None:
+        """Writes the metrics atomically, as Prometheus text for ``.prom`` files and as JSON otherwise.
+
+        Args:
+            filename: Path of the file to write to.
+            results: Download counts to include.
+        """
+        if filename.endswith(".prom"):
+            content = self.to_prometheus(results)
+        else:
+            content = self.to_json(results, indent=2)
+        temporary = f"{filename}.tmp"
+        with open(temporary, "w") as file:
+            file.write(content)
+        os.replace(temporary, filename)
+
+
+class MetricsWriter:
+    """Writes the metrics to a file periodically, so long runs can be watched live.
+
+    >>> MetricsWriter
+
+    """
+
+    def __init__(self, metrics: Metrics, filename: str, interval: float = 10.0,
+                 results: Callable[[], Dict[str, int]] = None, logger: logging.Logger = None):
+        """Initializes the writer.
+
+        Args:
+            metrics: Metrics to write.
+            filename: Path of the file to write to.
+            interval: Seconds between each write.
+            results: Callable that returns the current download counts to include.
+            logger: Logger to report write failures to.
+        """
+        self.metrics = metrics
+        self.filename = filename
+        self.interval = interval
+        self.results = results
+        self.logger = logger
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def write(self) -> None:
+        """Writes the metrics once, logging instead of raising on failures."""
+        try:
+            self.metrics.write(self.filename, self.results() if self.results else None)
+        except OSError as error:
+            if self.logger:
+                self.logger.warning("Failed to write the metrics to %s: %s", self.filename, error)
+
+    def _write_loop(self) -> None:
+        """Writes the metrics at a fixed rate, until the writer is stopped."""
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def start(self) -> None:
+        """Starts a new writer thread, so the writer can be started again after it is stopped."""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._write_loop, name="metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops the writer thread and writes the final metrics."""
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join()
+        self.write()
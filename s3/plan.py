@@ -0,0 +1,206 @@
+"""Dry-run plan of a download, with the work broken down by prefix and by size and an estimate of the wall time.
+
+>>> Plan
+
+"""
+
+import json
+import os
+import time
+from collections.abc import Generator
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from s3.snapshot import partition_of
+from s3.squire import S3Object, Sort
+
+# Upper bound of each size bucket, exclusive, the last one holding everything larger
+SIZE_BUCKETS: Tuple[Tuple[str, Optional[int]], ...] = (
+    ("0-64KB", 1024 * 64),
+    ("64KB-1MB", 1024 * 1024),
+    ("1MB-16MB", 1024 * 1024 * 16),
+    ("16MB-256MB", 1024 * 1024 * 256),
+    ("256MB-1GB", 1024 * 1024 * 1024),
+    ("1GB+", None),
+)
+
+
+def size_bucket(size: int) -> str:
+    """Returns the label of the size bucket that holds an object of the given size."""
+    for label, upper in SIZE_BUCKETS:
+        if upper is None or size < upper:
+            return label
+
+
+@dataclass
+class Probe:
+    """Represents the latency and the throughput measured against the bucket.
+
+    >>> Probe
+
+    """
+
+    latency: float
+    bandwidth: float
+    streams: int
+    requests: int
+    bytes: int
+
+    def estimate(self, objects: int, nbytes: int, threads: int) -> float:
+        """Estimates the wall time of a download.
+
+        Args:
+            objects: Number of objects to download.
+            nbytes: Number of bytes to download.
+            threads: Number of objects downloaded at the same time.
+
+        Returns:
+            float:
+            Returns the seconds spent waiting on the requests, spread across the threads, plus the seconds to
+            transfer the bytes at the measured bandwidth.
+        """
+        transfer = nbytes / self.bandwidth if self.bandwidth else 0.0
+        return objects * self.latency / max(threads, 1) + transfer
+
+
+class Plan:
+    """Tallies the objects that a download would transfer, and stores them to execute exactly that set later.
+
+    >>> Plan
+
+    See Also:
+        - The plan file is JSON lines, the summary on the first line followed by ``[key, size, etag, mtime]`` for
+          each object in the order they will be downloaded.
+        - Objects are written to the plan as they are added, so the plan is never held in memory.
+        - Used as a context manager, the objects written so far are removed if the plan fails before it is saved.
+    """
+
+    def __init__(self, bucket_name: str, prefix: List[str] = None, sort: Sort = Sort.no_sort, filename: str = None):
+        """Initializes an empty plan.
+
+        Args:
+            bucket_name: Name of the bucket.
+            prefix: Prefixes the listing is limited to.
+            sort: Order in which the objects are downloaded.
+            filename: Path of the plan file to write the objects to.
+        """
+        self.bucket_name = bucket_name
+        self.prefix = prefix or []
+        self.sort = Sort(sort)
+        self.filename = filename
+        self.created = time.time()
+        self.objects = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.deduplicated = 0
+        self.deduplicated_bytes = 0
+        self.by_prefix: Dict[str, Dict[str, int]] = {}
+        self.by_size: Dict[str, Dict[str, int]] = {label: dict(objects=0, bytes=0) for label, _ in SIZE_BUCKETS}
+        self.probe: Optional[Probe] = None
+        self.threads = 1
+        # Roots are matched from the longest, so an object is tallied under the most specific prefix
+        self.roots = sorted(self.prefix or [""], key=len, reverse=True)
+        self.file = open(f"{filename}.objects", "w") if filename else None
+
+    def add(self, s3_object: S3Object, duplicate: bool = False) -> None:
+        """Adds an object to the plan.
+
+        Args:
+            s3_object: Object to download.
+            duplicate: Whether the object is materialized from a duplicate, instead of being transferred.
+        """
+        if self.file:
+            self.file.write(json.dumps([s3_object.key, s3_object.size, s3_object.etag, s3_object.last_modified]))
+            self.file.write("\n")
+        if duplicate:
+            self.deduplicated += 1
+            self.deduplicated_bytes += s3_object.size
+            return
+        self.objects += 1
+        self.bytes += s3_object.size
+        root = next((root for root in self.roots if s3_object.key.startswith(root)), "")
+        for tally in (self.by_prefix.setdefault(partition_of(root, s3_object.key), dict(objects=0, bytes=0)),
+                      self.by_size[size_bucket(s3_object.size)]):
+            tally["objects"] += 1
+            tally["bytes"] += s3_object.size
+
+    def estimate(self, threads: int = None) -> Optional[float]:
+        """Returns the estimated seconds to transfer the plan, or ``None`` if the bucket was not probed."""
+        if not self.probe:
+            return None
+        return self.probe.estimate(self.objects, self.bytes, threads or self.threads)
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns the summary of the plan as a JSON serializable dictionary."""
+        return dict(bucket=self.bucket_name, prefix=self.prefix, sort=self.sort.value, created=self.created,
+                    objects=self.objects, bytes=self.bytes, skipped=self.skipped, deduplicated=self.deduplicated,
+                    deduplicated_bytes=self.deduplicated_bytes,
+                    by_prefix=dict(sorted(self.by_prefix.items(), key=lambda item: item[1]["bytes"], reverse=True)),
+                    by_size={label: tally for label, tally in self.by_size.items() if tally["objects"]},
+                    probe=asdict(self.probe) if self.probe else None, threads=self.threads,
+                    estimated_seconds=self.estimate())
+
+    def save(self) -> None:
+        """Writes the summary followed by the objects to the plan file, atomically."""
+        self.file.close()
+        temporary = f"{self.filename}.tmp"
+        with open(temporary, "w") as file, open(f"{self.filename}.objects") as objects:
+            file.write(json.dumps(self.summary()))
+            file.write("\n")
+            for line in objects:
+                file.write(line)
+        os.replace(temporary, self.filename)
+        os.remove(f"{self.filename}.objects")
+
+    def discard(self) -> None:
+        """Removes the objects written so far and the partial plan file, when the plan is not saved."""
+        if self.file:
+            self.file.close()
+            for path in (f"{self.filename}.objects", f"{self.filename}.tmp"):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def __enter__(self) -> "Plan":
+        """Returns the plan, whose partial files are removed if it fails before it is saved."""
+        return self
+
+    def __exit__(self, exc_type: Optional[type], *args) -> None:
+        """Discards the plan on an exception, the plan file of a saved plan is kept."""
+        if exc_type is not None:
+            self.discard()
+
+    @classmethod
+    def load(cls, filename: str, bucket_name: str) -> "Plan":
+        """Loads the summary of a plan file, leaving the objects on disk.
+
+        Args:
+            filename: Path of the plan file.
+            bucket_name: Name of the bucket the plan is expected to belong to.
+
+        Raises:
+            ValueError: If the plan belongs to another bucket.
+
+        Returns:
+            Plan:
+            Returns the plan, with the objects read by ``iter_objects``.
+        """
+        with open(filename) as file:
+            summary = json.loads(file.readline())
+        if summary["bucket"] != bucket_name:
+            raise ValueError(f"Plan {filename!r} belongs to {summary['bucket']!r}, not {bucket_name!r}.")
+        plan = cls(bucket_name, prefix=summary["prefix"], sort=summary["sort"])
+        plan.filename = filename
+        for field in ("created", "objects", "bytes", "skipped", "deduplicated", "deduplicated_bytes", "threads"):
+            setattr(plan, field, summary[field])
+        plan.by_prefix = summary["by_prefix"]
+        plan.by_size.update(summary["by_size"])
+        plan.probe = Probe(**summary["probe"]) if summary["probe"] else None
+        return plan
+
+    def iter_objects(self) -> Generator[S3Object]:
+        """Yields the objects of a saved plan in the order they will be downloaded."""
+        with open(self.filename) as file:
+            file.readline()
+            for line in file:
+                key, size, etag, last_modified = json.loads(line)
+                yield S3Object(key=key, size=size, etag=etag, last_modified=last_modified)
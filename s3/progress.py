@@ -1,28 +1,46 @@
+"""Aggregated progress reporting, updated by the workers without a lock and rendered by a single thread.
+
+>>> ProgressAggregator
+
+"""
+
+import logging
 import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
 
 from alive_progress import alive_bar
 
+from s3.squire import S3Object, size_converter
+
 
 class ProgressPercentage:
-    """Tracks the file transfer progress in S3 and updates the alive_bar.
+    """Tracks the bytes received for a single transfer.
 
     >>> ProgressPercentage
 
+    See Also:
+        - Each chunk is appended to a deque, which is thread-safe without a lock, even with multipart downloads.
+        - The chunks are only summed up by the renderer thread of the ``ProgressAggregator``.
     """
 
-    def __init__(self, filename: str, size: int, bar: alive_bar):
+    __slots__ = ("filename", "size", "chunks", "received", "started", "first_byte")
+
+    def __init__(self, filename: str, size: int, bar: alive_bar = None):
         """Initializes the progress tracker.
 
         Args:
             filename: Name of the file being transferred.
             size: Total size of the file in bytes.
-            bar: alive_bar instance to update progress.
+            bar: Accepted for compatibility, the progress is rendered by the ``ProgressAggregator`` instead.
         """
-        self._filename = filename
-        self._size = size
-        self._seen_so_far = 0
-        self._lock = threading.Lock()
-        self._bar = bar
+        self.filename = filename
+        self.size = size
+        self.chunks: Deque[int] = deque()
+        self.received = 0
+        self.started: Optional[float] = None
+        self.first_byte: Optional[float] = None
 
     def __call__(self, bytes_amount: int) -> None:
         """Callback method to update progress.
@@ -30,10 +48,200 @@ class ProgressPercentage:
         Args:
             bytes_amount: Number of bytes transferred in the last chunk.
         """
-        with self._lock:
-            self._seen_so_far += bytes_amount
-            percent = (self._seen_so_far / self._size) * 100
-            bar_len = 20
-            filled = int(bar_len * percent / 100)
-            bar_str = "█" * filled + "." * (bar_len - filled)
-            self._bar.text(f" || {self._filename} [{bar_str}] {percent:.0f}%")
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+        self.chunks.append(bytes_amount)
+
+    def drain(self) -> int:
+        """Sums up the chunks received since the last call. Only called by the renderer thread."""
+        total = 0
+        while self.chunks:
+            total += self.chunks.popleft()
+        self.received += total
+        return total
+
+
+class HeadlessBar:
+    """Stands in for the alive_bar in headless mode, so there is no terminal rendering at all.
+
+    >>> HeadlessBar
+
+    """
+
+    def __call__(self, *args, **kwargs) -> None:
+        """Ignores the progress increments."""
+
+    def text(self, *args, **kwargs) -> None:
+        """Ignores the progress text."""
+
+    def title(self, *args, **kwargs) -> None:
+        """Ignores the progress title."""
+
+
+class ProgressAggregator:
+    """Aggregates the progress of all transfers and redraws the progress text at a fixed rate.
+
+    >>> ProgressAggregator
+
+    See Also:
+        - Workers only append to deques, which are drained by the renderer thread, so there is no lock per chunk.
+        - Renders the total bytes, the throughput, the ETA, the objects in flight and the slowest active transfer.
+        - Without a bar, the renderer still sums up the progress for the summary, but never draws anything.
+    """
+
+    def __init__(self, bar: alive_bar = None, interval: float = 0.25, smoothing: float = 0.3,
+                 logger: logging.Logger = None):
+        """Initializes the aggregator.
+
+        Args:
+            bar: alive_bar instance to render the progress text to. Renders nothing when ``None``.
+            interval: Seconds between each redraw.
+            smoothing: Weight of the latest interval in the exponential moving average of the throughput.
+            logger: Logger to write the summary to.
+        """
+        self.bar = bar
+        self.interval = interval
+        self.smoothing = smoothing
+        self.logger = logger
+        self.expected = 0
+        # Bytes of the objects that finished without sending all of their bytes, such as the skipped objects
+        self.settled = 0
+        self.received = 0
+        self.rate = 0.0
+        self.started: Deque[ProgressPercentage] = deque()
+        self.finished: Deque[str] = deque()
+        self.active: Dict[str, ProgressPercentage] = {}
+        self.start_time = time.time()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._render_loop, name="progress", daemon=True)
+
+    def expect(self, nbytes: int) -> None:
+        """Adds to the total number of bytes expected, used for the ETA.
+
+        Args:
+            nbytes: Number of bytes to add.
+        """
+        self.expected += nbytes
+
+    def track(self, s3_object: S3Object) -> ProgressPercentage:
+        """Creates the progress callback for an object.
+
+        Args:
+            s3_object: Object that is about to be downloaded.
+
+        Returns:
+            ProgressPercentage:
+            Returns the callback to pass to the transfer.
+        """
+        callback = ProgressPercentage(filename=s3_object.key, size=s3_object.size)
+        self.started.append(callback)
+        return callback
+
+    def finish(self, s3_object: S3Object) -> None:
+        """Marks the transfer of an object as finished, whether it succeeded, failed or was skipped.
+
+        Args:
+            s3_object: Object whose transfer finished.
+        """
+        self.finished.append(s3_object.key)
+
+    def poll(self) -> float:
+        """Drains the deques updated by the workers. Only called by the renderer thread.
+
+        Returns:
+            float:
+            Returns the current time.
+        """
+        now = time.time()
+        # A transfer is tracked before it is finished, so every finish counted here has its start drained below
+        finished = len(self.finished)
+        while self.started:
+            callback = self.started.popleft()
+            self.active[callback.filename] = callback
+        for callback in self.active.values():
+            if callback.drain() and callback.started is None:
+                callback.started = now
+        for _ in range(finished):
+            if callback := self.active.pop(self.finished.popleft(), None):
+                callback.drain()
+                self.received += callback.received
+                self.settled += max(callback.size - callback.received, 0)
+        return now
+
+    def _render_loop(self) -> None:
+        """Redraws the progress text at a fixed rate, until the aggregator is stopped."""
+        last_time, last_total = time.time(), 0
+        while not self.stop_event.wait(self.interval):
+            now = self.poll()
+            total = self.total
+            if elapsed := now - last_time:
+                rate = (total - last_total) / elapsed
+                self.rate = self.smoothing * rate + (1 - self.smoothing) * self.rate
+            last_time, last_total = now, total
+            if self.bar is not None:
+                self.bar.text(self.status(now))
+
+    @property
+    def total(self) -> int:
+        """Returns the total number of bytes received, including the transfers still in flight."""
+        return self.received + sum(callback.received for callback in self.active.values())
+
+    def in_flight(self) -> int:
+        """Returns the number of transfers that have started receiving bytes and haven't finished yet."""
+        return sum(1 for callback in self.active.values() if callback.started is not None)
+
+    def eta(self) -> Optional[float]:
+        """Returns the estimated number of seconds left, based on the smoothed throughput."""
+        remaining = self.expected - self.settled - self.total
+        if remaining <= 0 or self.rate <= 0:
+            return None
+        return remaining / self.rate
+
+    def slowest(self, now: float) -> Optional[ProgressPercentage]:
+        """Returns the active transfer with the lowest throughput."""
+        candidates = [callback for callback in self.active.values() if callback.started is not None]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda callback: callback.received / max(now - callback.started, 1e-3))
+
+    def status(self, now: float) -> str:
+        """Returns the progress text to render."""
+        eta = self.eta()
+        text = (f" || {size_converter(self.total)} | {size_converter(max(int(self.rate), 0))}/s | "
+                f"ETA: {time.strftime('%H:%M:%S', time.gmtime(eta)) if eta is not None else '--:--:--'} | "
+                f"in flight: {self.in_flight()}")
+        if slowest := self.slowest(now):
+            percent = slowest.received / slowest.size * 100 if slowest.size else 100
+            text += f" | slowest: {slowest.filename} [{percent:.0f}%]"
+        return text
+
+    def summary(self) -> Dict[str, float]:
+        """Returns the total bytes received and the average throughput, once the renderer thread is stopped."""
+        elapsed = time.time() - self.start_time
+        return dict(bytes=self.total, seconds=round(elapsed, 3),
+                    throughput=round(self.total / elapsed, 3) if elapsed else 0.0)
+
+    def start(self) -> None:
+        """Starts the renderer thread."""
+        self.start_time = time.time()
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops the renderer thread and settles the remaining progress."""
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.poll()
+        if self.logger:
+            summary = self.summary()
+            self.logger.info("Received %s in %.2fs [%s/s]", size_converter(summary["bytes"]),
+                             summary["seconds"], size_converter(int(summary["throughput"])))
+
+    def __enter__(self) -> "ProgressAggregator":
+        """Starts the renderer thread as a context manager."""
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Stops the renderer thread."""
+        self.stop()
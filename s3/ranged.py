@@ -0,0 +1,275 @@
+"""Resumable and parallel downloads using ranged GETs into a preallocated ``.part`` file.
+
+>>> RangedDownload
+
+"""
+
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Any, List, Tuple
+
+from botocore.exceptions import (ClientError, IncompleteReadError,
+                                 ReadTimeoutError, ResponseStreamingError)
+
+from s3.squire import S3Object
+
+CHUNK_SIZE: int = 1024 * 1024 * 16  # 16MB
+READ_SIZE: int = 1024 * 256  # 256KB
+RANGE_ATTEMPTS: int = 3
+# Windows translates newlines in files that are not opened in binary mode
+O_BINARY: int = getattr(os, "O_BINARY", 0)
+_seek_lock = threading.Lock()
+# Errors raised while reading a response body, after which the same request can be sent again
+STREAMING_ERRORS = (IncompleteReadError, ReadTimeoutError, ResponseStreamingError, ConnectionError)
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merges overlapping and adjacent ranges of chunk indices.
+
+    Args:
+        ranges: List of inclusive ``(first, last)`` chunk indices.
+
+    Returns:
+        List[Tuple[int, int]]:
+        Returns the sorted list of merged ranges.
+    """
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def write_at(fd: int, data: bytes, offset: int) -> None:
+    """Writes the data at the given offset, without moving a file position shared by other threads.
+
+    Args:
+        fd: File descriptor to write to.
+        data: Data to write.
+        offset: Offset in the file to write the data at.
+    """
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, offset)
+        else:  # Windows doesn't have pwrite
+            with _seek_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+def preallocate(fd: int, size: int) -> None:
+    """Reserves the blocks for a file upfront, falling back to a sparse file where that is not supported.
+
+    Args:
+        fd: File descriptor of the file.
+        size: Size of the file in bytes.
+    """
+    os.ftruncate(fd, size)
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:  # Not supported by the filesystem
+            pass
+
+
+class RangedDownload:
+    """Downloads an object in byte ranges that survive interruptions, optionally fetching the ranges in parallel.
+
+    >>> RangedDownload
+
+    See Also:
+        - Partial content is written to ``<target>.part`` and the completed chunks to ``<target>.part.json``
+        - On restart, only the missing chunks are fetched, as long as the ETag and size haven't changed.
+        - Each ranged GET is sent with ``If-Match``, so an object that changes midway is refetched in full.
+        - The ``.part`` file is preallocated and each range is written at its offset with ``os.pwrite``.
+        - With ``concurrency`` > 1, the ranges are fetched on a thread pool. The client's connection pool should be
+          at least as large.
+    """
+
+    def __init__(self, client: Any, bucket_name: str, s3_object: S3Object, target_file: str,
+                 callback: Callable[[int], None] = None, chunk_size: int = CHUNK_SIZE,
+                 logger: logging.Logger = None, concurrency: int = 1):
+        """Initializes the ranged download.
+
+        Args:
+            client: S3 client to download the object with.
+            bucket_name: Name of the bucket.
+            s3_object: Object to download.
+            target_file: Path of the file to download to.
+            callback: Callable that receives the number of bytes received with each read.
+            chunk_size: Size of each byte range.
+            logger: Logger to log the resumed downloads.
+            concurrency: Number of ranges to fetch in parallel.
+        """
+        self.client = client
+        self.bucket_name = bucket_name
+        self.s3_object = s3_object
+        self.target_file = target_file
+        self.part_file = f"{target_file}.part"
+        self.state_file = f"{target_file}.part.json"
+        self.callback = callback or (lambda _: None)
+        self.chunk_size = chunk_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.concurrency = max(concurrency, 1)
+        self.completed: List[Tuple[int, int]] = []
+        # Bytes reported to the callback so far, taken back if the object changes and is refetched in full
+        self.reported = 0
+        self.lock = threading.Lock()
+
+    @property
+    def chunks(self) -> int:
+        """Returns the total number of chunks in the object."""
+        return max(-(-self.s3_object.size // self.chunk_size), 1)
+
+    def report(self, nbytes: int) -> None:
+        """Reports the bytes received, or taken back when negative, to the callback."""
+        with self.lock:
+            self.reported += nbytes
+        self.callback(nbytes)
+
+    def load_state(self) -> None:
+        """Loads the completed ranges, discarding them if the object has changed since the partial download."""
+        self.completed = []
+        if not (os.path.isfile(self.state_file) and os.path.isfile(self.part_file)):
+            return
+        try:
+            with open(self.state_file) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return
+        if (state.get("etag"), state.get("size"), state.get("chunk_size")) != (
+                self.s3_object.etag, self.s3_object.size, self.chunk_size
+        ):
+            self.logger.info("%s has changed since the partial download, refetching in full.", self.s3_object.key)
+            return
+        self.completed = [tuple(item) for item in state.get("completed", [])]
+
+    def save_state(self) -> None:
+        """Atomically writes the completed ranges to the sidecar file."""
+        state = dict(etag=self.s3_object.etag, size=self.s3_object.size,
+                     chunk_size=self.chunk_size, completed=self.completed)
+        temporary = f"{self.state_file}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+        os.replace(temporary, self.state_file)
+
+    def missing(self) -> List[int]:
+        """Returns the indices of the chunks that haven't been downloaded yet."""
+        done = set()
+        for first, last in self.completed:
+            done.update(range(first, last + 1))
+        return [index for index in range(self.chunks) if index not in done]
+
+    def refresh(self) -> None:
+        """Fetches the current ETag and size of the object."""
+        response = self.client.head_object(Bucket=self.bucket_name, Key=self.s3_object.key)
+        self.s3_object.etag = response["ETag"].strip('"')
+        self.s3_object.size = response["ContentLength"]
+
+    def fetch(self, fd: int, index: int) -> None:
+        """Fetches a single chunk and writes it at its offset, refetching it when the connection drops midway.
+
+        Args:
+            fd: File descriptor of the ``.part`` file.
+            index: Index of the chunk.
+        """
+        start = index * self.chunk_size
+        end = min(start + self.chunk_size, self.s3_object.size) - 1
+        for attempt in range(1, RANGE_ATTEMPTS + 1):
+            response = self.client.get_object(
+                Bucket=self.bucket_name, Key=self.s3_object.key, Range=f"bytes={start}-{end}",
+                IfMatch=self.s3_object.etag
+            )
+            offset = start
+            try:
+                for data in response["Body"].iter_chunks(READ_SIZE):
+                    # Each write carries its own offset, so the threads never share a file position
+                    write_at(fd, data, offset)
+                    offset += len(data)
+                    self.report(len(data))
+                return
+            except STREAMING_ERRORS:
+                # The range is fetched again from the start, so its bytes are taken back from the progress
+                self.report(start - offset)
+                if attempt == RANGE_ATTEMPTS:
+                    raise
+            finally:
+                response["Body"].close()
+
+    def complete(self, index: int) -> None:
+        """Records a completed chunk in the sidecar file."""
+        with self.lock:
+            self.completed = merge_ranges(self.completed + [(index, index)])
+            self.save_state()
+
+    def run(self) -> None:
+        """Downloads the missing chunks and moves the ``.part`` file to the target once complete."""
+        if not self.s3_object.etag:
+            self.refresh()
+        self.load_state()
+        try:
+            self._download()
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") not in ("PreconditionFailed", "412"):
+                raise
+            self.logger.info("%s has changed during the download, refetching in full.", self.s3_object.key)
+            # Nothing downloaded so far is kept, so it is taken back from the progress
+            self.report(-self.reported)
+            self.refresh()
+            self.completed = []
+            self._download()
+        os.replace(self.part_file, self.target_file)
+        os.remove(self.state_file)
+
+    def _download(self) -> None:
+        """Fetches the missing chunks, recording each one as it completes."""
+        if not self.completed or not os.path.isfile(self.part_file):
+            self.completed = []
+            fd = os.open(self.part_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | O_BINARY, 0o666)
+            try:
+                preallocate(fd, self.s3_object.size)
+            finally:
+                os.close(fd)
+        elif resumed := sum(min((last + 1) * self.chunk_size, self.s3_object.size) - first * self.chunk_size
+                            for first, last in self.completed):
+            self.logger.info("Resuming %s with %d bytes already downloaded.", self.s3_object.key, resumed)
+            self.report(resumed)
+        self.save_state()
+        fd = os.open(self.part_file, os.O_WRONLY | O_BINARY)
+        try:
+            if self.concurrency == 1:
+                for index in self.missing():
+                    self.fetch(fd, index)
+                    self.complete(index)
+            else:
+                self._download_parallel(fd)
+        finally:
+            os.close(fd)
+
+    def _download_parallel(self, fd: int) -> None:
+        """Fetches the missing chunks on a thread pool, stopping at the first failure."""
+        def task(index: int) -> None:
+            """Fetches a chunk and records it, unless another chunk has failed already."""
+            if not failed.is_set():
+                self.fetch(fd, index)
+                self.complete(index)
+
+        failed = threading.Event()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="range") as executor:
+            futures = [executor.submit(task, index) for index in self.missing()]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                if error := future.exception():
+                    failed.set()
+                    for pending in futures:
+                        pending.cancel()
+                    raise error
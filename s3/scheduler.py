@@ -0,0 +1,154 @@
+"""Size-aware scheduler that sends small and large objects to separate lanes sharing one connection pool.
+
+>>> Scheduler
+
+"""
+
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from s3.ranged import STREAMING_ERRORS
+from s3.squire import S3Object
+
+READ_SIZE: int = 1024 * 256  # 256KB
+
+
+class Scheduler:
+    """Routes small objects to a single-GET lane with high fan-out and large objects to a multipart lane.
+
+    >>> Scheduler
+
+    See Also:
+        - Both lanes share one client, whose connection pool is sized to the total number of requests in flight.
+        - Small objects skip the ``HeadObject`` call and the ``TransferManager`` overhead of ``download_file``.
+        - Total threads: ``small_workers + large_workers * (1 + large_concurrency)``
+    """
+
+    def __init__(self, session: boto3.Session, bucket_name: str, retry_config: Config,
+                 transfer_config: TransferConfig, endpoint_url: str = None, small_threshold: int = None,
+                 small_workers: int = 32, large_workers: int = 2, large_concurrency: int = 8):
+        """Creates the lanes and the shared client.
+
+        Args:
+            session: boto3 session to create the client with.
+            bucket_name: Name of the bucket.
+            retry_config: Retry configuration for the client.
+            transfer_config: Base transfer configuration for the multipart lane.
+            endpoint_url: Custom endpoint URL for S3 compatible storage.
+            small_threshold: Objects smaller than this are sent to the single-GET lane.
+                Defaults to the ``multipart_threshold`` of the transfer configuration.
+            small_workers: Number of threads in the single-GET lane.
+            large_workers: Number of objects downloaded concurrently in the multipart lane.
+            large_concurrency: Number of parts downloaded concurrently for each object in the multipart lane.
+        """
+        self.bucket_name = bucket_name
+        self.small_threshold = small_threshold or transfer_config.multipart_threshold
+        self.pool_size = small_workers + large_workers * large_concurrency
+        self.client = session.client(
+            service_name="s3", endpoint_url=endpoint_url,
+            config=retry_config.merge(Config(max_pool_connections=self.pool_size))
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=transfer_config.multipart_threshold,
+            multipart_chunksize=transfer_config.multipart_chunksize,
+            num_download_attempts=transfer_config.num_download_attempts,
+            max_io_queue=transfer_config.max_io_queue,
+            io_chunksize=transfer_config.io_chunksize,
+            max_concurrency=large_concurrency,
+            use_threads=True,
+        )
+        self.small = ThreadPoolExecutor(max_workers=small_workers, thread_name_prefix="small-lane")
+        self.large = ThreadPoolExecutor(max_workers=large_workers, thread_name_prefix="large-lane")
+
+    def is_small(self, s3_object: S3Object) -> bool:
+        """Returns whether an object belongs to the single-GET lane."""
+        return s3_object.size < self.small_threshold
+
+    def submit(self, s3_object: S3Object, fn: Callable, /, *args, **kwargs) -> Future:
+        """Submits a task to the lane for the given object.
+
+        Args:
+            s3_object: Object the task downloads.
+            fn: Callable to run on the lane.
+
+        Returns:
+            Future:
+            Returns the future for the task.
+        """
+        lane = self.small if self.is_small(s3_object) else self.large
+        return lane.submit(fn, *args, **kwargs)
+
+    def download(self, s3_object: S3Object, target_file: str, callback: Callable[[int], Any]) -> float:
+        """Downloads an object using the method that fits its size.
+
+        Args:
+            s3_object: Object to download.
+            target_file: Path of the file to download to.
+            callback: Callable that receives the number of bytes received with each chunk.
+
+        Returns:
+            float:
+            Returns the seconds spent writing to disk, or zero for the multipart lane that writes as it reads.
+        """
+        if self.is_small(s3_object):
+            return self.get(s3_object=s3_object, target_file=target_file, callback=callback)
+        self.client.download_file(self.bucket_name, s3_object.key, target_file,
+                                  Config=self.transfer_config, Callback=callback)
+        return 0.0
+
+    def get(self, s3_object: S3Object, target_file: str, callback: Callable[[int], Any]) -> float:
+        """Downloads an object with a single ``GetObject`` call, streaming the body to a temporary file.
+
+        Args:
+            s3_object: Object to download.
+            target_file: Path of the file to download to.
+            callback: Callable that receives the number of bytes received with each chunk.
+
+        Returns:
+            float:
+            Returns the seconds spent writing to disk.
+        """
+        temporary = f"{target_file}.s3tmp"
+        disk_time = 0.0
+        for attempt in range(1, self.transfer_config.num_download_attempts + 1):
+            response = self.client.get_object(Bucket=self.bucket_name, Key=s3_object.key)
+            received = 0
+            try:
+                with open(temporary, "wb") as file:
+                    for data in response["Body"].iter_chunks(READ_SIZE):
+                        start = time.perf_counter()
+                        file.write(data)
+                        disk_time += time.perf_counter() - start
+                        received += len(data)
+                        callback(len(data))
+                os.replace(temporary, target_file)
+                return disk_time
+            except STREAMING_ERRORS:
+                # Same as s3transfer, the body is streamed again from the start when the connection drops midway
+                callback(-received)
+                if attempt == self.transfer_config.num_download_attempts:
+                    raise
+            finally:
+                response["Body"].close()
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        """Shuts down both lanes."""
+        self.small.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self.large.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self) -> "Scheduler":
+        """Returns the scheduler as a context manager."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Waits for both lanes to finish."""
+        self.shutdown(wait=True)
@@ -0,0 +1,240 @@
+"""Deterministic partition of a bucket across several nodes, with a completion summary for each shard.
+
+>>> Shard
+
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections.abc import Generator, Iterable
+from enum import Enum
+from typing import Any, Dict, List, Union
+
+from s3.catalog import Catalog
+from s3.squire import S3Object, Sort
+
+# Number of owned objects yielded at a time by the size-balanced partition, the same as a listing page
+PAGE_SIZE: int = 1000
+
+
+class ShardStrategy(Enum):
+    """Enum to represent the strategies for assigning the objects to the shards.
+
+    >>> ShardStrategy
+
+    """
+
+    hash: str = "hash"
+    size: str = "size"
+
+
+def stable_hash(key: str) -> int:
+    """Returns a hash of the key that is the same across processes and machines, unlike the builtin ``hash``.
+
+    Args:
+        key: Object key to hash.
+
+    Returns:
+        int:
+        Returns a 64-bit unsigned integer.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class Shard:
+    """Claims a disjoint subset of the listed objects for one of several nodes downloading the same bucket.
+
+    >>> Shard
+
+    See Also:
+        - ``hash`` assigns each key by a stable hash, so every node decides on its own and the listing can stream.
+        - ``size`` cuts the key ordered listing into contiguous ranges of roughly equal bytes, off by one object
+          at most. The whole listing is held in a ``Catalog`` before the first object is claimed.
+        - Both strategies rely on every node listing the same objects. With ``size``, an object added or removed
+          between the listings of two nodes shifts the boundaries, so ``hash`` is safer for buckets that change.
+    """
+
+    def __init__(self, index: int, count: int, strategy: Union[str, ShardStrategy] = ShardStrategy.hash,
+                 memory_budget: int = 1024 * 1024 * 256):
+        """Initializes the shard.
+
+        Args:
+            index: Index of the shard, starting from 1.
+            count: Total number of shards.
+            strategy: Strategy for assigning the objects to the shards.
+            memory_budget: Bytes of listing to hold in memory for the ``size`` strategy, before spilling to disk.
+
+        Raises:
+            ValueError: If the index is not within the shard count.
+        """
+        if not 1 <= index <= count:
+            raise ValueError(f"Shard index must be between 1 and {count}, received {index}.")
+        self.index = index
+        self.count = count
+        self.strategy = ShardStrategy(strategy)
+        self.memory_budget = memory_budget
+        self.objects = 0
+        self.bytes = 0
+
+    @classmethod
+    def parse(cls, value: str, **kwargs) -> "Shard":
+        """Creates a shard from its ``index/count`` notation, such as ``2/4``.
+
+        Args:
+            value: Shard in ``index/count`` notation.
+            kwargs: Keyword arguments for ``Shard``.
+
+        Raises:
+            ValueError: If the notation is invalid.
+
+        Returns:
+            Shard:
+            Returns the shard.
+        """
+        index, _, count = value.strip().partition("/")
+        if not (index.isdigit() and count.isdigit()):
+            raise ValueError(f"Shard must be in the format 'index/count', such as '1/4', received {value!r}.")
+        return cls(int(index), int(count), **kwargs)
+
+    def __str__(self) -> str:
+        """Returns the shard in ``index/count`` notation."""
+        return f"{self.index}/{self.count}"
+
+    def owns(self, s3_object: S3Object) -> bool:
+        """Checks if an object belongs to this shard by the hash of its key.
+
+        Args:
+            s3_object: Object to check.
+
+        Returns:
+            bool:
+            Returns ``True`` if the object belongs to this shard.
+        """
+        return stable_hash(s3_object.key) % self.count == self.index - 1
+
+    def claim(self, s3_objects: Iterable[S3Object]) -> List[S3Object]:
+        """Counts the claimed objects and returns them as a list."""
+        claimed = list(s3_objects)
+        self.objects += len(claimed)
+        self.bytes += sum(s3_object.size for s3_object in claimed)
+        return claimed
+
+    def pages(self, pages: Iterable[List[S3Object]]) -> Generator[List[S3Object]]:
+        """Filters the listing pages down to the objects that belong to this shard.
+
+        Args:
+            pages: Pages of the listing.
+
+        Yields:
+            List[S3Object]:
+            Yields the objects of each page that belong to this shard.
+        """
+        self.objects = self.bytes = 0
+        if self.strategy == ShardStrategy.hash:
+            for page in pages:
+                yield self.claim(s3_object for s3_object in page if self.owns(s3_object))
+            return
+        yield from self._balanced(pages)
+
+    def _balanced(self, pages: Iterable[List[S3Object]]) -> Generator[List[S3Object]]:
+        """Yields the objects of the contiguous key range that holds this shard's share of the bytes."""
+        catalog = Catalog(sort=Sort.key, memory_budget=self.memory_budget)
+        try:
+            for page in pages:
+                catalog.extend(page)
+            total = catalog.total_size
+            offset = 0
+            batch = []
+            for s3_object in catalog:
+                if total:
+                    # An object belongs to the shard that holds the midpoint of its bytes
+                    owner = min(int((offset + s3_object.size / 2) * self.count / total), self.count - 1)
+                else:
+                    owner = stable_hash(s3_object.key) % self.count
+                offset += s3_object.size
+                if owner != self.index - 1:
+                    continue
+                batch.append(s3_object)
+                if len(batch) >= PAGE_SIZE:
+                    yield self.claim(batch)
+                    batch = []
+            if batch:
+                yield self.claim(batch)
+        finally:
+            catalog.close()
+
+    def summary(self, bucket_name: str, results: Dict[str, int], start_time: float,
+                prefix: List[str] = None) -> Dict[str, Any]:
+        """Returns the completion summary of this shard.
+
+        Args:
+            bucket_name: Name of the bucket.
+            results: Download counts of the shard.
+            start_time: Time at which the downloads started.
+            prefix: Prefixes the listing was limited to.
+
+        Returns:
+            Dict[str, Any]:
+            Returns the summary as a JSON serializable dictionary.
+        """
+        return dict(bucket=bucket_name, prefix=prefix or [], shard=self.index, count=self.count,
+                    strategy=self.strategy.value, objects=self.objects, bytes=self.bytes, results=dict(results),
+                    started=start_time, finished=time.time())
+
+    def write_summary(self, filename: str, **kwargs) -> None:
+        """Writes the completion summary atomically.
+
+        Args:
+            filename: Path of the file to write to.
+            kwargs: Keyword arguments for ``summary``.
+        """
+        temporary = f"{filename}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(self.summary(**kwargs), file, indent=2)
+        os.replace(temporary, filename)
+
+
+def merge_summaries(filenames: Iterable[str]) -> Dict[str, Any]:
+    """Merges the completion summaries of the shards into a single summary of the bucket.
+
+    Args:
+        filenames: Paths of the shard summaries.
+
+    Raises:
+        ValueError: If the summaries belong to different buckets, prefixes or partitions.
+
+    Returns:
+        Dict[str, Any]:
+        Returns the totals across the shards, the missing shards, and whether every shard completed without failures.
+    """
+    summaries = []
+    for filename in filenames:
+        with open(filename) as file:
+            summaries.append(json.load(file))
+    if not summaries:
+        raise ValueError("No shard summaries to merge.")
+    first = summaries[0]
+    partition = ("bucket", "prefix", "count", "strategy")
+    for summary in summaries[1:]:
+        if any(summary[field] != first[field] for field in partition):
+            raise ValueError(f"Shard {summary['shard']} doesn't belong to the same partition as shard "
+                             f"{first['shard']}: {({field: summary[field] for field in partition})}")
+    shards = {summary["shard"]: summary for summary in summaries}
+    results = {}
+    for summary in shards.values():
+        for result, count in summary["results"].items():
+            results[result] = results.get(result, 0) + count
+    missing = [index for index in range(1, first["count"] + 1) if index not in shards]
+    shard_bytes = [summary["bytes"] for summary in shards.values()]
+    return dict(
+        bucket=first["bucket"], prefix=first["prefix"], count=first["count"], strategy=first["strategy"],
+        shards=sorted(shards), missing=missing, duplicates=len(summaries) - len(shards),
+        objects=sum(summary["objects"] for summary in shards.values()), bytes=sum(shard_bytes), results=results,
+        # Ratio of the largest shard to the mean, 1.0 being a perfect balance
+        imbalance=round(max(shard_bytes) * len(shard_bytes) / sum(shard_bytes), 3) if sum(shard_bytes) else 1.0,
+        started=min(summary["started"] for summary in shards.values()),
+        finished=max(summary["finished"] for summary in shards.values()),
+        complete=not missing and not results.get("failed"),
+    )
@@ -0,0 +1,327 @@
+"""Local snapshot of the bucket listing with a TTL, refreshed incrementally by relisting the changed prefixes only.
+
+>>> Snapshot
+
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import Generator, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import Enum
+from typing import Dict, List, Optional, Tuple, Union
+
+from s3.filters import ObjectFilter
+from s3.listing import Lister, Shard
+from s3.squire import S3Object
+
+# Sorts after every valid UTF-8 sequence, so ``prefix + HIGHEST`` is the exclusive upper bound of the prefix
+HIGHEST: str = "\U0010ffff"
+# Number of rows read from the snapshot at a time, the same as a listing page
+PAGE_SIZE: int = 1000
+
+
+class Refresh(Enum):
+    """Enum to represent the ways of refreshing an expired snapshot.
+
+    >>> Refresh
+
+    """
+
+    full: str = "full"
+    incremental: str = "incremental"
+
+
+def partition_of(root: str, key: str) -> str:
+    """Returns the common prefix one level below the root that holds the key, or the root for the keys directly in it.
+
+    Args:
+        root: Prefix that was listed.
+        key: Object key under the root.
+
+    Returns:
+        str:
+        Returns the prefix up to and including the first ``/`` after the root.
+    """
+    slash = key.find("/", len(root))
+    return key[:slash + 1] if slash >= 0 else root
+
+
+class Snapshot:
+    """Serves the listing of a bucket from a SQLite snapshot, and relists only what has expired.
+
+    >>> Snapshot
+
+    See Also:
+        - Each listed prefix is a root of the snapshot. A prefix under a root is served from the root's objects.
+        - Within ``ttl`` seconds of its listing, a root is served from disk without a single request.
+        - An expired root is relisted in full by default, so every change is picked up once the ``ttl`` has passed.
+        - With ``Refresh.incremental``, an expired root is refreshed incrementally instead: the objects directly
+          under it are relisted with ``Delimiter="/"``, which also finds the partitions one level below that were
+          added or removed.
+        - A partition with an object modified within ``hot_window`` seconds of the previous listing is relisted.
+          Other partitions are probed with ``StartAfter`` at their last key, which costs a single request when
+          nothing was appended.
+        - Objects deleted, overwritten or inserted before the last key of a cold partition are only picked up by
+          the full relisting that happens once the root is older than ``max_age``. Incremental refreshes are
+          opt-in for that reason, for buckets whose writes are appends to recent partitions.
+        - The snapshot holds the unfiltered listing, the ``object_filter`` is applied when it's served.
+    """
+
+    def __init__(self, filename: str, bucket_name: str, lister: Lister, logger: logging.Logger,
+                 ttl: float = 3600.0, refresh: Union[str, Refresh] = Refresh.full,
+                 hot_window: float = 86400.0, max_age: float = 86400.0 * 7, object_filter: ObjectFilter = None):
+        """Opens or creates the snapshot.
+
+        Args:
+            filename: Path of the SQLite database.
+            bucket_name: Name of the bucket, a snapshot of another bucket is rejected.
+            lister: Listing engine without a filter, to list and refresh the snapshot with.
+            logger: Logger to log where the listing was served from.
+            ttl: Seconds for which a listing is served as is.
+            refresh: Way of refreshing an expired listing, in full unless ``incremental`` is opted into.
+            hot_window: Partitions with an object modified within these seconds of the listing are relisted.
+            max_age: Seconds after which an expired listing is relisted in full, even in incremental mode.
+            object_filter: Filters applied to the objects when the listing is served.
+
+        Raises:
+            ValueError: If the snapshot belongs to another bucket.
+        """
+        if directory := os.path.dirname(filename):
+            os.makedirs(directory, exist_ok=True)
+        self.filename = filename
+        self.bucket_name = bucket_name
+        self.lister = lister
+        self.logger = logger
+        self.ttl = ttl
+        self.refresh = Refresh(refresh)
+        self.hot_window = hot_window
+        self.max_age = max_age
+        self.object_filter = object_filter
+        # Number of objects left out by the filter under each requested prefix
+        self.rejected: Dict[str, int] = {}
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS roots (root TEXT PRIMARY KEY, listed_at REAL, full_at REAL) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS partitions ("
+            "prefix TEXT PRIMARY KEY, root TEXT, newest REAL, last_key TEXT) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS objects ("
+            "key TEXT PRIMARY KEY, size INTEGER, etag TEXT, last_modified REAL) WITHOUT ROWID;"
+        )
+        self.connection.execute("INSERT OR IGNORE INTO meta VALUES ('bucket', ?)", (bucket_name,))
+        self.connection.commit()
+        (owner,) = self.connection.execute("SELECT value FROM meta WHERE name = 'bucket'").fetchone()
+        if owner != bucket_name:
+            self.connection.close()
+            raise ValueError(f"Snapshot {filename!r} belongs to the bucket {owner!r}, not {bucket_name!r}.")
+
+    def covering(self, prefix: str) -> Optional[Tuple[str, float, float]]:
+        """Returns the root that holds the prefix, along with the times of its last listing and full listing."""
+        for root, listed_at, full_at in self.connection.execute("SELECT root, listed_at, full_at FROM roots"):
+            if prefix.startswith(root):
+                return root, listed_at, full_at
+
+    def _delete(self, lower: str, upper: str) -> None:
+        """Deletes the objects with keys from ``lower`` inclusive to ``upper`` exclusive."""
+        self.connection.execute("DELETE FROM objects WHERE key >= ? AND key < ?", (lower, upper))
+
+    def _insert(self, root: str, s3_objects: List[S3Object], partitions: Dict[str, List]) -> None:
+        """Inserts the objects, and updates the newest modified time and the last key of their partitions."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)",
+            [(s3_object.key, s3_object.size, s3_object.etag, s3_object.last_modified) for s3_object in s3_objects]
+        )
+        for s3_object in s3_objects:
+            if (prefix := partition_of(root, s3_object.key)) == root:
+                continue
+            stats = partitions.setdefault(prefix, [0.0, ""])
+            stats[0] = max(stats[0], s3_object.last_modified or 0.0)
+            stats[1] = max(stats[1], s3_object.key)
+
+    def _save(self, root: str, partitions: Dict[str, List], listed_at: float, full: bool) -> None:
+        """Records the partitions of the root and the time of the listing, and commits the transaction."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO partitions VALUES (?, ?, ?, ?)",
+            [(prefix, root, newest, last_key) for prefix, (newest, last_key) in partitions.items()]
+        )
+        if full:
+            self.connection.execute("INSERT OR REPLACE INTO roots VALUES (?, ?, ?)", (root, listed_at, listed_at))
+        else:
+            self.connection.execute("UPDATE roots SET listed_at = ? WHERE root = ?", (listed_at, root))
+        self.connection.commit()
+
+    def _list(self, root: str) -> Generator[List[S3Object]]:
+        """Lists the root in full, replacing its objects and any root nested under it.
+
+        Yields:
+            List[S3Object]:
+            Yields each page of the listing as soon as it's stored, so the downloads don't wait for the listing.
+        """
+        start = time.perf_counter()
+        listed_at = time.time()
+        upper = root + HIGHEST
+        partitions: Dict[str, List] = {}
+        count = 0
+        try:
+            self._delete(root, upper)
+            self.connection.execute("DELETE FROM partitions WHERE prefix >= ? AND prefix < ?", (root, upper))
+            self.connection.execute("DELETE FROM roots WHERE root >= ? AND root < ?", (root, upper))
+            for _, s3_objects in self.lister.iter_pages([root]):
+                self._insert(root, s3_objects, partitions)
+                count += len(s3_objects)
+                yield s3_objects
+            self._save(root, partitions, listed_at, full=True)
+        except BaseException:
+            # The previous snapshot of the root stays intact if the listing fails or is not consumed entirely
+            self.connection.rollback()
+            raise
+        self.logger.info("Stored a snapshot of %d objects under %r in %.2fs.", count, root, time.perf_counter() - start)
+
+    def _refresh(self, root: str, listed_at: float) -> None:
+        """Relists the objects directly under the root, and the partitions below it that are likely to have changed.
+
+        Args:
+            root: Root of the snapshot to refresh.
+            listed_at: Time of the previous listing of the root.
+        """
+        start = time.perf_counter()
+        refreshed_at = time.time()
+        known = {
+            prefix: [newest, last_key] for prefix, newest, last_key in self.connection.execute(
+                "SELECT prefix, newest, last_key FROM partitions WHERE root = ?", (root,)
+            )
+        }
+        s3_objects, children = self.lister.discover(root)
+        added = len(s3_objects)
+        probes: Dict[str, Optional[str]] = {}
+        try:
+            # The objects directly under the root sit in the gaps between the partitions
+            lower = root
+            for prefix in sorted(known):
+                self._delete(lower, prefix)
+                lower = prefix + HIGHEST
+            self._delete(lower, root + HIGHEST)
+            partitions: Dict[str, List] = {}
+            self._insert(root, s3_objects, partitions)
+            for prefix in set(known) - set(children):
+                self._delete(prefix, prefix + HIGHEST)
+                self.connection.execute("DELETE FROM partitions WHERE prefix = ?", (prefix,))
+            for prefix in children:
+                if prefix in known and known[prefix][0] < listed_at - self.hot_window:
+                    partitions[prefix] = known[prefix]
+                    probes[prefix] = known[prefix][1]
+                else:
+                    self._delete(prefix, prefix + HIGHEST)
+                    probes[prefix] = None
+
+            def fetch(prefix: str, start_after: Optional[str]) -> List[S3Object]:
+                """Lists a partition in full, or only the keys after its last known key."""
+                shard = Shard(root=root, prefix=prefix, start_after=start_after)
+                return [s3_object for page in self.lister.list_shard(shard) for s3_object in page]
+
+            with ThreadPoolExecutor(max_workers=self.lister.workers, thread_name_prefix="snapshot") as executor:
+                futures = [executor.submit(fetch, prefix, start_after) for prefix, start_after in probes.items()]
+                for future in as_completed(futures):
+                    page = future.result()
+                    self._insert(root, page, partitions)
+                    added += len(page)
+            self._save(root, partitions, refreshed_at, full=False)
+        except BaseException:
+            self.connection.rollback()
+            raise
+        relisted = sum(start_after is None for start_after in probes.values())
+        self.logger.info("Refreshed the snapshot of %r in %.2fs: %d partitions relisted, %d probed, %d removed, "
+                         "%d objects listed.", root, time.perf_counter() - start, relisted, len(probes) - relisted,
+                         len(set(known) - set(children)), added)
+
+    def _read(self, prefix: str) -> Generator[List[S3Object]]:
+        """Reads the objects under the prefix from the snapshot, in lexicographical order.
+
+        Yields:
+            List[S3Object]:
+            Yields the objects that pass the filter, a page at a time.
+        """
+        rows = self.connection.execute(
+            "SELECT key, size, etag, last_modified FROM objects WHERE key >= ? AND key < ? ORDER BY key",
+            (prefix, prefix + HIGHEST)
+        )
+        while batch := rows.fetchmany(PAGE_SIZE):
+            if self.object_filter:
+                selected = [row for row in batch if self.object_filter.matches(row[0], row[1], row[3])]
+                if rejected := len(batch) - len(selected):
+                    self.rejected[prefix] = self.rejected.get(prefix, 0) + rejected
+                batch = selected
+            if batch:
+                yield [S3Object(key=key, size=size, etag=etag, last_modified=last_modified)
+                       for key, size, etag, last_modified in batch]
+
+    def _select(self, prefix: str, s3_objects: List[S3Object]) -> List[S3Object]:
+        """Applies the filter to a page that was just listed, counting the rejected objects under the prefix."""
+        if not self.object_filter:
+            return s3_objects
+        selected = [s3_object for s3_object in s3_objects
+                    if self.object_filter.matches(s3_object.key, s3_object.size, s3_object.last_modified)]
+        if rejected := len(s3_objects) - len(selected):
+            self.rejected[prefix] = self.rejected.get(prefix, 0) + rejected
+        return selected
+
+    def iter_pages(self, prefixes: Iterable[str]) -> Generator[Tuple[str, List[S3Object]]]:
+        """Lists all the objects under the given prefixes, from the snapshot wherever it's still valid.
+
+        Args:
+            prefixes: List of prefixes to list. An empty string lists the entire bucket.
+
+        Yields:
+            Tuple[str, List[S3Object]]:
+            Yields the requested prefix and a page of objects that belong to it.
+
+        See Also:
+            - Pages served from the snapshot are in lexicographical order.
+            - Pages left empty by the filter are not yielded, the rejected objects are counted in ``rejected``.
+        """
+        self.rejected = {}
+        for prefix in prefixes:
+            now = time.time()
+            if not (covering := self.covering(prefix)):
+                for page in self._list(prefix):
+                    if page := self._select(prefix, page):
+                        yield prefix, page
+                continue
+            root, listed_at, full_at = covering
+            age = now - listed_at
+            if age >= self.ttl and (self.refresh == Refresh.full or now - full_at >= self.max_age):
+                if root == prefix:
+                    for page in self._list(prefix):
+                        if page := self._select(prefix, page):
+                            yield prefix, page
+                    continue
+                for _ in self._list(root):
+                    pass
+            elif age >= self.ttl:
+                self._refresh(root, listed_at)
+            else:
+                self.logger.info("Serving %r from the snapshot of %r listed %.0fs ago.", prefix, root, age)
+            for page in self._read(prefix):
+                yield prefix, page
+
+    def iter_objects(self, prefixes: Iterable[str]) -> Generator[S3Object]:
+        """Lists all the objects under the given prefixes, from the snapshot wherever it's still valid.
+
+        Args:
+            prefixes: List of prefixes to list. An empty string lists the entire bucket.
+
+        Yields:
+            S3Object:
+            Yields each object in the listing.
+        """
+        for _, page in self.iter_pages(prefixes):
+            yield from page
+
+    def close(self) -> None:
+        """Closes the database."""
+        self.connection.close()
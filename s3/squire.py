@@ -1,8 +1,10 @@
+import json
 import math
-from collections.abc import Generator
+from collections.abc import Callable, Generator, Iterable
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, List, Union
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 
 def refine_prefix(prefix: Union[str, List[str]] = None) -> Generator[str]:
@@ -48,62 +50,153 @@ def size_converter(byte_size: Union[int, float]) -> str:
     return str(size) + ' ' + size_name[integer]
 
 
-def convert_to_folder_structure(sequence: Dict[str, int]) -> str:
-    """Convert objects in an S3 bucket into a folder-like representation including sizes.
+class Folder:
+    """Represents a folder in the tree of the bucket, with the total size of everything below it.
+
+    >>> Folder
+
+    """
+
+    __slots__ = ("folders", "files", "size")
+
+    def __init__(self):
+        """Initializes an empty folder."""
+        self.folders: Dict[str, Folder] = {}
+        self.files: List[Tuple[str, int]] = []
+        self.size = 0
+
+
+def build_tree(sequence: Iterable[Tuple[str, int]]) -> Folder:
+    """Builds the folder tree of the objects, without recursion.
 
     Args:
-        sequence: A dictionary where keys are S3 object keys (paths) and values are their sizes in bytes.
+        sequence: Key and size of each object in the bucket.
 
     Returns:
-        str:
-        A string representing the folder structure of the S3 bucket, with each file and folder showing the size.
+        Folder:
+        Returns the root folder. The size of each folder is accumulated while the keys are inserted, so the tree is
+        never walked again to compute them.
     """
+    root = Folder()
+    for key, size in sequence:
+        parts = key.strip("/").split("/")
+        current = root
+        current.size += size
+        for part in parts[:-1]:
+            if (folder := current.folders.get(part)) is None:
+                folder = current.folders[part] = Folder()
+            current = folder
+            current.size += size
+        current.files.append((parts[-1], size))
+    return root
 
-    # Step 1: Build tree structure
-    folder_structure = {}
 
-    for path_, size_ in sequence.items():
-        parts = path_.strip("/").split("/")
-        current = folder_structure
+def iter_folder_structure(tree: Folder) -> Generator[str]:
+    """Renders the folder tree line by line, walking it with an explicit stack instead of recursion.
 
-        for part in parts[:-1]:
-            current = current.setdefault(part, {})
+    Args:
+        tree: Root folder from ``build_tree``.
 
-        # Store file with size
-        current.setdefault("__files__", []).append((parts[-1], size_))
+    Yields:
+        str:
+        Yields each line of the representation, folders first and then files, at each level.
+    """
+    yield f". ({size_converter(tree.size)})\n"
+    # Each frame holds the remaining entries of a folder, how many are left and the indentation of its entries
+    stack = [[chain(tree.folders.items(), tree.files), len(tree.folders) + len(tree.files), ""]]
+    while stack:
+        frame = stack[-1]
+        if (entry := next(frame[0], None)) is None:
+            stack.pop()
+            continue
+        frame[1] -= 1
+        is_last = frame[1] == 0
+        indent = frame[2]
+        branch = "└── " if is_last else "├── "
+        name, value = entry
+        if isinstance(value, Folder):
+            yield f"{indent}{branch}{name} ({value.size} bytes)\n"
+            stack.append([chain(value.folders.items(), value.files), len(value.folders) + len(value.files),
+                          indent + ("    " if is_last else "│   ")])
+        else:
+            yield f"{indent}{branch}{name} ({size_converter(value)})\n"
 
-    # Step 2: Recursive printer
-    def generate_folder_structure(structure: Dict[str, dict], indent: str = "") -> (str, int):
-        result = ""
-        total_size = 0
 
-        # Separate folders and files
-        folders = [(k, v) for k, v in structure.items() if k != "__files__"]
-        files = structure.get("__files__", [])
+def convert_to_folder_structure(sequence: Dict[str, int]) -> str:
+    """Convert objects in an S3 bucket into a folder-like representation including sizes.
 
-        entries = folders + [("__file__", f) for f in files]
+    Args:
+        sequence: A dictionary where keys are S3 object keys (paths) and values are their sizes in bytes.
 
-        for i, (key, value) in enumerate(entries):
-            is_last = i == len(entries) - 1
+    Returns:
+        str:
+        A string representing the folder structure of the S3 bucket, with each file and folder showing the size.
+    """
+    return "".join(iter_folder_structure(build_tree(sequence.items())))
 
-            branch = "└── " if is_last else "├── "
-            sub_indent = indent + ("    " if is_last else "│   ")
 
-            if key == "__file__":
-                filename, size = value
-                result += f"{indent}{branch}{filename} ({size_converter(size)})\n"
-                total_size += size
-            else:
-                # Folder
-                sub_result, sub_size = generate_folder_structure(value, sub_indent)
-                result += f"{indent}{branch}{key} ({sub_size} bytes)\n"
-                result += sub_result
-                total_size += sub_size
+def _members(folder: Folder, convert: Callable[[int], Any]) -> Generator[Tuple[str, Any]]:
+    """Yields the members of a folder in the JSON representation, the files, the sub-folders and then the size.
 
-        return result, total_size
+    See Also:
+        - A sub-folder named ``files`` or ``size`` collides with the member of that name. Each name is yielded once,
+          the same as the dictionary structure, where the later member replaces the earlier one in its place.
+    """
+    files = None
+    if folder.files:
+        files = [dict(name=name, size=convert(size)) for name, size in sorted(folder.files, key=lambda file: file[0])]
+    if "files" in folder.folders or "size" in folder.folders:
+        members = {} if files is None else dict(files=files)
+        members.update(folder.folders)
+        members["size"] = convert(folder.size)
+        yield from members.items()
+        return
+    if files is not None:
+        yield "files", files
+    yield from folder.folders.items()
+    yield "size", convert(folder.size)
+
+
+def iter_bucket_json(tree: Folder, convert_size: bool = False, indent: int = 2) -> Generator[str]:
+    """Serializes the folder tree as JSON chunk by chunk, in the same layout as ``json.dump`` with the indent.
 
-    final_output_, total_size_ = generate_folder_structure(folder_structure)
-    return f". ({size_converter(total_size_)})\n" + final_output_
+    Args:
+        tree: Root folder from ``build_tree``.
+        convert_size: A boolean indicating whether to convert sizes to human-readable format.
+        indent: Number of spaces to indent each level with.
+
+    Yields:
+        str:
+        Yields the JSON a member at a time. Only the members of the folders being walked are held in memory.
+    """
+    convert = size_converter if convert_size else int
+    yield "{"
+    # Each frame holds the remaining members of a folder and whether one has been written yet
+    stack = [[_members(tree, convert), False]]
+    while stack:
+        frame = stack[-1]
+        depth = len(stack)
+        if (member := next(frame[0], None)) is None:
+            stack.pop()
+            yield "\n" + " " * indent * (depth - 1) + "}"
+            continue
+        padding = "\n" + " " * indent * depth
+        separator = "," if frame[1] else ""
+        frame[1] = True
+        name, value = member
+        if isinstance(value, Folder):
+            yield f"{separator}{padding}{json.dumps(name)}: {{"
+            stack.append([_members(value, convert), False])
+        elif isinstance(value, list):
+            inner = padding + " " * indent
+            field = inner + " " * indent
+            files = ",".join(
+                f"{inner}{{{field}\"name\": {json.dumps(file['name'])},{field}\"size\": {json.dumps(file['size'])}"
+                f"{inner}}}" for file in value
+            )
+            yield f"{separator}{padding}{json.dumps(name)}: [{files}{padding}]"
+        else:
+            yield f"{separator}{padding}{json.dumps(name)}: {json.dumps(value)}"
 
 
 def format_bucket_structure(bucket_structure: Dict[str, int], convert_size: bool) -> Dict[str, Any]:
@@ -117,84 +210,29 @@ def format_bucket_structure(bucket_structure: Dict[str, int], convert_size: bool
         Dict[str, Any]:
         A dictionary representing the folder structure of the S3 bucket, with each file and folder showing the size.
     """
-    tree = {}
-    # Iterate over key + size
-    for key, size in bucket_structure.items():
-        parts = key.strip("/").split("/")
-        current = tree
-
-        for part in parts[:-1]:
-            current = current.setdefault(part, {})
-
-        # Add file with size
-        current.setdefault("__files__", []).append({
-            "name": parts[-1],
-            "size": size
-        })
-
-    def clean(node: Dict[str, Any]) -> Dict[str, Any]:
-        """Recursively clean the tree structure and calculate folder sizes.
-
-        Args:
-            node: Each node in the tree structure.
-
-        Returns:
-            Dict[str, Any]:
-            Cleaned node with separate "files" key for files and other keys for folders.
-        """
-        result = {}
-        total_size = 0
-
-        # Process files
-        files = node.get("__files__", [])
-        if files:
-            result["files"] = sorted(files, key=lambda x: x["name"])
-            total_size += sum(file_["size"] for file_ in files)
-
-        # Process subfolders
-        for k, v in node.items():
-            if k == "__files__":
-                continue
-            cleaned_subfolder = clean(v)
-            result[k] = cleaned_subfolder
-            total_size += cleaned_subfolder.get("size", 0)
-
-        # Add folder size
-        result["size"] = total_size
-
-        return result
-
-    def size_it(node: Dict[str, Any]) -> Dict[str, Any]:
-        """Recursively convert sizes in the tree structure to human-readable format.
-
-        Args:
-            node: Each node in the tree structure.
-
-        Returns:
-            Dict[str, Any]:
-            Node with sizes converted to human-readable format.
-        """
-        if "size" in node:
-            node["size"] = size_converter(node["size"])
-        for k, v in node.items():
-            if isinstance(v, dict):
-                size_it(v)
-            elif isinstance(v, list):
-                for item in v:
-                    if isinstance(item, dict) and "size" in item:
-                        item["size"] = size_converter(item["size"])
-        return node
-
-    json_structure = clean(tree)
-    return size_it(json_structure) if convert_size else json_structure
+    convert = size_converter if convert_size else int
+    result = {}
+    stack = [(build_tree(bucket_structure.items()), result)]
+    while stack:
+        folder, node = stack.pop()
+        # Sub-folders are inserted before they are filled, so the members keep the order of the JSON
+        for name, value in _members(folder, convert):
+            if isinstance(value, Folder):
+                node[name] = {}
+                stack.append((value, node[name]))
+            else:
+                node[name] = value
+    return result
 
 
 
 @dataclass
 class S3Object:
-    """Represents an S3 object with its key and size."""
+    """Represents an S3 object with its key, size and the metadata to detect changes."""
     key: str
     size: int
+    etag: Optional[str] = None
+    last_modified: Optional[float] = None
 
 
 class DownloadResults(dict):
@@ -207,6 +245,14 @@ class DownloadResults(dict):
     success: int = 0
     failed: int = 0
     skipped: int = 0
+    deduplicated: int = 0
+    recovered: int = 0
+    concurrency: int = 0
+
+    def counts(self) -> Dict[str, int]:
+        """Returns the number of successful, failed, skipped, deduplicated and recovered downloads."""
+        return dict(success=self.success, failed=self.failed, skipped=self.skipped, deduplicated=self.deduplicated,
+                    recovered=self.recovered)
 
 
 class Sort(Enum):
@@ -0,0 +1,46 @@
+"""Helpers shared by the tests, to run the downloader against the local fake S3 of the benchmarks.
+
+>>> downloader
+
+"""
+
+import os
+
+from benchmarks.common import LocalDownloader, quiet_logger
+from benchmarks.fake_s3 import FakeS3, body
+
+BUCKET = "test-bucket"
+MB = 1024 * 1024
+
+
+def populate(server: FakeS3) -> None:
+    """Fills the bucket with small objects across a few prefixes, and a couple of objects spanning several ranges."""
+    bucket = server.bucket(BUCKET)
+    for index in range(60):
+        bucket.put(f"prefix-{index % 3}/object-{index:03d}.bin", 1024 * (index % 7))
+    bucket.put("large/first.bin", 5 * MB + 123)
+    bucket.put("large/second.bin", 3 * MB)
+
+
+def downloader(server: FakeS3, directory: str, **kwargs) -> LocalDownloader:
+    """Creates a headless downloader that logs nothing."""
+    kwargs.setdefault("logger", quiet_logger("tests"))
+    return LocalDownloader(BUCKET, server.endpoint_url, download_dir=directory, headless=True, **kwargs)
+
+
+def assert_downloaded(server: FakeS3, directory: str, keys: set = None) -> None:
+    """Checks that the objects are on disk with their exact bytes, and no partial download is left.
+
+    Args:
+        server: Fake S3 the objects were downloaded from.
+        directory: Download directory.
+        keys: Keys to check, defaults to every object in the bucket.
+    """
+    objects = server.bucket(BUCKET).objects
+    for key in objects if keys is None else keys:
+        obj = objects[key]
+        with open(os.path.join(directory, key), "rb") as file:
+            assert file.read() == body(obj, 0, obj.size - 1), key
+    leftovers = [name for _, _, files in os.walk(directory) for name in files
+                 if name.endswith((".part", ".part.json", ".s3tmp"))]
+    assert not leftovers
@@ -0,0 +1,16 @@
+"""Fixtures shared by the tests."""
+
+from collections.abc import Generator
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from tests.common import populate
+
+
+@pytest.fixture
+def server() -> Generator[FakeS3]:
+    """Starts a fake S3 with the test bucket."""
+    with FakeS3() as fake:
+        populate(fake)
+        yield fake
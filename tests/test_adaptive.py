@@ -0,0 +1,15 @@
+"""Tests for the adaptive concurrency, against the fake S3 of the benchmarks."""
+
+from benchmarks.fake_s3 import FakeS3
+from tests.common import assert_downloaded, downloader, populate
+
+
+def test_adaptive(tmp_path):
+    """Downloads with adaptive concurrency while the server throttles some of the requests."""
+    with FakeS3(throttle_rate=0.05, seed=1) as throttling:
+        populate(throttling)
+        dl = downloader(throttling, str(tmp_path))
+        dl.run_in_parallel(threads=4, adaptive=True, max_threads=16)
+        assert dl.results.failed == 0
+        assert 1 <= dl.results.concurrency <= 16
+        assert_downloaded(throttling, str(tmp_path))
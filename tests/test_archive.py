@@ -0,0 +1,89 @@
+"""Tests for the rolling tar archives and their index."""
+
+import os
+import tarfile
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3, body
+from s3.archive import ArchiveReader, ArchiveWriter
+from s3.squire import S3Object
+from tests.common import BUCKET, MB, downloader
+
+
+def chunked(data: bytes, size: int = 100):
+    """Splits the data into chunks, the same as a response body."""
+    for index in range(0, len(data), size):
+        yield data[index:index + size]
+
+
+def test_write_and_read(tmp_path):
+    """Archives buffered and spooled objects, rolls over at the maximum size and reads them back by key."""
+    contents = {f"dir/{index}.bin": os.urandom(size) for index, size in enumerate((10, 700, 3000, 0, 2500))}
+    received = []
+    with ArchiveWriter(str(tmp_path), max_size=4096, buffer_size=1024) as writer:
+        for key, data in contents.items():
+            writer.add(S3Object(key=key, size=len(data)), chunked(data), len(data), callback=received.append)
+    assert sum(received) == sum(map(len, contents.values()))
+    reader = ArchiveReader(str(tmp_path))
+    assert len(reader.archives()) > 1
+    for key, data in contents.items():
+        assert reader.read(key) == data
+    with pytest.raises(KeyError):
+        reader.read("missing")
+    for archive in reader.archives():
+        with tarfile.open(tmp_path / archive) as tar:
+            for member in tar.getmembers():
+                assert tar.extractfile(member).read() == contents[member.name]
+    reader.close()
+
+
+def test_spools_outside_the_lock(tmp_path):
+    """Streams a large body without holding the lock, so the other writers are not blocked by the network."""
+    with ArchiveWriter(str(tmp_path), buffer_size=10) as writer:
+
+        def body_stream():
+            """Checks the lock is free between the chunks."""
+            for chunk in chunked(b"x" * 1000):
+                assert writer.lock.acquire(blocking=False)
+                writer.lock.release()
+                yield chunk
+
+        writer.add(S3Object(key="large", size=1000), body_stream(), 1000)
+    assert ArchiveReader(str(tmp_path)).read("large") == b"x" * 1000
+
+
+def test_short_body_is_not_archived(tmp_path):
+    """Leaves out a body shorter than its length, keeping the archive readable."""
+    with ArchiveWriter(str(tmp_path), buffer_size=10) as writer:
+        writer.add(S3Object(key="first", size=5), [b"12345"], 5)
+        for size in (5, 50):
+            with pytest.raises(ValueError):
+                writer.add(S3Object(key=f"short-{size}", size=size + 1), [b"x" * size], size + 1)
+        writer.add(S3Object(key="last", size=50), chunked(b"y" * 50, 7), 50)
+    reader = ArchiveReader(str(tmp_path))
+    assert [key for key, _, _ in reader.members()] == ["first", "last"]
+    assert reader.read("last") == b"y" * 50
+    with tarfile.open(tmp_path / "archive-00000.tar") as tar:
+        assert tar.getnames() == ["first", "last"]
+
+
+@pytest.mark.parametrize("run_async", [False, True])
+def test_archive_download(server: FakeS3, tmp_path, run_async: bool):
+    """Archives the bucket with the large objects spooled, then skips every archived object on a rerun."""
+    objects = server.bucket(BUCKET).objects
+    first = downloader(server, str(tmp_path), archive=True)
+    first.archive.buffer_size = MB
+    if run_async:
+        first.run_async(max_in_flight=8)
+    else:
+        first.run_in_parallel(threads=4)
+    assert first.results.success == len(objects) and first.results.failed == 0
+    reader = ArchiveReader(str(tmp_path))
+    for key, obj in objects.items():
+        assert reader.read(key) == body(obj, 0, obj.size - 1)
+    reader.close()
+
+    second = downloader(server, str(tmp_path), archive=True)
+    second.run_in_parallel(threads=4)
+    assert second.results.skipped == len(objects)
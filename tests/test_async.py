@@ -0,0 +1,87 @@
+"""Tests for the asyncio engine and its HTTP client, against the fake S3 of the benchmarks."""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from s3.aio import ConnectionPool, FileSink, fetch
+from s3.exceptions import DownloadFailed
+from tests.common import BUCKET, assert_downloaded, downloader
+
+
+def test_async(server: FakeS3, tmp_path):
+    """Downloads on the event loop, then counts every object once as skipped on a rerun."""
+    count = len(server.bucket(BUCKET).objects)
+    first = downloader(server, str(tmp_path))
+    first.run_async(max_in_flight=16)
+    assert first.results.success == count
+    assert first.results.failed == first.results.skipped == 0
+    assert_downloaded(server, str(tmp_path))
+
+    second = downloader(server, str(tmp_path))
+    second.run_async(max_in_flight=16)
+    assert second.results.skipped == count
+    assert second.results.success == 0
+    assert not second.progress.active
+    assert second.progress.settled + second.progress.total == second.progress.expected
+
+
+async def serve(response: bytes) -> asyncio.AbstractServer:
+    """Starts a server that sends a raw response to every request and closes the connection."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Reads the request head and sends the response."""
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(response)
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_read_until_eof():
+    """Reads a response without a length or chunked encoding until the server closes the connection."""
+    payload = os.urandom(1024 * 600)
+
+    async def main() -> bytes:
+        """Fetches the payload from the raw server."""
+        server = await serve(b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n" + payload)
+        received = bytearray()
+
+        async def sink(chunk: bytes) -> None:
+            """Collects the body."""
+            received.extend(chunk)
+
+        pool = ConnectionPool(limit=1, timeout=5)
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            await fetch(pool, f"http://127.0.0.1:{port}/object", sink, attempts=1)
+        pool.close()
+        assert not pool.idle.get(("http", "127.0.0.1", port))
+        return bytes(received)
+
+    assert asyncio.run(main()) == payload
+
+
+def test_file_sink_keeps_target_on_failure(tmp_path):
+    """Leaves the existing target in place, and no temporary file, when the download fails."""
+    target = tmp_path / "object.bin"
+    target.write_bytes(b"previous")
+
+    async def main() -> None:
+        """Fails a download after the first chunk was written to the sink."""
+        server = await serve(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n" + b"x" * 10)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            sink = FileSink(str(target), asyncio.get_running_loop(), executor, callback=lambda _: None, buffer_size=1)
+            async with server:
+                port = server.sockets[0].getsockname()[1]
+                with pytest.raises(DownloadFailed):
+                    await fetch(ConnectionPool(limit=1, timeout=5), f"http://127.0.0.1:{port}/object", sink,
+                                attempts=1, reset=sink.reset)
+            sink.abort()
+
+    asyncio.run(main())
+    assert target.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["object.bin"]
@@ -0,0 +1,65 @@
+"""Tests for the catalog of the listed objects and its external merge sort."""
+
+import os
+import random
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from s3.catalog import Catalog, sort_key
+from s3.squire import S3Object, Sort
+from tests.common import assert_downloaded, downloader
+
+
+def objects(count: int) -> list:
+    """Creates objects with shuffled keys, sizes and mtimes, some without an ETag."""
+    generator = random.Random(0)
+    return [S3Object(key=f"key-{generator.random():.12f}-é", size=generator.randrange(1 << 40),
+                     etag=None if index % 5 == 0 else f"{index:032x}", last_modified=generator.uniform(1, 2e9))
+            for index in range(count)]
+
+
+@pytest.mark.parametrize("sort", list(Sort))
+def test_spill_and_merge(sort: Sort):
+    """Spills sorted runs above the memory budget and merges them back in the order of the sorting option."""
+    listed = objects(2000)
+    with Catalog(sort=sort, memory_budget=16 * 1024) as catalog:
+        catalog.extend(listed)
+        assert len(catalog.runs) > 1
+        assert len(catalog) == len(listed)
+        assert catalog.total_size == sum(obj.size for obj in listed)
+        merged = list(catalog)
+        directory = catalog.directory
+    key_func, reverse = sort_key(sort)
+    assert merged == (listed if key_func is None else sorted(listed, key=key_func, reverse=reverse))
+    assert not os.path.exists(directory)
+
+
+def test_in_memory():
+    """Keeps the objects in memory below the budget, without writing any run."""
+    listed = objects(100)
+    with Catalog(sort=Sort.size) as catalog:
+        catalog.extend(listed)
+        assert not catalog.runs and catalog.directory is None
+        assert list(catalog) == sorted(listed, key=lambda obj: obj.size)
+
+
+def test_runs_are_removed(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Removes the runs spilled while listing as soon as the downloads are complete, before the summary."""
+    directories = []
+    spill = Catalog.spill
+
+    def recorded(self: Catalog) -> None:
+        """Records the directory of the runs."""
+        spill(self)
+        directories.append(self.directory)
+
+    monkeypatch.setattr(Catalog, "spill", recorded)
+    dl = downloader(server, str(tmp_path), sort=Sort.size, memory_budget=1024)
+    leftovers = []
+    exit_ = dl.exit
+    monkeypatch.setattr(dl, "exit", lambda: leftovers.extend(filter(os.path.exists, directories)) or exit_())
+    dl.run_in_parallel(threads=4)
+    assert dl.results.failed == 0
+    assert_downloaded(server, str(tmp_path))
+    assert directories and not leftovers
@@ -0,0 +1,14 @@
+"""Tests for the options of the command-line interface."""
+
+from click.testing import CliRunner
+
+from s3 import _cli
+
+
+def test_log_type():
+    """Describes the log types and rejects anything else."""
+    runner = CliRunner()
+    assert "-l, --log [file|stdout]         Where to write the logs" in runner.invoke(_cli, ["--help"]).output
+    result = runner.invoke(_cli, ["--bucket", "bucket", "--log", "4"])
+    assert result.exit_code == 2
+    assert "'4' is not one of 'file', 'stdout'" in result.output
@@ -0,0 +1,109 @@
+"""Tests for downloading the duplicate objects once and materializing their copies."""
+
+import errno
+import os
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from s3 import dedup
+from s3.dedup import Deduplicator
+from s3.squire import S3Object
+from tests.common import BUCKET, assert_downloaded, downloader
+
+
+def failing(code: int):
+    """Returns a method that fails with the given error number."""
+    def method(source: str, target: str) -> None:
+        """Fails without creating the target."""
+        raise OSError(code, os.strerror(code))
+    return method
+
+
+def test_split():
+    """Downloads the first object of each ETag and size, and never groups the objects without an ETag."""
+    deduplicator = Deduplicator()
+    objects = [S3Object(key="a", size=1, etag="x"), S3Object(key="b", size=1, etag="x"),
+               S3Object(key="c", size=2, etag="x"), S3Object(key="d", size=1), S3Object(key="e", size=1),
+               S3Object(key="f/", size=0, etag="y"), S3Object(key="g/", size=0, etag="y")]
+    assert [obj.key for obj in deduplicator.split(objects)] == ["a", "c", "d", "e", "f/", "g/"]
+    assert [(obj.key, primary) for obj, primary in deduplicator.pending()] == [("b", "a")]
+    assert not list(deduplicator.pending())
+
+
+def test_unknown_method():
+    """Rejects the methods that don't exist."""
+    with pytest.raises(ValueError):
+        Deduplicator(methods=("reflink", "symlink"))
+
+
+def test_falls_back_and_remembers_unsupported(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Falls back to the next method, and doesn't try a method the filesystem doesn't support again."""
+    calls = []
+    monkeypatch.setitem(dedup.METHODS, "reflink",
+                        lambda source, target: calls.append(target) or failing(errno.EOPNOTSUPP)(source, target))
+    source = tmp_path / "source"
+    source.write_bytes(b"data")
+    deduplicator = Deduplicator()
+    for name in ("first", "second"):
+        # An outdated file is replaced, even with a hardlink
+        (tmp_path / name).write_bytes(b"old")
+        assert deduplicator.materialize(str(source), str(tmp_path / name)) == "hardlink"
+        assert (tmp_path / name).read_bytes() == b"data"
+    assert len(calls) == 1
+    assert deduplicator.unsupported == {"reflink"}
+    assert deduplicator.usage == dict(reflink=0, hardlink=2, copy=0) and deduplicator.saved == 8
+
+
+def test_file_errors_are_not_unsupported(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Keeps a method whose failure is specific to the file, and raises the last error when every method fails."""
+    monkeypatch.setitem(dedup.METHODS, "hardlink", failing(errno.EMLINK))
+    monkeypatch.setitem(dedup.METHODS, "copy", failing(errno.ENOSPC))
+    deduplicator = Deduplicator(methods=("hardlink", "copy"))
+    with pytest.raises(OSError) as error:
+        deduplicator.materialize(str(tmp_path / "source"), str(tmp_path / "target"))
+    assert error.value.errno == errno.ENOSPC
+    assert not deduplicator.unsupported
+    assert os.listdir(tmp_path) == []
+
+
+def test_dedup_download(tmp_path):
+    """Downloads each distinct object once and materializes the copies with their bytes."""
+    with FakeS3() as server:
+        bucket = server.bucket(BUCKET)
+        bucket.put("original/a.bin", 4096)
+        bucket.put("original/b.bin", 1024)
+        for index in range(3):
+            bucket.copy("original/a.bin", f"copies/a-{index}.bin")
+        bucket.copy("original/b.bin", "copies/b.bin")
+        dl = downloader(server, str(tmp_path), dedup=True)
+        dl.run_in_parallel(threads=4)
+        assert dl.results.failed == 0
+        assert dl.results.success == 2
+        assert dl.results.deduplicated == sum(dl.dedup.usage.values()) == 4
+        assert dl.dedup.saved == 3 * 4096 + 1024
+        assert_downloaded(server, str(tmp_path))
+
+
+def test_duplicate_of_failed_download(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Downloads a duplicate on its own when the object it duplicates failed to download."""
+    with FakeS3() as server:
+        bucket = server.bucket(BUCKET)
+        # The first object listed is downloaded, the other one is its duplicate
+        bucket.put("first.bin", 2048)
+        bucket.copy("first.bin", "second.bin")
+        dl = downloader(server, str(tmp_path / "objects"), dedup=True, tail_retries=0,
+                        failure_manifest=str(tmp_path / "failures.json"))
+        download = dl.downloader
+
+        def failing_first(s3_object: S3Object, **kwargs) -> bool:
+            """Fails the download of the first object."""
+            if s3_object.key == "first.bin":
+                raise ConnectionError("Failed")
+            return download(s3_object=s3_object, **kwargs)
+
+        monkeypatch.setattr(dl, "downloader", failing_first)
+        dl.run_in_parallel(threads=2)
+        assert dl.results.failed == 1 and dl.results.success == 1
+        assert dl.results.deduplicated == 0
+        assert_downloaded(server, str(tmp_path / "objects"), keys={"second.bin"})
@@ -0,0 +1,80 @@
+"""Tests for the failure queue, the retries at the end of a run and the failure manifest."""
+
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmarks.fake_s3 import FakeS3
+from s3.failures import classify, read_failures
+from tests.common import BUCKET, assert_downloaded, downloader
+
+FIRST = "large/first.bin"
+SECOND = "large/second.bin"
+
+
+def failing(dl, errors: dict):
+    """Replaces the downloader of an instance, to raise the queued errors of a key before downloading it."""
+    original = dl.downloader
+
+    def download(s3_object, callback):
+        """Raises the next error queued for the object, if any."""
+        if errors.get(s3_object.key):
+            raise errors[s3_object.key].pop(0)
+        return original(s3_object=s3_object, callback=callback)
+
+    dl.downloader = download
+
+
+def test_classify():
+    """Only the errors that can succeed on a retry are transient."""
+    missing = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+    throttled = ClientError({"Error": {"Code": "SlowDown"}}, "GetObject")
+    assert classify(missing) == ("ClientError(NoSuchKey)", False)
+    assert classify(throttled) == ("ClientError(SlowDown)", True)
+    assert classify(ConnectionError()) == ("ConnectionError", True)
+
+
+def test_tail_retries_recover(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Recovers a transient failure at the end of the run, without writing a failure manifest."""
+    monkeypatch.setattr("s3.dumper.random.uniform", lambda low, high: 0)
+    manifest = tmp_path / "failures.json"
+    dl = downloader(server, str(tmp_path / "objects"), failure_manifest=str(manifest), tail_retries=2)
+    failing(dl, {FIRST: [ConnectionError("reset")]})
+    dl.run()
+    assert dl.results.recovered == 1 and dl.results.failed == 0
+    assert not manifest.exists()
+    assert_downloaded(server, str(tmp_path / "objects"))
+
+
+def test_retry_failed(server: FakeS3, tmp_path):
+    """Writes the failures that outlast the retries to the manifest, and downloads exactly those from it."""
+    manifest = tmp_path / "failures.json"
+    dl = downloader(server, str(tmp_path / "objects"), failure_manifest=str(manifest), tail_retries=0)
+    failing(dl, {FIRST: [ConnectionError("reset")]})
+    dl.run()
+    assert dl.results.failed == 1
+    assert [failure.s3_object.key for failure in read_failures(str(manifest), bucket_name=BUCKET)] == [FIRST]
+    assert json.loads(manifest.read_text())["failures"][0]["error"] == "ConnectionError"
+    other = tmp_path / "other.json"
+    other.write_text(json.dumps(dict(json.loads(manifest.read_text()), bucket="other-bucket")))
+    with pytest.raises(ValueError):
+        downloader(server, str(tmp_path / "retried")).retry_failed(str(other))
+
+    retried = downloader(server, str(tmp_path / "retried"))
+    retried.retry_failed(str(manifest))
+    assert retried.results.success == 1 and retried.results.failed == 0
+    assert not manifest.exists()
+    assert_downloaded(server, str(tmp_path / "retried"), keys={FIRST})
+    assert [path.name for path in (tmp_path / "retried" / "large").iterdir()] == ["first.bin"]
+
+
+def test_interrupted_run_skips_retries(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Writes the failures straight to the manifest when the user interrupts the run, without retrying them."""
+    manifest = tmp_path / "failures.json"
+    dl = downloader(server, str(tmp_path / "objects"), failure_manifest=str(manifest), tail_retries=5)
+    monkeypatch.setattr(dl, "retry_failures", lambda: pytest.fail("retried after an interrupt"))
+    failing(dl, {FIRST: [ConnectionError("reset")], SECOND: [KeyboardInterrupt()]})
+    dl.run()
+    assert dl.interrupted
+    assert [failure.s3_object.key for failure in read_failures(str(manifest), bucket_name=BUCKET)] == [FIRST]
@@ -0,0 +1,85 @@
+"""Tests for the key, size and modified time filters."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from s3.filters import ObjectFilter, compile_patterns, parse_size, parse_time
+from tests.common import BUCKET, downloader
+
+EPOCH = datetime.fromtimestamp(0, tz=timezone.utc)
+
+
+def entry(key: str, size: int = 0, modified: datetime = None) -> dict:
+    """Creates an entry of a listing page."""
+    content = dict(Key=key, Size=size)
+    if modified is not None:
+        content["LastModified"] = modified
+    return content
+
+
+def test_parse_size():
+    """Parses the sizes with the 1024 base, and rejects anything else."""
+    assert parse_size(None) is None and parse_size(0) == 0
+    assert parse_size("10") == 10
+    assert parse_size("1.5 kb") == 1536
+    assert parse_size("2GB") == 2 * 1024 ** 3
+    with pytest.raises(ValueError):
+        parse_size("ten MB")
+
+
+def test_parse_time():
+    """Takes the times without an offset as UTC."""
+    assert parse_time(0) == EPOCH
+    assert parse_time("1970-01-01T00:00:00Z") == EPOCH
+    assert parse_time("1970-01-01T01:00:00+01:00") == EPOCH
+    assert parse_time(datetime(1970, 1, 1)) == EPOCH
+    with pytest.raises(ValueError):
+        parse_time("yesterday")
+
+
+def test_patterns():
+    """Matches the globs against the whole key and searches the regular expressions, each with its own flags."""
+    match = compile_patterns(["*.json", "logs/*", "re:(?i)report-\\d+", "re:^raw/"])
+    assert match("a/b.json") and match("logs/2024/a.txt") and match("x/REPORT-42.csv") and match("raw/data")
+    assert not match("a.json.gz") and not match("x/logs/a.txt") and not match("x/raw/data")
+    assert compile_patterns([]) is None
+    assert compile_patterns(["re:(?i)^A"])("abc")
+
+
+def test_epoch_bounds():
+    """Treats the epoch as a bound, not as an unset filter."""
+    since = ObjectFilter(modified_since=0)
+    assert since
+    assert since.accepts(entry("a", modified=EPOCH))
+    assert not since.accepts(entry("a"))
+    before = ObjectFilter(modified_before=0)
+    assert not before.accepts(entry("a", modified=EPOCH))
+    assert before.accepts(entry("a", modified=EPOCH - timedelta(seconds=1)))
+    with pytest.raises(ValueError):
+        ObjectFilter(modified_since=0, modified_before=0)
+
+
+def test_select():
+    """Applies the sizes, the window and the patterns together, with the exclusions taking precedence."""
+    now = datetime.now(tz=timezone.utc)
+    object_filter = ObjectFilter(include=["data/*"], exclude=["re:\\.tmp$"], min_size="1KB", max_size=2048,
+                                 modified_since=now - timedelta(days=1))
+    contents = [entry("data/a", 1024, now), entry("data/b", 1023, now), entry("data/c", 2049, now),
+                entry("data/d.tmp", 1024, now), entry("other/e", 1024, now),
+                entry("data/f", 1024, now - timedelta(days=2))]
+    assert [content["Key"] for content in object_filter.select(contents)] == ["data/a"]
+    assert not ObjectFilter()
+    with pytest.raises(ValueError):
+        ObjectFilter(min_size=2, max_size=1)
+
+
+def test_filtered_download(server: FakeS3, tmp_path):
+    """Downloads only the objects that pass the filters, and counts the ones left out."""
+    dl = downloader(server, str(tmp_path), include=["prefix-1/*"], min_size=1)
+    dl.run_in_parallel(threads=4)
+    expected = {key for key, obj in server.bucket(BUCKET).objects.items() if key.startswith("prefix-1/") and obj.size}
+    downloaded = {str(path.relative_to(tmp_path)) for path in tmp_path.rglob("*") if path.is_file()}
+    assert downloaded == expected
+    assert dl.results.success == len(expected)
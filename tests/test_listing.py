@@ -0,0 +1,48 @@
+"""Tests for the listing engine, against the fake S3 of the benchmarks."""
+
+from collections import Counter
+
+import pytest
+
+from benchmarks.common import client, quiet_logger
+from benchmarks.fake_s3 import FakeS3
+from s3.listing import Lister, split_key_range
+from tests.common import BUCKET
+
+
+def lister(server: FakeS3, **kwargs) -> Lister:
+    """Creates a lister for the test bucket."""
+    return Lister(client(server.endpoint_url), BUCKET, quiet_logger("tests"), **kwargs)
+
+
+def test_split_key_range_is_contiguous():
+    """The ranges start after the end of the previous one and cover the whole prefix."""
+    ranges = split_key_range("data/", 8)
+    assert len(ranges) == 8
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    for (_, end_at), (start_after, _) in zip(ranges, ranges[1:]):
+        assert end_at == start_after and end_at.startswith("data/")
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_nested_prefixes(server: FakeS3, workers: int):
+    """Every key under the requested prefixes is listed exactly once, with or without the delimiter walk."""
+    listed = Counter(obj.key for obj in lister(server, workers=workers, depth=2, key_splits=3).iter_objects([""]))
+    assert listed == Counter(list(server.bucket(BUCKET).objects))
+
+
+def test_flat_prefix_is_split(monkeypatch: pytest.MonkeyPatch):
+    """A prefix without common prefixes is split into key ranges after its first page, instead of paged on one."""
+    with FakeS3() as server:
+        bucket = server.bucket(BUCKET)
+        for index in range(2500):
+            bucket.put(f"flat/{index:05x}", 1)
+        engine = lister(server, workers=4, depth=1)
+        shards = []
+        list_shard = engine.list_shard
+        monkeypatch.setattr(engine, "list_shard", lambda shard: shards.append(shard) or list_shard(shard))
+        listed = Counter(obj.key for obj in engine.iter_objects(["flat/"]))
+    assert listed == Counter(list(bucket.objects))
+    assert len(shards) > 1
+    # The keys of the first page are not listed again
+    assert all(shard.start_after and shard.start_after >= "flat/003e7" for shard in shards)
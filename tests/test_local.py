@@ -0,0 +1,54 @@
+"""Tests for the index of the local download directory."""
+
+import os
+
+from s3.local import LocalIndex
+from s3.squire import S3Object
+
+
+def test_build(tmp_path):
+    """Indexes the files with their size and mtime and the directories at every depth, without following links."""
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "file.bin").write_bytes(b"x" * 10)
+    (tmp_path / "top.bin").write_bytes(b"")
+    os.symlink(tmp_path / "a", tmp_path / "link")
+    index = LocalIndex(str(tmp_path)).build()
+    assert index.directories == {"", "a", "a/b"}
+    assert index.lookup("a/b/file.bin") == (10, os.path.getmtime(tmp_path / "a" / "b" / "file.bin"))
+    assert index.lookup("top.bin")[0] == 0
+    assert index.lookup("link/b/file.bin") is None
+    assert index.is_current(S3Object(key="a/b/file.bin", size=10))
+    assert not index.is_current(S3Object(key="a/b/file.bin", size=11))
+    assert not index.is_current(S3Object(key="missing.bin", size=0))
+
+
+def test_build_directories_only(tmp_path):
+    """Records the directories without a stat for each file, and builds nothing for a missing root."""
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "file.bin").write_bytes(b"x")
+    index = LocalIndex(str(tmp_path)).build(stat_files=False)
+    assert index.directories == {"", "a"} and not index.files
+    assert LocalIndex(str(tmp_path / "missing")).build().files == {}
+
+
+def test_is_current_without_index(tmp_path):
+    """Falls back to a stat call for each object when the index hasn't been built."""
+    (tmp_path / "file.bin").write_bytes(b"x" * 3)
+    index = LocalIndex(str(tmp_path))
+    assert index.is_current(S3Object(key="file.bin", size=3))
+    assert not index.is_current(S3Object(key="file.bin", size=4))
+
+
+def test_make_directories(tmp_path):
+    """Creates the missing directories parents first, once each, and skips the known ones."""
+    (tmp_path / "existing").mkdir()
+    index = LocalIndex(str(tmp_path)).build()
+    index.plan_directories([S3Object(key=key, size=0) for key in ("x/y/z/1.bin", "x/y/2.bin", "existing/3.bin",
+                                                                    "top.bin")])
+    assert index.pending == {"x", "x/y", "x/y/z"}
+    assert index.make_directories() == 3
+    assert (tmp_path / "x" / "y" / "z").is_dir()
+    index.plan_directories([S3Object(key="x/y/z/4.bin", size=0)])
+    assert not index.pending
+    index.ensure_directory("other/deep")
+    assert (tmp_path / "other" / "deep").is_dir() and "other/deep" in index.directories
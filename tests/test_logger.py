@@ -0,0 +1,104 @@
+"""Tests for the batched log handler and the formatters."""
+
+import io
+import json
+import logging
+import sys
+import threading
+
+from s3.logger import BatchedQueueHandler, CachedTimeFormatter, JsonFormatter, LogType, default_logger
+
+
+def batched(stream: io.StringIO, batch_size: int = 1000, level: int = logging.DEBUG) -> logging.Logger:
+    """Creates a logger that writes the messages to a stream through a batched handler."""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(threadName)s %(message)s"))
+    handler.setLevel(level)
+    logger = logging.getLogger(f"tests.batched.{id(stream)}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(BatchedQueueHandler(handler, batch_size=batch_size))
+    return logger
+
+
+def test_records_from_threads():
+    """Writes every record from every thread once, in the order each thread logged them."""
+    stream = io.StringIO()
+    logger = batched(stream, batch_size=7)
+
+    def log() -> None:
+        """Logs a numbered sequence of messages."""
+        for index in range(500):
+            logger.info("%d", index)
+
+    threads = [threading.Thread(target=log, name=f"writer-{number}") for number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    handler = logger.handlers[0]
+    handler.flush()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2000
+    for number in range(4):
+        assert [int(line.split()[1]) for line in lines if line.startswith(f"writer-{number} ")] == list(range(500))
+    handler.close()
+    assert not handler.writer.is_alive()
+
+
+def test_close_writes_pending_records():
+    """Writes the records that are still queued when the handler is closed, and respects the level of the target."""
+    stream = io.StringIO()
+    logger = batched(stream, level=logging.INFO)
+    logger.debug("hidden")
+    logger.info("shown")
+    logger.handlers[0].close()
+    assert stream.getvalue().splitlines() == [f"{threading.current_thread().name} shown"]
+
+
+def test_mutable_arguments_rendered_upfront():
+    """Renders the arguments that may change before the record is written, as they were when logged."""
+    stream = io.StringIO()
+    logger = batched(stream)
+    state = {"count": 1}
+    logger.info("state: %s", state)
+    state["count"] = 2
+    logger.handlers[0].close()
+    assert stream.getvalue().strip().endswith("state: {'count': 1}")
+
+
+def test_json_formatter():
+    """Writes each record as a single line of valid JSON, with the exception if there is one."""
+    formatter = JsonFormatter()
+    record = logging.LogRecord("tests", logging.WARNING, __file__, 10, 'quote " and %s', ("ünicode",), None)
+    entry = json.loads(formatter.format(record))
+    assert entry["level"] == "WARNING" and entry["line"] == 10 and entry["message"] == 'quote " and ünicode'
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logging.LogRecord("tests", logging.ERROR, __file__, 20, "failed", None, sys.exc_info())
+    line = formatter.format(record)
+    assert "\n" not in line
+    assert "RuntimeError: boom" in json.loads(line)["exception"]
+
+
+def test_cached_time_formatter():
+    """Formats the time the same as the standard formatter."""
+    fmt, datefmt = "%(asctime)s %(message)s", "%b-%d-%Y %I:%M:%S %p"
+    cached, standard = CachedTimeFormatter(fmt=fmt, datefmt=datefmt), logging.Formatter(fmt=fmt, datefmt=datefmt)
+    for created in (1700000000.1, 1700000000.9, 1700000001.0, 1700000000.5):
+        record = logging.LogRecord("tests", logging.INFO, __file__, 1, "message", None, None)
+        record.created = created
+        assert cached.format(record) == standard.format(record)
+
+
+def test_default_logger_replaces_handler():
+    """Replaces the batched handler of an earlier call, so the records are not written twice."""
+    first = default_logger(LogType.stdout)
+    handler = first.handlers[-1]
+    second = default_logger(LogType.stdout)
+    batched_handlers = [item for item in second.handlers if isinstance(item, BatchedQueueHandler)]
+    assert len(batched_handlers) == 1 and batched_handlers[0] is not handler
+    assert not handler.writer.is_alive()
+    second.removeHandler(batched_handlers[0])
+    batched_handlers[0].close()
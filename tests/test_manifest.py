@@ -0,0 +1,30 @@
+"""Tests for the incremental sync with the SQLite manifest, against the fake S3 of the benchmarks."""
+
+import os
+import sqlite3
+
+from benchmarks.fake_s3 import FakeS3
+from tests.common import BUCKET, assert_downloaded, downloader
+
+
+def test_new_manifest_adopts_local_files(server: FakeS3, tmp_path):
+    """Records the local files of the listed size on the first run with a manifest, instead of downloading them."""
+    directory, manifest = str(tmp_path / "objects"), str(tmp_path / "manifest.db")
+    count = len(server.bucket(BUCKET).objects)
+    downloader(server, directory).run_in_parallel(threads=4)
+    truncated = os.path.join(directory, "large", "second.bin")
+    with open(truncated, "r+b") as file:
+        file.truncate(10)
+
+    first = downloader(server, directory, manifest=manifest)
+    first.run_in_parallel(threads=4)
+    assert first.results.skipped == count - 1
+    assert first.results.success == 1
+    assert_downloaded(server, directory)
+    with sqlite3.connect(manifest) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM objects").fetchone()[0] == count
+
+    second = downloader(server, directory, manifest=manifest)
+    second.run_in_parallel(threads=4)
+    assert second.results.skipped == count
+    assert second.results.success == 0
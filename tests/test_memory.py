@@ -0,0 +1,67 @@
+"""Tests for the downloads into memory, against the fake S3 of the benchmarks."""
+
+import threading
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3, body
+from s3.squire import S3Object
+from tests.common import BUCKET, MB, downloader
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_iter_results(server: FakeS3, tmp_path, engine: str):
+    """Yields every object with its exact body, holding no more than the memory budget at once."""
+    objects = server.bucket(BUCKET).objects
+    dl = downloader(server, str(tmp_path))
+    results = {result.key: result for result in dl.iter_results(concurrency=4, engine=engine, memory_budget=6 * MB)}
+    assert results.keys() == objects.keys()
+    for key, obj in objects.items():
+        assert results[key].error is None
+        assert results[key].body == body(obj, 0, obj.size - 1)
+        assert results[key].headers
+    assert dl.results.success == len(objects)
+    assert not list(tmp_path.iterdir())
+
+
+def test_failures_are_yielded(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Yields a failed download with its error, and writes it to the failure manifest."""
+    missing = S3Object(key="missing.bin", size=10)
+    dl = downloader(server, str(tmp_path / "objects"), failure_manifest=str(tmp_path / "failures.json"))
+    monkeypatch.setattr(dl, "iter_shard", lambda: iter([[missing, S3Object(key="prefix-0/object-000.bin", size=0)]]))
+    results = {result.key: result for result in dl.iter_results(concurrency=2)}
+    assert results["missing.bin"].error is not None and results["missing.bin"].body is None
+    assert results["prefix-0/object-000.bin"].error is None
+    assert dl.results.failed == 1 and dl.results.success == 1
+    assert (tmp_path / "failures.json").is_file()
+
+
+def test_consumer_stops_early(server: FakeS3, tmp_path):
+    """Stops the listing and the downloads when the consumer stops, without waiting for the rest of the bucket."""
+    dl = downloader(server, str(tmp_path))
+    results = dl.iter_results(concurrency=2, memory_budget=MB, max_pending=2)
+    next(results)
+    results.close()
+    assert not [thread for thread in threading.enumerate() if thread.name == "memory-producer"]
+    assert dl.results.success == 1
+
+
+def test_run_in_memory(server: FakeS3, tmp_path):
+    """Passes each object to the callback, and raises the callback's exception to the caller."""
+    received = {}
+    dl = downloader(server, str(tmp_path))
+    dl.run_in_memory(lambda key, headers, data: received.__setitem__(key, len(data)), concurrency=4)
+    assert received == {key: obj.size for key, obj in server.bucket(BUCKET).objects.items()}
+
+    def failing(key: str, headers: dict, data: bytearray) -> None:
+        """Fails on the first object."""
+        raise RuntimeError(key)
+
+    with pytest.raises(RuntimeError):
+        downloader(server, str(tmp_path)).run_in_memory(failing)
+
+
+def test_rejects_local_options(server: FakeS3, tmp_path):
+    """Rejects the options that work with the files on disk."""
+    with pytest.raises(ValueError):
+        next(downloader(server, str(tmp_path), dedup=True).iter_results())
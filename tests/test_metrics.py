@@ -0,0 +1,55 @@
+"""Tests for the run metrics and their Prometheus and JSON exports."""
+
+import json
+
+from benchmarks.fake_s3 import FakeS3
+from s3.metrics import Histogram, Metrics
+from tests.common import BUCKET, downloader
+
+
+def test_histogram():
+    """Counts each value in the first bucket whose bound is not below it, and reports the quantiles by bucket."""
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) is None
+
+
+def test_prometheus():
+    """Exports cumulative buckets, the sums and counts, and the download counts by result."""
+    metrics = Metrics()
+    metrics.observe_listing(0.02)
+    metrics.observe_download(size=100, start=0.0, transfer_start=0.5, first_byte=0.75, end=2.0, disk=0.25)
+    metrics.observe_retry(throttled=True)
+    lines = metrics.to_prometheus(results=dict(success=1, failed=0)).splitlines()
+    assert 's3_download_listing_seconds_bucket{le="0.025"} 1' in lines
+    assert 's3_download_listing_seconds_bucket{le="+Inf"} 1' in lines
+    assert 's3_download_ttfb_seconds_bucket{le="0.25"} 1' in lines
+    assert "s3_download_total_seconds_count 1" in lines
+    assert 's3_download_phase_seconds_total{phase="network"} 1.25' in lines
+    assert 's3_download_phase_seconds_total{phase="disk"} 0.25' in lines
+    assert "s3_download_bytes_total 100" in lines
+    assert "s3_download_throttles_total 1" in lines
+    assert 's3_download_objects_total{result="success"} 1' in lines
+
+
+def test_reset_between_runs(server: FakeS3, tmp_path):
+    """Reports each run on its own when the downloader is reused, in the metrics file and the instance."""
+    filename = str(tmp_path / "metrics.json")
+    dl = downloader(server, str(tmp_path / "objects"), metrics=filename)
+    dl.run_in_parallel(threads=4)
+    with open(filename) as file:
+        first = json.load(file)
+    assert first["objects"] == len(server.bucket(BUCKET).objects)
+    assert first["bytes"] == sum(obj.size for obj in server.bucket(BUCKET).objects.values())
+    assert first["latency"]["listing"]["count"] >= 1
+
+    dl.run_in_parallel(threads=4)
+    with open(filename) as file:
+        second = json.load(file)
+    assert second["objects"] == second["bytes"] == 0
+    assert second["latency"]["listing"]["count"] == first["latency"]["listing"]["count"]
@@ -0,0 +1,71 @@
+"""Tests for the dry-run plan of a download and its execution with ``run_plan``."""
+
+import json
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from s3.plan import Plan, size_bucket
+from tests.common import BUCKET, MB, assert_downloaded, downloader
+
+
+def test_plan_and_run(server: FakeS3, tmp_path):
+    """Tallies the bucket without downloading it, and downloads exactly the planned objects later."""
+    objects = server.bucket(BUCKET).objects
+    filename = str(tmp_path / "bucket.plan")
+    plan = downloader(server, str(tmp_path / "objects")).plan(filename=filename, probe_objects=2)
+    assert plan.objects == len(objects) and plan.bytes == sum(obj.size for obj in objects.values())
+    assert sum(tally["objects"] for tally in plan.by_size.values()) == plan.objects
+    assert plan.probe and plan.estimate() > 0
+    assert not (tmp_path / "objects").exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["bucket.plan"]
+    with open(filename) as file:
+        assert json.loads(file.readline())["objects"] == plan.objects
+        assert sorted(json.loads(line)[0] for line in file) == sorted(objects)
+
+    # Objects added after the plan are not part of it
+    server.bucket(BUCKET).put("late/object.bin", MB)
+    dl = downloader(server, str(tmp_path / "objects"))
+    dl.run_plan(filename, threads=4)
+    assert dl.results.success == plan.objects
+    assert_downloaded(server, str(tmp_path / "objects"), keys=set(objects) - {"late/object.bin"})
+    assert not (tmp_path / "objects" / "late").exists()
+
+
+def test_plan_skips_present_files(server: FakeS3, tmp_path):
+    """Leaves out the objects that are already downloaded, without a plan file or a probe."""
+    downloader(server, str(tmp_path)).run_in_parallel(threads=4)
+    plan = downloader(server, str(tmp_path)).plan(probe_objects=0)
+    assert plan.objects == 0 and plan.skipped == len(server.bucket(BUCKET).objects)
+    assert plan.probe is None and plan.estimate() is None
+
+
+def test_run_plan_of_another_bucket(server: FakeS3, tmp_path):
+    """Refuses a plan made for another bucket."""
+    filename = tmp_path / "other.plan"
+    with Plan("other-bucket", filename=str(filename)) as plan:
+        plan.save()
+    with pytest.raises(ValueError):
+        downloader(server, str(tmp_path)).run_plan(str(filename))
+
+
+@pytest.mark.parametrize("stage", ["index_local", "iter_shard"])
+def test_failed_plan_is_discarded(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch, stage: str):
+    """Removes the objects written so far when the plan fails, before or during the listing."""
+    dl = downloader(server, str(tmp_path / "objects"))
+
+    def fail(*args, **kwargs):
+        """Fails the stage of the plan."""
+        raise RuntimeError(stage)
+
+    monkeypatch.setattr(dl, stage, fail)
+    with pytest.raises(RuntimeError):
+        dl.plan(filename=str(tmp_path / "bucket.plan"), probe_objects=0)
+    assert not list(tmp_path.iterdir())
+
+
+def test_size_bucket():
+    """Places each size in the bucket below its upper bound, and everything larger in the last one."""
+    assert size_bucket(0) == "0-64KB"
+    assert size_bucket(1024 * 64) == "64KB-1MB"
+    assert size_bucket(1024 ** 4) == "1GB+"
@@ -0,0 +1,32 @@
+"""Tests for the progress aggregator shared by the download threads."""
+
+import threading
+
+from s3.progress import ProgressAggregator
+from s3.squire import S3Object
+
+
+def test_progress_race():
+    """Settles every transfer, while the workers track and finish them as the renderer drains the deques."""
+    progress = ProgressAggregator(interval=0.0001)
+    workers, per_worker, size = 4, 20000, 10
+
+    def work(worker: int) -> None:
+        """Tracks, transfers and finishes the objects of a single worker."""
+        for index in range(per_worker):
+            s3_object = S3Object(key=f"{worker}/{index}", size=size)
+            callback = progress.track(s3_object)
+            callback(size // 2)
+            progress.finish(s3_object)
+
+    progress.expect(workers * per_worker * size)
+    with progress:
+        threads = [threading.Thread(target=work, args=(worker,)) for worker in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert not progress.active
+    assert not progress.started and not progress.finished
+    assert progress.received == workers * per_worker * size // 2
+    assert progress.settled + progress.received == progress.expected
@@ -0,0 +1,43 @@
+"""Tests for the ranged downloads, against the fake S3 of the benchmarks."""
+
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.common import client
+from benchmarks.fake_s3 import FakeS3, body
+from s3.ranged import RangedDownload
+from s3.squire import S3Object
+from tests.common import BUCKET, MB
+
+
+def test_ranged_refetch_progress(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Takes back the bytes already reported when the object changes midway and is refetched in full."""
+    key, target_file = "large/first.bin", str(tmp_path / "first.bin")
+    bucket = server.bucket(BUCKET)
+    size = bucket.objects[key].size
+    fetch = RangedDownload.fetch
+    calls = []
+
+    def changing(self: RangedDownload, fd: int, index: int) -> None:
+        """Replaces the object after a few ranges."""
+        calls.append(index)
+        if len(calls) == 3:
+            bucket.put(key, size, version=1)
+        fetch(self, fd, index)
+
+    monkeypatch.setattr(RangedDownload, "fetch", changing)
+    received = []
+    RangedDownload(client(server.endpoint_url), BUCKET, S3Object(key=key, size=size), target_file,
+                   callback=received.append, chunk_size=MB).run()
+    assert len(calls) > 6
+    assert sum(received) == size
+    with open(target_file, "rb") as file:
+        assert file.read() == body(bucket.objects[key], 0, size - 1)
+
+
+def test_exceptions_do_not_import_botocore():
+    """Keeps the exceptions importable without botocore, so the CLI and the asyncio client stay lazy."""
+    code = "import sys, s3, s3.exceptions, s3.aio; print(any(name.startswith('botocore') for name in sys.modules))"
+    assert subprocess.check_output([sys.executable, "-c", code], text=True).strip() == "False"
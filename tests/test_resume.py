@@ -0,0 +1,52 @@
+"""Tests for the resumable downloads in byte ranges, against the fake S3 of the benchmarks."""
+
+import pytest
+
+from benchmarks.common import client
+from benchmarks.fake_s3 import FakeS3, body
+from s3.ranged import RangedDownload
+from s3.squire import S3Object
+from tests.common import BUCKET, MB, assert_downloaded, downloader
+
+
+def test_resumable(server: FakeS3, tmp_path):
+    """Downloads the large objects in parallel byte ranges."""
+    dl = downloader(server, str(tmp_path), resumable=True, range_workers=4)
+    dl.RESUME_CHUNKSIZE = MB
+    dl.run_in_parallel(threads=2)
+    assert dl.results.failed == 0
+    assert dl.results.success == len(server.bucket(BUCKET).objects)
+    assert_downloaded(server, str(tmp_path))
+
+
+def test_resume_fetches_missing_ranges(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Fetches only the ranges that were not completed before an interruption."""
+    key, target_file = "large/first.bin", str(tmp_path / "first.bin")
+    obj = server.bucket(BUCKET).objects[key]
+    fetched = []
+    fetch = RangedDownload.fetch
+
+    def interrupted(self: RangedDownload, fd: int, index: int) -> None:
+        """Fails the fourth range, after fetching the ones before it."""
+        if index == 3:
+            raise ConnectionError("Interrupted")
+        fetch(self, fd, index)
+
+    monkeypatch.setattr(RangedDownload, "fetch", interrupted)
+    with pytest.raises(ConnectionError):
+        RangedDownload(client(server.endpoint_url), BUCKET, S3Object(key=key, size=obj.size),
+                       target_file, chunk_size=MB).run()
+
+    def recorded(self: RangedDownload, fd: int, index: int) -> None:
+        """Records the fetched range."""
+        fetched.append(index)
+        fetch(self, fd, index)
+
+    monkeypatch.setattr(RangedDownload, "fetch", recorded)
+    received = []
+    RangedDownload(client(server.endpoint_url), BUCKET, S3Object(key=key, size=obj.size), target_file,
+                   callback=received.append, chunk_size=MB).run()
+    assert fetched == [3, 4, 5]
+    assert sum(received) == obj.size
+    with open(target_file, "rb") as file:
+        assert file.read() == body(obj, 0, obj.size - 1)
@@ -0,0 +1,34 @@
+"""Tests for the scheduled downloads with separate lanes, against the fake S3 of the benchmarks."""
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from s3.ranged import RangedDownload
+from tests.common import BUCKET, MB, assert_downloaded, downloader
+
+
+def test_run_scheduled(server: FakeS3, tmp_path):
+    """Downloads the small and large objects on their lanes, then skips all of them on a rerun."""
+    count = len(server.bucket(BUCKET).objects)
+    first = downloader(server, str(tmp_path))
+    first.run_scheduled(small_threads=4, large_threads=2, large_concurrency=2, small_threshold=MB)
+    assert first.results.success == count
+    assert first.results.failed == 0
+    assert_downloaded(server, str(tmp_path))
+
+    second = downloader(server, str(tmp_path))
+    second.run_scheduled(small_threads=4, large_threads=2, large_concurrency=2, small_threshold=MB)
+    assert second.results.skipped == count
+
+
+def test_run_scheduled_resumable(server: FakeS3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    """Downloads the objects larger than the resume chunk size in byte ranges."""
+    ranged = []
+    run = RangedDownload.run
+    monkeypatch.setattr(RangedDownload, "run", lambda self: ranged.append(self.s3_object.key) or run(self))
+    dl = downloader(server, str(tmp_path), range_workers=4)
+    dl.RESUME_CHUNKSIZE = MB
+    dl.run_scheduled(small_threads=4, large_threads=2, large_concurrency=2, small_threshold=MB)
+    assert dl.results.failed == 0
+    assert sorted(ranged) == ["large/first.bin", "large/second.bin"]
+    assert_downloaded(server, str(tmp_path))
@@ -0,0 +1,44 @@
+"""Tests for splitting a download across nodes with ``--shard``."""
+
+import json
+
+import pytest
+
+from benchmarks.fake_s3 import FakeS3
+from s3.shard import Shard, merge_summaries
+from s3.squire import S3Object
+from tests.common import BUCKET, assert_downloaded, downloader
+
+
+def test_hash_shards_are_disjoint() -> None:
+    """Assigns every key to exactly one shard."""
+    shards = [Shard(index, 4) for index in range(1, 5)]
+    for number in range(1000):
+        s3_object = S3Object(key=f"key-{number}", size=1)
+        assert sum(shard.owns(s3_object) for shard in shards) == 1
+
+
+def test_parse_rejects_out_of_range() -> None:
+    """Rejects a shard index beyond the shard count."""
+    with pytest.raises(ValueError):
+        Shard.parse("5/4")
+
+
+@pytest.mark.parametrize("strategy", ["hash", "size"])
+def test_sharded(server: FakeS3, tmp_path, strategy: str) -> None:
+    """Downloads every object exactly once across the shards, and merges their summaries."""
+    downloaded, summaries = 0, []
+    for index in range(1, 4):
+        summaries.append(str(tmp_path / f"shard-{index}.json"))
+        dl = downloader(server, str(tmp_path / "objects"), shard=f"{index}/3", shard_strategy=strategy,
+                        shard_summary=summaries[-1])
+        dl.run_in_parallel(threads=4)
+        assert dl.results.failed == 0
+        downloaded += dl.results.success
+    assert downloaded == len(server.bucket(BUCKET).objects)
+    assert_downloaded(server, str(tmp_path / "objects"))
+    with open(summaries[0]) as file:
+        assert json.load(file)["bucket"] == BUCKET
+    merged = merge_summaries(summaries)
+    assert merged["complete"] and not merged["missing"]
+    assert merged["results"]["success"] == downloaded
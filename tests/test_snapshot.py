@@ -0,0 +1,96 @@
+"""Tests for the SQLite snapshot of the listing, against the fake S3 of the benchmarks."""
+
+import time
+
+import pytest
+
+from benchmarks.common import client, quiet_logger
+from benchmarks.fake_s3 import FakeS3
+from s3.filters import ObjectFilter
+from s3.listing import Lister
+from s3.metrics import Metrics
+from s3.snapshot import Refresh, Snapshot
+from tests.common import BUCKET
+
+# Old enough for every partition to be cold
+OLD = time.time() - 86400 * 30
+
+
+@pytest.fixture
+def bucket_server():
+    """Starts a fake S3 with a few partitions that were last written a month ago."""
+    with FakeS3() as fake:
+        bucket = fake.bucket(BUCKET)
+        for partition in range(3):
+            for index in range(5):
+                bucket.put(f"data/{partition}/{index}.bin", 100, last_modified=OLD)
+        bucket.put("data/top.bin", 10, last_modified=OLD)
+        yield fake
+
+
+def snapshot(server: FakeS3, filename: str, **kwargs) -> Snapshot:
+    """Opens a snapshot listed with a lister that counts its requests."""
+    lister = Lister(client(server.endpoint_url), BUCKET, quiet_logger("tests"), metrics=Metrics())
+    return Snapshot(filename, BUCKET, lister, quiet_logger("tests"), **kwargs)
+
+
+def listed(server: FakeS3) -> dict:
+    """Returns the size and ETag of every object in the bucket."""
+    return {key: (obj.size, obj.etag) for key, obj in server.bucket(BUCKET).objects.items()}
+
+
+def served(store: Snapshot, prefix: str = "data/") -> dict:
+    """Returns the size and ETag of every object served by the snapshot."""
+    return {obj.key: (obj.size, obj.etag) for obj in store.iter_objects([prefix])}
+
+
+def test_fresh_snapshot_is_served_from_disk(bucket_server: FakeS3, tmp_path):
+    """Serves the root and the prefixes under it without a request until the snapshot expires."""
+    filename = str(tmp_path / "snapshot.sqlite")
+    first = snapshot(bucket_server, filename)
+    assert served(first) == listed(bucket_server)
+    first.close()
+    second = snapshot(bucket_server, filename, object_filter=ObjectFilter(include=["*/1/*"]))
+    assert set(served(second, "data/")) == {f"data/1/{index}.bin" for index in range(5)}
+    assert second.rejected == {"data/": 11}
+    assert len(served(second, "data/2/")) == 0
+    assert second.lister.metrics.listing.count == 0
+
+
+def test_full_refresh_is_the_default(bucket_server: FakeS3, tmp_path):
+    """Picks up the overwrites and deletes in the cold partitions as soon as the snapshot expires."""
+    filename = str(tmp_path / "snapshot.sqlite")
+    store = snapshot(bucket_server, filename)
+    assert store.refresh == Refresh.full
+    served(store)
+    bucket = bucket_server.bucket(BUCKET)
+    bucket.put("data/0/0.bin", 200, last_modified=OLD, version=1)
+    bucket.delete("data/1/0.bin")
+    store.ttl = 0
+    assert served(store) == listed(bucket_server)
+
+
+def test_incremental_refresh(bucket_server: FakeS3, tmp_path):
+    """Relists the new partitions and probes the cold ones for appends, missing the other changes until max_age."""
+    filename = str(tmp_path / "snapshot.sqlite")
+    store = snapshot(bucket_server, filename, ttl=0, refresh=Refresh.incremental)
+    served(store)
+    bucket = bucket_server.bucket(BUCKET)
+    bucket.put("data/0/9.bin", 100)
+    bucket.put("data/3/0.bin", 100)
+    bucket.put("data/top-2.bin", 10)
+    for index in range(5):
+        bucket.delete(f"data/2/{index}.bin")
+    bucket.delete("data/1/0.bin")
+    # The delete in a cold partition is missed, as its last key is unchanged
+    assert set(served(store)) == set(listed(bucket_server)) | {"data/1/0.bin"}
+    store.max_age = 0
+    assert served(store) == listed(bucket_server)
+
+
+def test_snapshot_of_another_bucket(bucket_server: FakeS3, tmp_path):
+    """Rejects a snapshot that was taken of another bucket."""
+    filename = str(tmp_path / "snapshot.sqlite")
+    snapshot(bucket_server, filename).close()
+    with pytest.raises(ValueError):
+        Snapshot(filename, "other-bucket", None, quiet_logger("tests"))
@@ -0,0 +1,88 @@
+"""Tests for the folder tree of the bucket, rendered as text and as JSON."""
+
+import json
+
+import pytest
+
+from s3.squire import (build_tree, convert_to_folder_structure,
+                       format_bucket_structure, iter_bucket_json,
+                       size_converter)
+
+OBJECTS = {"a/b/c.txt": 10, "a/b/d.txt": 20, "a/e.txt": 5, "f.txt": 1, "g/h/i/j.bin": 4096}
+COLLISIONS = {"files/a.txt": 1, "size/b.txt": 2, "top.txt": 3, "x/files/y.txt": 4, "x/z.txt": 5, "x/size/w": 6}
+
+
+def baseline(bucket_structure: dict, convert_size: bool) -> dict:
+    """Builds the structure with nested dictionaries, the way it was built before the folder tree."""
+    tree = {}
+    for key, size in bucket_structure.items():
+        parts = key.strip("/").split("/")
+        current = tree
+        for part in parts[:-1]:
+            current = current.setdefault(part, {})
+        current.setdefault("__files__", []).append(dict(name=parts[-1], size=size))
+
+    def clean(node: dict) -> dict:
+        """Moves the files under their key and adds the size of each folder."""
+        result, total = {}, 0
+        if files := node.get("__files__"):
+            result["files"] = sorted(files, key=lambda file: file["name"])
+            total += sum(file["size"] for file in files)
+        for name, child in node.items():
+            if name != "__files__":
+                result[name] = clean(child)
+                total += result[name]["size"]
+        result["size"] = total
+        return result
+
+    def convert(node: dict) -> dict:
+        """Converts the sizes to the human-readable format."""
+        for name, value in node.items():
+            if isinstance(value, dict):
+                convert(value)
+            elif isinstance(value, list):
+                for file in value:
+                    file["size"] = size_converter(file["size"])
+        node["size"] = size_converter(node["size"])
+        return node
+
+    result = clean(tree)
+    return convert(result) if convert_size else result
+
+
+def test_folder_structure():
+    """Renders the folders before the files at each level, with the size of each."""
+    assert convert_to_folder_structure(OBJECTS) == (
+        ". (4.04 KB)\n"
+        "├── a (35 bytes)\n"
+        "│   ├── b (30 bytes)\n"
+        "│   │   ├── c.txt (10.0 B)\n"
+        "│   │   └── d.txt (20.0 B)\n"
+        "│   └── e.txt (5.0 B)\n"
+        "├── g (4096 bytes)\n"
+        "│   └── h (4096 bytes)\n"
+        "│       └── i (4096 bytes)\n"
+        "│           └── j.bin (4.0 KB)\n"
+        "└── f.txt (1.0 B)\n"
+    )
+
+
+@pytest.mark.parametrize("objects", [OBJECTS, COLLISIONS])
+@pytest.mark.parametrize("convert_size", [False, True])
+def test_json_matches_the_dictionary(objects: dict, convert_size: bool):
+    """Streams the same JSON as dumping the dictionary structure, which is the same as before the folder tree."""
+    structure = format_bucket_structure(objects, convert_size)
+    assert structure == baseline(objects, convert_size)
+    streamed = "".join(iter_bucket_json(build_tree(objects.items()), convert_size=convert_size))
+    assert streamed == json.dumps(structure, indent=2)
+
+
+def test_json_has_unique_keys():
+    """Writes each key once per folder, even with folders named like the members."""
+    def unique(pairs: list) -> dict:
+        """Rejects the duplicate keys."""
+        keys = [key for key, _ in pairs]
+        assert len(keys) == len(set(keys)), keys
+        return dict(pairs)
+
+    json.loads("".join(iter_bucket_json(build_tree(COLLISIONS.items()))), object_pairs_hook=unique)
@@ -0,0 +1,51 @@
+"""Tests for ``run_stream``, which downloads while the bucket is being listed, and the engine choice of the CLI."""
+
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from benchmarks.fake_s3 import FakeS3
+from s3 import _cli
+from tests.common import BUCKET, assert_downloaded, downloader
+
+
+def test_run_stream(server: FakeS3, tmp_path) -> None:
+    """Downloads every object, and skips all of them on a rerun."""
+    first = downloader(server, str(tmp_path))
+    first.run_stream(threads=4, queue_size=8)
+    assert first.results.success == len(server.bucket(BUCKET).objects)
+    assert_downloaded(server, str(tmp_path))
+
+    second = downloader(server, str(tmp_path))
+    second.run_stream(threads=4, queue_size=8)
+    assert second.results.success == len(server.bucket(BUCKET).objects)
+    assert second.results.skipped == len(server.bucket(BUCKET).objects)
+
+
+def test_run_stream_listing_error(server: FakeS3, tmp_path, monkeypatch) -> None:
+    """Raises the listing error after stopping the renderer and writing the summary and the final metrics."""
+    dl = downloader(server, str(tmp_path / "objects"), metrics=str(tmp_path / "metrics.json"), metrics_interval=3600)
+    first_page = next(iter(dl.iter_shard()))
+
+    def failing():
+        """Yields the first page and fails on the second."""
+        yield first_page
+        raise ConnectionError("Listing failed")
+
+    monkeypatch.setattr(dl, "iter_shard", failing)
+    with pytest.raises(ConnectionError):
+        dl.run_stream(threads=2)
+    assert not dl.progress.thread.is_alive()
+    assert os.path.isfile(tmp_path / "metrics.json")
+
+
+def test_cli_rejects_conflicting_modes() -> None:
+    """Fails with a usage error before creating the downloader."""
+    runner = CliRunner()
+    result = runner.invoke(_cli, ["--bucket", BUCKET, "--engine", "async", "--adaptive"])
+    assert result.exit_code == 2
+    assert "--adaptive is only supported by the threads engine" in result.output
+    result = runner.invoke(_cli, ["--bucket", BUCKET, "--engine", "stream", "--plan", "plan.jsonl"])
+    assert result.exit_code == 2
+    assert "cannot be used together" in result.output